@@ -0,0 +1,233 @@
+import argparse
+import dataclasses
+import json
+import os
+import random
+import string
+import subprocess
+import sys
+
+
+SECRET_PREFIXES = [
+    'AKIA',
+    'ASIA',
+    'AGPA',
+]
+TEXT_WORDS = [
+    'import',
+    'return',
+    'value',
+    'config',
+    'self',
+    'result',
+    'items',
+    'request',
+    'response',
+    'password=changeme',
+    'token',
+    'for',
+    'while',
+    'def',
+    'class',
+]
+TEXT_FILE_EXTENSIONS = [
+    'py',
+    'js',
+    'txt',
+    'yaml',
+    'cfg',
+]
+BINARY_FILE_EXTENSIONS = [
+    'bin',
+    'dat',
+]
+TIMESTAMP = 946684800
+
+
+@dataclasses.dataclass
+class RepositorySpec:
+    commits: int = 1000
+    branches: int = 4
+    files_per_commit: int = 4
+    file_size: int = 4096
+    binary_ratio: float = 0.1
+    secret_density: float = 0.05
+    directories: int = 32
+    seed: int = 0
+
+
+def random_secret(
+    rng: random.Random,
+) -> str:
+    return rng.choice(SECRET_PREFIXES) + ''.join(
+        rng.choices(
+            population=string.ascii_uppercase + string.digits,
+            k=16,
+        )
+    )
+
+
+def random_text(
+    rng: random.Random,
+    size: int,
+    with_secret: bool,
+) -> bytes:
+    lines = []
+    length = 0
+    while length < size:
+        line = ' '.join(
+            rng.choices(
+                population=TEXT_WORDS,
+                k=rng.randint(4, 12),
+            )
+        )
+        lines.append(line)
+        length += len(line) + 1
+    text = '\n'.join(lines)[:size]
+    if with_secret:
+        position = rng.randrange(len(text) + 1)
+        text = f'{text[:position]}\naws_key = {random_secret(rng)}\n{text[position:]}'
+
+    return text.encode()
+
+
+def random_binary(
+    rng: random.Random,
+    size: int,
+) -> bytes:
+    return b'\x00' + rng.getrandbits(8 * size).to_bytes(size, 'little')[1:]
+
+
+def write_data(
+    stream,
+    data: bytes,
+) -> None:
+    stream.write(f'data {len(data)}\n'.encode())
+    stream.write(data)
+    stream.write(b'\n')
+
+
+def generate_repository(
+    repository_path: str,
+    spec: RepositorySpec,
+) -> dict:
+    '''Generates a git repository with a deterministic history out of a spec, using git fast-import so
+    even large histories are written in seconds. Returns a manifest of what was generated.'''
+    if os.path.exists(os.path.join(repository_path, '.git')):
+        raise FileExistsError(f'A git repository already exists at {repository_path}')
+
+    rng = random.Random(spec.seed)
+    subprocess.run(
+        args=['git', 'init', '--quiet', repository_path],
+        check=True,
+    )
+    fast_import = subprocess.Popen(
+        args=['git', 'fast-import', '--quiet', '--done'],
+        cwd=repository_path,
+        stdin=subprocess.PIPE,
+    )
+
+    manifest = {
+        'spec': dataclasses.asdict(spec),
+        'commits': 0,
+        'files': 0,
+        'binary_files': 0,
+        'secrets': 0,
+        'bytes': 0,
+    }
+    stream = fast_import.stdin
+    commits_per_branch = spec.commits // (spec.branches + 1) if spec.branches else spec.commits
+    branch_names = ['master'] + [f'branch_{index}' for index in range(spec.branches)]
+    mark = 0
+    master_marks = []
+
+    for branch_index, branch_name in enumerate(branch_names):
+        if branch_index == 0:
+            number_of_commits = spec.commits - commits_per_branch * spec.branches
+        else:
+            number_of_commits = commits_per_branch
+        parent_mark = rng.choice(master_marks) if branch_index > 0 and master_marks else None
+
+        for commit_index in range(number_of_commits):
+            file_changes = []
+            for _ in range(spec.files_per_commit):
+                is_binary = rng.random() < spec.binary_ratio
+                size = max(1, int(rng.gauss(spec.file_size, spec.file_size / 4)))
+                directory = f'dir_{rng.randrange(spec.directories)}'
+                if is_binary:
+                    extension = rng.choice(BINARY_FILE_EXTENSIONS)
+                    content = random_binary(rng, size)
+                    manifest['binary_files'] += 1
+                else:
+                    extension = rng.choice(TEXT_FILE_EXTENSIONS)
+                    with_secret = rng.random() < spec.secret_density
+                    content = random_text(rng, size, with_secret)
+                    manifest['secrets'] += with_secret
+
+                mark += 1
+                stream.write(f'blob\nmark :{mark}\n'.encode())
+                write_data(stream, content)
+                file_changes.append(
+                    f'M 100644 :{mark} {directory}/file_{rng.randrange(spec.files_per_commit * 8)}.{extension}\n'
+                )
+                manifest['files'] += 1
+                manifest['bytes'] += len(content)
+
+            mark += 1
+            timestamp = TIMESTAMP + manifest['commits'] * 60
+            stream.write(f'commit refs/heads/{branch_name}\nmark :{mark}\n'.encode())
+            stream.write(f'author Bench Author <bench@author.email> {timestamp} +0000\n'.encode())
+            stream.write(f'committer Bench Author <bench@author.email> {timestamp} +0000\n'.encode())
+            write_data(stream, f'{branch_name} commit {commit_index}'.encode())
+            if commit_index == 0 and parent_mark is not None:
+                stream.write(f'from :{parent_mark}\n'.encode())
+            stream.write(''.join(file_changes).encode())
+            stream.write(b'\n')
+
+            if branch_index == 0:
+                master_marks.append(mark)
+            manifest['commits'] += 1
+
+    stream.write(b'done\n')
+    stream.close()
+    if fast_import.wait() != 0:
+        raise RuntimeError('git fast-import has failed')
+
+    subprocess.run(
+        args=['git', 'checkout', '--quiet', 'master'],
+        cwd=repository_path,
+        check=True,
+    )
+
+    return manifest
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description='Generates a synthetic git repository to benchmark PyRepScan with',
+    )
+    parser.add_argument('repository_path')
+    for field in dataclasses.fields(RepositorySpec):
+        parser.add_argument(
+            f'--{field.name.replace("_", "-")}',
+            type=field.type,
+            default=field.default,
+        )
+    arguments = parser.parse_args()
+
+    spec = RepositorySpec(
+        **{
+            field.name: getattr(arguments, field.name)
+            for field in dataclasses.fields(RepositorySpec)
+        }
+    )
+    manifest = generate_repository(
+        repository_path=arguments.repository_path,
+        spec=spec,
+    )
+    json.dump(manifest, sys.stdout, indent=4)
+    print()
+
+
+if __name__ == '__main__':
+    main()
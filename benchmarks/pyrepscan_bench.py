@@ -1,15 +1,397 @@
+import argparse
+import dataclasses
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import typing
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
 import pyrepscan
 
+import generate_repository
+
+
+AWS_RULE_PATTERN = r'(A3T[A-Z0-9]|AKIA|AGPA|AIDA|AROA|AIPA|ANPA|ANVA|ASIA)[A-Z0-9]{16}'
+THROUGHPUT_METRICS = [
+    'commits_per_second',
+    'mb_per_second',
+    'paths_per_second',
+]
+
+
+def build_rules(
+    rule_count: int,
+) -> typing.List[typing.Dict[str, typing.Any]]:
+    '''The AWS rule that matches the planted secrets, followed by synthetic rules shaped like common
+    secret rules, so the cost of scanning grows with the number of rules'''
+    rules = [
+        {
+            'name': 'AWS Manager ID',
+            'pattern': AWS_RULE_PATTERN,
+            'whitelist_patterns': [],
+            'blacklist_patterns': [
+                'EXAMPLE',
+            ],
+        },
+    ]
+    for index in range(1, rule_count):
+        rules.append(
+            {
+                'name': f'Synthetic Rule {index}',
+                'pattern': rf'(?i)rule{index}_(?:key|token|secret)\s*=\s*([a-z0-9]{{16,}})',
+                'whitelist_patterns': [],
+                'blacklist_patterns': [
+                    'changeme',
+                ],
+            }
+        )
+
+    return rules
+
+
+def add_rules(
+    scanner: typing.Union[pyrepscan.GitRepositoryScanner, pyrepscan.RulesManager],
+    rule_count: int,
+) -> None:
+    for rule in build_rules(rule_count):
+        scanner.add_content_rule(**rule)
+    scanner.add_file_path_rule(
+        name='Private Key File',
+        pattern=r'\.pem$',
+    )
+
+
+def add_path_filters(
+    scanner: typing.Union[pyrepscan.GitRepositoryScanner, pyrepscan.RulesManager],
+    rule_count: int,
+) -> None:
+    for index in range(rule_count):
+        scanner.add_file_path_to_skip(
+            file_path=f'vendor_{index}/',
+        )
+    scanner.add_file_extension_to_skip(
+        file_extension='bin',
+    )
+    scanner.add_file_glob_to_skip(
+        glob='**/node_modules/**',
+    )
+
+
+def peak_rss_kb() -> typing.Optional[int]:
+    '''The peak resident set size of the current process in kilobytes, when the platform reports it'''
+    if resource is None:
+        return None
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return max_rss // 1024
+
+    return max_rss
+
+
+def time_repeats(
+    function: typing.Callable[[], typing.Any],
+    repeats: int,
+) -> typing.Tuple[typing.List[float], typing.Any]:
+    timings = []
+    result = None
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start_time)
+
+    return timings, result
+
+
+def summarize_timings(
+    timings: typing.List[float],
+) -> typing.Dict[str, float]:
+    return {
+        'best_seconds': min(timings),
+        'median_seconds': statistics.median(timings),
+    }
+
+
+def bench_scan(
+    case: typing.Dict[str, typing.Any],
+) -> typing.Dict[str, typing.Any]:
+    scanner = pyrepscan.GitRepositoryScanner(
+        num_threads=case['thread_count'],
+    )
+    add_rules(scanner, case['rule_count'])
+
+    timings, results = time_repeats(
+        function=lambda: scanner.scan(
+            repository_path=case['repository_path'],
+            branch_glob_pattern='*',
+            from_timestamp=None,
+        ),
+        repeats=case['repeats'],
+    )
+    scan_stats = scanner.last_scan_stats()
+    best_seconds = min(timings)
+
+    return {
+        **summarize_timings(timings),
+        'matches': len(results),
+        'commits_scanned': scan_stats['commits_scanned'],
+        'bytes_scanned': scan_stats['bytes_scanned'],
+        'commits_per_second': scan_stats['commits_scanned'] / best_seconds,
+        'mb_per_second': scan_stats['bytes_scanned'] / 1_000_000 / best_seconds,
+    }
+
+
+def bench_scan_file(
+    case: typing.Dict[str, typing.Any],
+) -> typing.Dict[str, typing.Any]:
+    rules_manager = pyrepscan.RulesManager()
+    add_rules(rules_manager, case['rule_count'])
+
+    rng = random.Random(case['spec']['seed'])
+    contents = [
+        generate_repository.random_text(
+            rng=rng,
+            size=case['spec']['file_size'],
+            with_secret=rng.random() < case['spec']['secret_density'],
+        ).decode()
+        for _ in range(case['files'])
+    ]
+    number_of_bytes = sum(len(content) for content in contents)
+
+    def scan_contents():
+        return sum(
+            len(rules_manager.scan_file(file_path=f'file_{index}.py', content=content) or [])
+            for index, content in enumerate(contents)
+        )
+
+    timings, matches = time_repeats(
+        function=scan_contents,
+        repeats=case['repeats'],
+    )
+    best_seconds = min(timings)
+
+    return {
+        **summarize_timings(timings),
+        'matches': matches,
+        'files': len(contents),
+        'bytes_scanned': number_of_bytes,
+        'mb_per_second': number_of_bytes / 1_000_000 / best_seconds,
+    }
+
+
+def bench_path_filtering(
+    case: typing.Dict[str, typing.Any],
+) -> typing.Dict[str, typing.Any]:
+    rules_manager = pyrepscan.RulesManager()
+    add_path_filters(rules_manager, case['rule_count'])
+
+    file_paths = subprocess.run(
+        args=['git', 'log', '--all', '--name-only', '--format='],
+        cwd=case['repository_path'],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout.split()
+
+    def filter_paths():
+        return sum(
+            rules_manager.should_scan_file_path(file_path=file_path)
+            for file_path in file_paths
+        )
+
+    timings, paths_to_scan = time_repeats(
+        function=filter_paths,
+        repeats=case['repeats'],
+    )
+
+    return {
+        **summarize_timings(timings),
+        'paths': len(file_paths),
+        'paths_to_scan': paths_to_scan,
+        'paths_per_second': len(file_paths) / min(timings),
+    }
+
+
+BENCHMARKS = {
+    'scan': bench_scan,
+    'scan_file': bench_scan_file,
+    'path_filtering': bench_path_filtering,
+}
+
+
+def run_case(
+    case: typing.Dict[str, typing.Any],
+) -> typing.Dict[str, typing.Any]:
+    '''Runs a single benchmark case. Every case runs in a process of its own, so the peak RSS that
+    is reported belongs to that case alone.'''
+    result = BENCHMARKS[case['benchmark']](case)
+    result['peak_rss_kb'] = peak_rss_kb()
+
+    return result
+
+
+def result_key(
+    result: typing.Dict[str, typing.Any],
+) -> typing.Tuple[str, int, typing.Optional[int]]:
+    return result['benchmark'], result['rule_count'], result['thread_count']
+
+
+def compare_results(
+    baseline_path: str,
+    results: typing.List[typing.Dict[str, typing.Any]],
+) -> None:
+    with open(baseline_path) as baseline_file:
+        baseline_results = {
+            result_key(result): result
+            for result in json.load(baseline_file)['results']
+        }
+
+    print(f'\nCompared to {baseline_path} (ratio above 1.00 is faster):')
+    for result in results:
+        baseline_result = baseline_results.get(result_key(result))
+        if baseline_result is None:
+            continue
+
+        for metric in THROUGHPUT_METRICS:
+            if metric in result and baseline_result.get(metric):
+                ratio = result[metric] / baseline_result[metric]
+                print(
+                    f'{result["benchmark"]:<16} rules={result["rule_count"]:<5} '
+                    f'threads={str(result["thread_count"]):<5} {metric:<20} {ratio:.2f}'
+                )
+
+
+def parse_int_list(
+    value: str,
+) -> typing.List[int]:
+    return [int(item) for item in value.split(',') if item]
+
+
+def pyrepscan_version() -> typing.Optional[str]:
+    try:
+        from importlib import metadata
+    except ImportError:
+        return None
+
+    try:
+        return metadata.version('pyrepscan')
+    except metadata.PackageNotFoundError:
+        return None
+
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description='Benchmarks PyRepScan against a generated git repository',
+    )
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', default=None, help='A results file of a previous run to compare with')
+    parser.add_argument('--repository-path', default=None, help='Reuse an existing generated repository')
+    parser.add_argument('--rule-counts', type=parse_int_list, default=[1, 10, 100])
+    parser.add_argument('--thread-counts', type=parse_int_list, default=sorted({1, os.cpu_count() or 1}))
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--scan-file-files', type=int, default=1000)
+    for field in dataclasses.fields(generate_repository.RepositorySpec):
+        parser.add_argument(
+            f'--{field.name.replace("_", "-")}',
+            type=field.type,
+            default=field.default,
+        )
+    arguments = parser.parse_args()
+
+    spec = generate_repository.RepositorySpec(
+        **{
+            field.name: getattr(arguments, field.name)
+            for field in dataclasses.fields(generate_repository.RepositorySpec)
+        }
+    )
+
+    with tempfile.TemporaryDirectory() as temporary_directory:
+        repository_path = arguments.repository_path
+        if repository_path is None:
+            repository_path = os.path.join(temporary_directory, 'repository')
+            manifest = generate_repository.generate_repository(
+                repository_path=repository_path,
+                spec=spec,
+            )
+        else:
+            manifest = None
+
+        cases = []
+        for rule_count in arguments.rule_counts:
+            for thread_count in arguments.thread_counts:
+                cases.append(
+                    {
+                        'benchmark': 'scan',
+                        'rule_count': rule_count,
+                        'thread_count': thread_count,
+                    }
+                )
+            for benchmark in ('scan_file', 'path_filtering'):
+                cases.append(
+                    {
+                        'benchmark': benchmark,
+                        'rule_count': rule_count,
+                        'thread_count': None,
+                    }
+                )
+
+        results = []
+        spawn_context = multiprocessing.get_context('spawn')
+        for case in cases:
+            case_arguments = {
+                **case,
+                'repository_path': repository_path,
+                'repeats': arguments.repeats,
+                'files': arguments.scan_file_files,
+                'spec': dataclasses.asdict(spec),
+            }
+            with spawn_context.Pool(processes=1) as pool:
+                result = pool.apply(run_case, (case_arguments,))
+            results.append({**case, **result})
+
+            throughput = ', '.join(
+                f'{metric}={result[metric]:,.1f}'
+                for metric in THROUGHPUT_METRICS
+                if metric in result
+            )
+            print(
+                f'{case["benchmark"]:<16} rules={case["rule_count"]:<5} threads={str(case["thread_count"]):<5} '
+                f'{result["best_seconds"]:.3f}s {throughput} peak_rss={result["peak_rss_kb"]}kb'
+            )
+
+    report = {
+        'metadata': {
+            'pyrepscan_version': pyrepscan_version(),
+            'python_version': platform.python_version(),
+            'platform': platform.platform(),
+            'machine': platform.machine(),
+            'cpu_count': os.cpu_count(),
+            'date': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'repeats': arguments.repeats,
+        },
+        'repository': manifest or {'path': repository_path},
+        'results': results,
+    }
+    with open(arguments.output, 'w') as output_file:
+        json.dump(report, output_file, indent=4)
+    print(f'\nResults were written to {arguments.output}')
+
+    if arguments.compare:
+        compare_results(arguments.compare, results)
+
 
-grs = pyrepscan.GitRepositoryScanner()
-grs.add_content_rule(
-    name='AWS Manager ID',
-    pattern=r'(A3T[A-Z0-9]|AKIA|AGPA|AIDA|AROA|AIPA|ANPA|ANVA|ASIA)[A-Z0-9]{16}',
-    whitelist_patterns=[],
-    blacklist_patterns=[],
-)
-results = grs.scan(
-    repository_path='/path/to/repository',
-    branch_glob_pattern='*',
-)
-print(len(results))
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,7 @@
 from . import pyrepscan
 
 
+CancellationToken = pyrepscan.CancellationToken
 GitRepositoryScanner = pyrepscan.GitRepositoryScanner
 RulesManager = pyrepscan.RulesManager
+ScanIterator = pyrepscan.ScanIterator
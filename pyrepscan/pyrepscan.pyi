@@ -1,9 +1,19 @@
+import asyncio
 import typing
 
 
 class GitRepositoryScanner:
     def __init__(
         self,
+        blob_cache_size: typing.Optional[int] = None,
+        num_threads: typing.Optional[int] = None,
+        max_memory: typing.Optional[int] = None,
+        cpu_affinity: typing.Optional[typing.List[int]] = None,
+        diff_hunks_only: typing.Optional[bool] = None,
+        match_context_size: typing.Optional[int] = None,
+        merge_strategy: typing.Optional[str] = None,
+        max_content_size: typing.Optional[int] = None,
+        profile: typing.Optional[bool] = None,
     ) -> None: ...
 
     def add_content_rule(
@@ -14,6 +24,16 @@ class GitRepositoryScanner:
         blacklist_patterns: typing.List[str],
     ) -> None: ...
 
+    def add_entropy_rule(
+        self,
+        name: str,
+        charset: str,
+        threshold: float,
+        min_length: int,
+        whitelist_patterns: typing.List[str],
+        blacklist_patterns: typing.List[str],
+    ) -> None: ...
+
     def add_file_path_rule(
         self,
         name: str,
@@ -30,12 +50,33 @@ class GitRepositoryScanner:
         file_path: str,
     ) -> None: ...
 
+    def add_file_glob_to_skip(
+        self,
+        glob: str,
+    ) -> None: ...
+
+    def add_file_glob_to_include(
+        self,
+        glob: str,
+    ) -> None: ...
+
+    def load_rules(
+        self,
+        rules_path: str,
+        cache_path: typing.Optional[str] = None,
+    ) -> None: ...
+
     def scan(
         self,
         repository_path: str,
         branch_glob_pattern: typing.Optional[str],
         from_timestamp: typing.Optional[int],
-    ) -> typing.List[typing.Dict[str, str]]: ...
+        state_path: typing.Optional[str] = None,
+        progress_callback: typing.Optional[typing.Callable[[typing.Dict[str, int]], None]] = None,
+        progress_interval: typing.Optional[float] = None,
+        cancellation_token: typing.Optional[CancellationToken] = None,
+        timeout: typing.Optional[float] = None,
+    ) -> typing.List[typing.Dict[str, typing.Union[str, int]]]: ...
 
     def scan_from_url(
         self,
@@ -43,7 +84,88 @@ class GitRepositoryScanner:
         repository_path: str,
         branch_glob_pattern: typing.Optional[str],
         from_timestamp: typing.Optional[int],
-    ) -> typing.List[typing.Dict[str, str]]: ...
+        state_path: typing.Optional[str] = None,
+        progress_callback: typing.Optional[typing.Callable[[typing.Dict[str, int]], None]] = None,
+        progress_interval: typing.Optional[float] = None,
+        cancellation_token: typing.Optional[CancellationToken] = None,
+        timeout: typing.Optional[float] = None,
+        update_remote_url: typing.Optional[bool] = None,
+    ) -> typing.List[typing.Dict[str, typing.Union[str, int]]]: ...
+
+    def scan_columns(
+        self,
+        repository_path: str,
+        branch_glob_pattern: typing.Optional[str] = None,
+        from_timestamp: typing.Optional[int] = None,
+        state_path: typing.Optional[str] = None,
+        progress_callback: typing.Optional[typing.Callable[[typing.Dict[str, int]], None]] = None,
+        progress_interval: typing.Optional[float] = None,
+        cancellation_token: typing.Optional[CancellationToken] = None,
+        timeout: typing.Optional[float] = None,
+    ) -> typing.Dict[str, typing.Dict[str, typing.List[typing.Any]]]: ...
+
+    def scan_many(
+        self,
+        repository_paths: typing.List[str],
+        branch_glob_pattern: typing.Optional[str] = None,
+        from_timestamp: typing.Optional[int] = None,
+        progress_callback: typing.Optional[typing.Callable[[typing.Dict[str, int]], None]] = None,
+        progress_interval: typing.Optional[float] = None,
+        cancellation_token: typing.Optional[CancellationToken] = None,
+        timeout: typing.Optional[float] = None,
+    ) -> typing.Tuple[typing.List[typing.Dict[str, typing.Union[str, int]]], typing.Dict[str, str]]: ...
+
+    def scan_range(
+        self,
+        repository_path: str,
+        revspecs: typing.List[str],
+        progress_callback: typing.Optional[typing.Callable[[typing.Dict[str, int]], None]] = None,
+        progress_interval: typing.Optional[float] = None,
+        cancellation_token: typing.Optional[CancellationToken] = None,
+        timeout: typing.Optional[float] = None,
+    ) -> typing.List[typing.Dict[str, typing.Union[str, int]]]: ...
+
+    def scan_index(
+        self,
+        repository_path: str,
+        progress_callback: typing.Optional[typing.Callable[[typing.Dict[str, int]], None]] = None,
+        progress_interval: typing.Optional[float] = None,
+        cancellation_token: typing.Optional[CancellationToken] = None,
+        timeout: typing.Optional[float] = None,
+    ) -> typing.List[typing.Dict[str, typing.Union[str, int]]]: ...
+
+    def scan_async(
+        self,
+        repository_path: str,
+        branch_glob_pattern: typing.Optional[str] = None,
+        from_timestamp: typing.Optional[int] = None,
+        state_path: typing.Optional[str] = None,
+        progress_callback: typing.Optional[typing.Callable[[typing.Dict[str, int]], None]] = None,
+        progress_interval: typing.Optional[float] = None,
+        cancellation_token: typing.Optional[CancellationToken] = None,
+        timeout: typing.Optional[float] = None,
+    ) -> asyncio.Future[typing.List[typing.Dict[str, typing.Union[str, int]]]]: ...
+
+    def scan_directory(
+        self,
+        directory_path: str,
+        progress_callback: typing.Optional[typing.Callable[[typing.Dict[str, int]], None]] = None,
+        progress_interval: typing.Optional[float] = None,
+        cancellation_token: typing.Optional[CancellationToken] = None,
+        timeout: typing.Optional[float] = None,
+    ) -> typing.List[typing.Dict[str, typing.Union[str, int]]]: ...
+
+    def scan_iter(
+        self,
+        repository_path: str,
+        branch_glob_pattern: typing.Optional[str] = None,
+        from_timestamp: typing.Optional[int] = None,
+        state_path: typing.Optional[str] = None,
+        progress_callback: typing.Optional[typing.Callable[[typing.Dict[str, int]], None]] = None,
+        progress_interval: typing.Optional[float] = None,
+        cancellation_token: typing.Optional[CancellationToken] = None,
+        timeout: typing.Optional[float] = None,
+    ) -> ScanIterator: ...
 
     def get_file_content(
         self,
@@ -51,6 +173,38 @@ class GitRepositoryScanner:
         file_oid: str,
     ) -> bytes: ...
 
+    def last_scan_stats(
+        self,
+    ) -> typing.Dict[str, int]: ...
+
+    def last_scan_rules_stats(
+        self,
+    ) -> typing.Dict[str, typing.Dict[str, int]]: ...
+
+
+class CancellationToken:
+    def __init__(
+        self,
+    ) -> None: ...
+
+    def cancel(
+        self,
+    ) -> None: ...
+
+    def is_cancelled(
+        self,
+    ) -> bool: ...
+
+
+class ScanIterator:
+    def __iter__(
+        self,
+    ) -> ScanIterator: ...
+
+    def __next__(
+        self,
+    ) -> typing.Dict[str, typing.Union[str, int]]: ...
+
 
 class RulesManager:
     def __init__(
@@ -65,6 +219,16 @@ class RulesManager:
         blacklist_patterns: typing.List[str],
     ) -> None: ...
 
+    def add_entropy_rule(
+        self,
+        name: str,
+        charset: str,
+        threshold: float,
+        min_length: int,
+        whitelist_patterns: typing.List[str],
+        blacklist_patterns: typing.List[str],
+    ) -> None: ...
+
     def add_file_path_rule(
         self,
         name: str,
@@ -81,6 +245,22 @@ class RulesManager:
         file_path: str,
     ) -> None: ...
 
+    def add_file_glob_to_skip(
+        self,
+        glob: str,
+    ) -> None: ...
+
+    def add_file_glob_to_include(
+        self,
+        glob: str,
+    ) -> None: ...
+
+    def load_rules(
+        self,
+        rules_path: str,
+        cache_path: typing.Optional[str] = None,
+    ) -> None: ...
+
     def should_scan_file_path(
         self,
         file_path: str,
@@ -92,6 +272,12 @@ class RulesManager:
         content: typing.Optional[str],
     ) -> typing.Optional[typing.List[typing.Dict[str, str]]]: ...
 
+    def scan_bytes(
+        self,
+        file_path: str,
+        content: typing.Union[bytes, bytearray, memoryview],
+    ) -> typing.Optional[typing.List[typing.Dict[str, str]]]: ...
+
     def check_pattern(
         self,
         content: str,
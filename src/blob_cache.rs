@@ -0,0 +1,151 @@
+use crate::rules_manager::ScanMatch;
+
+use crossbeam_utils::atomic::AtomicCell;
+use git2::Oid;
+use parking_lot::Mutex;
+use std::collections::{HashMap, VecDeque};
+use std::sync::Arc;
+
+pub const DEFAULT_BLOB_CACHE_SIZE: usize = 1_000_000;
+const NUMBER_OF_SHARDS: usize = 64;
+
+/// The outcome of scanning a single blob's content. It does not hold any commit related data so
+/// the same result can be attached to every commit the blob appears in.
+pub struct ScannedBlob {
+    pub is_scannable: bool,
+    pub content_matches: Vec<ScanMatch>,
+}
+
+impl ScannedBlob {
+    /// An approximation of the memory a cache entry of this blob takes
+    fn memory_size(
+        &self,
+    ) -> usize {
+        std::mem::size_of::<Oid>() * 2 + std::mem::size_of::<Self>() + self.content_matches.iter().map(
+            |content_match| {
+                std::mem::size_of::<ScanMatch>() + content_match.rule_name.len() + content_match.match_text.len() +
+                    content_match.context.as_ref().map_or(0, String::len)
+            }
+        ).sum::<usize>()
+    }
+}
+
+struct BlobCacheShard {
+    scanned_blobs: HashMap<Oid, Arc<ScannedBlob>>,
+    insertion_order: VecDeque<Oid>,
+    memory_size: usize,
+}
+
+/// A bounded, sharded cache of scanned blobs keyed by their OID. Shared by all the scanning threads
+/// so each unique blob is scanned only once per scan. When a shard is full, either by the number of
+/// entries or by their memory size, its oldest entries are evicted.
+pub struct BlobCache {
+    shards: Vec<Mutex<BlobCacheShard>>,
+    shard_capacity: usize,
+    shard_max_memory: usize,
+    hits: AtomicCell<u64>,
+    misses: AtomicCell<u64>,
+    evictions: AtomicCell<u64>,
+}
+
+impl BlobCache {
+    pub fn new(
+        capacity: usize,
+        max_memory: usize,
+    ) -> Self {
+        let mut shards = Vec::with_capacity(NUMBER_OF_SHARDS);
+        for _ in 0..NUMBER_OF_SHARDS {
+            shards.push(
+                Mutex::new(
+                    BlobCacheShard {
+                        scanned_blobs: HashMap::new(),
+                        insertion_order: VecDeque::new(),
+                        memory_size: 0,
+                    }
+                )
+            );
+        }
+
+        BlobCache {
+            shards,
+            shard_capacity: capacity.div_ceil(NUMBER_OF_SHARDS),
+            shard_max_memory: max_memory / NUMBER_OF_SHARDS,
+            hits: AtomicCell::new(0),
+            misses: AtomicCell::new(0),
+            evictions: AtomicCell::new(0),
+        }
+    }
+
+    fn shard(
+        &self,
+        oid: &Oid,
+    ) -> &Mutex<BlobCacheShard> {
+        &self.shards[oid.as_bytes()[0] as usize % NUMBER_OF_SHARDS]
+    }
+
+    pub fn get(
+        &self,
+        oid: &Oid,
+    ) -> Option<Arc<ScannedBlob>> {
+        if self.shard_capacity == 0 {
+            return None;
+        }
+
+        let scanned_blob = self.shard(oid).lock().scanned_blobs.get(oid).cloned();
+        if scanned_blob.is_some() {
+            self.hits.fetch_add(1);
+        } else {
+            self.misses.fetch_add(1);
+        }
+
+        scanned_blob
+    }
+
+    pub fn insert(
+        &self,
+        oid: Oid,
+        scanned_blob: Arc<ScannedBlob>,
+    ) {
+        if self.shard_capacity == 0 {
+            return;
+        }
+
+        let scanned_blob_memory_size = scanned_blob.memory_size();
+        if scanned_blob_memory_size > self.shard_max_memory {
+            return;
+        }
+
+        let mut shard = self.shard(&oid).lock();
+        if shard.scanned_blobs.contains_key(&oid) {
+            return;
+        }
+
+        while shard.scanned_blobs.len() >= self.shard_capacity ||
+            shard.memory_size + scanned_blob_memory_size > self.shard_max_memory {
+            let oldest_oid = match shard.insertion_order.pop_front() {
+                Some(oldest_oid) => oldest_oid,
+                None => break,
+            };
+            if let Some(oldest_scanned_blob) = shard.scanned_blobs.remove(&oldest_oid) {
+                shard.memory_size -= oldest_scanned_blob.memory_size();
+                self.evictions.fetch_add(1);
+            }
+        }
+
+        shard.memory_size += scanned_blob_memory_size;
+        shard.scanned_blobs.insert(oid, scanned_blob);
+        shard.insertion_order.push_back(oid);
+    }
+
+    pub fn stats(
+        &self,
+    ) -> HashMap<&'static str, u64> {
+        HashMap::from(
+            [
+                ("blob_cache_hits", self.hits.load()),
+                ("blob_cache_misses", self.misses.load()),
+                ("blob_cache_evictions", self.evictions.load()),
+            ]
+        )
+    }
+}
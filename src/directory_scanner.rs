@@ -0,0 +1,230 @@
+use crate::blob_cache::ScannedBlob;
+use crate::git_repository_scanner::{self, Match, ScanOptions};
+use crate::rules_manager;
+use crate::scan_stats::{ScanStats, ScanStatsSummary};
+
+use crossbeam_utils::atomic::AtomicCell;
+use crossbeam_utils::thread as crossbeam_thread;
+use crossbeam::deque;
+use memmap2::Mmap;
+use pyo3::exceptions::PyRuntimeError;
+use pyo3::prelude::*;
+use std::fs;
+use std::io::{self, Read};
+use std::path::{Path, PathBuf};
+use std::thread;
+use std::time;
+
+const MIN_MEMORY_MAPPED_FILE_SIZE: u64 = 64 * 1024;
+
+enum Task {
+    WalkDirectory(PathBuf),
+    ScanFile(PathBuf, u64),
+}
+
+/// The path of a file or a directory relative to the scanned directory, with `/` separators like the
+/// paths of a git tree, so the same globs and paths to skip apply, and the same file paths are reported,
+/// on every platform
+fn get_relative_path(
+    root_path: &Path,
+    path: &Path,
+) -> String {
+    let relative_path = path.strip_prefix(root_path).unwrap_or(path).to_string_lossy().into_owned();
+    if std::path::MAIN_SEPARATOR == '/' {
+        relative_path
+    } else {
+        relative_path.replace(std::path::MAIN_SEPARATOR, "/")
+    }
+}
+
+fn scan_file(
+    file_path: &Path,
+    file_size: u64,
+    rules_manager: &rules_manager::RulesManager,
+    scan_options: &ScanOptions,
+    scan_stats: &ScanStats,
+) -> io::Result<ScannedBlob> {
+    let mut file = fs::File::open(file_path)?;
+    // The size is taken again from the opened file, in case it was changed since it was walked
+    let file_size = file.metadata().map_or(file_size, |metadata| metadata.len());
+    if file_size > scan_options.max_content_size as u64 {
+        scan_stats.large_contents.fetch_add(1);
+
+        return git_repository_scanner::scan_content_stream(
+            &mut file,
+            rules_manager,
+            scan_options.max_content_size,
+            scan_options.match_context_size,
+            scan_stats,
+        );
+    }
+
+    let memory_mapped_content;
+    let read_content;
+    let content: &[u8] = if file_size >= MIN_MEMORY_MAPPED_FILE_SIZE {
+        // The file is only read during the scan. A file that is truncated by another process
+        // while it is mapped might crash the scan, which is the same tradeoff grep tools make.
+        memory_mapped_content = unsafe { Mmap::map(&file)? };
+        &memory_mapped_content
+    } else {
+        let mut file_content = Vec::with_capacity(file_size as usize);
+        file.read_to_end(&mut file_content)?;
+        read_content = file_content;
+        &read_content
+    };
+
+    Ok(
+        git_repository_scanner::scan_content(
+            content,
+            git_repository_scanner::is_binary(content),
+            rules_manager,
+            scan_options.match_context_size,
+            scan_stats,
+        )
+    )
+}
+
+/// Scans all the files under a directory, without any git history. Walking the directories and
+/// scanning the files are tasks of a single work-stealing scheduler, so both are done in parallel.
+/// Symbolic links are not followed and .git directories are skipped. The matches of every file
+/// are passed to output_matches, and when it returns false, the scan stops. Returns the statistics of the scan.
+pub fn scan_directory(
+    directory_path: &str,
+    rules_manager: &rules_manager::RulesManager,
+    scan_options: &ScanOptions,
+    check_progress: &dyn Fn(&ScanStats) -> PyResult<()>,
+    output_matches: &(dyn Fn(Vec<Match>) -> bool + Sync),
+) -> PyResult<ScanStatsSummary> {
+    let root_path = Path::new(directory_path);
+    if !root_path.is_dir() {
+        return Err(
+            PyRuntimeError::new_err(format!("Not a directory: {directory_path}"))
+        );
+    }
+
+    let global_queue = deque::Injector::new();
+    global_queue.push(Task::WalkDirectory(root_path.to_path_buf()));
+    let pending_tasks = AtomicCell::new(1usize);
+    let scan_stats = ScanStats::new(scan_options.profile, rules_manager);
+
+    let mut check_progress_result: PyResult<()> = Ok(());
+
+    let should_stop = AtomicCell::new(false);
+    let number_of_threads = git_repository_scanner::get_number_of_threads(scan_options);
+    let local_queues: Vec<deque::Worker<Task>> = (0..number_of_threads).map(
+        |_| deque::Worker::new_fifo()
+    ).collect();
+    let stealers: Vec<deque::Stealer<Task>> = local_queues.iter().map(
+        |local_queue| local_queue.stealer()
+    ).collect();
+
+    let global_queue = &global_queue;
+    let pending_tasks = &pending_tasks;
+    let scan_stats = &scan_stats;
+    let should_stop = &should_stop;
+    let stealers = &stealers;
+
+    crossbeam_thread::scope(
+        |scope| {
+            for (thread_index, local_queue) in local_queues.into_iter().enumerate() {
+                scope.spawn(
+                    move |_| {
+                        git_repository_scanner::pin_current_thread(scan_options, thread_index);
+
+                        while !should_stop.load() {
+                            let task = match git_repository_scanner::find_task(&local_queue, global_queue, stealers) {
+                                Some(task) => task,
+                                None => {
+                                    if pending_tasks.load() == 0 {
+                                        break;
+                                    }
+                                    thread::sleep(time::Duration::from_millis(1));
+
+                                    continue;
+                                },
+                            };
+
+                            match task {
+                                Task::WalkDirectory(walked_directory_path) => {
+                                    if let Ok(directory_entries) = fs::read_dir(&walked_directory_path) {
+                                        for directory_entry in directory_entries.flatten() {
+                                            let file_type = match directory_entry.file_type() {
+                                                Ok(file_type) => file_type,
+                                                Err(_) => continue,
+                                            };
+
+                                            if file_type.is_dir() {
+                                                if directory_entry.file_name() == ".git" {
+                                                    continue;
+                                                }
+                                                let directory_path = directory_entry.path();
+                                                let relative_directory_path = get_relative_path(root_path, &directory_path);
+                                                if !rules_manager.should_walk_directory_path_bytes(relative_directory_path.as_bytes()) {
+                                                    continue;
+                                                }
+                                                pending_tasks.fetch_add(1);
+                                                local_queue.push(Task::WalkDirectory(directory_path));
+                                            } else if file_type.is_file() {
+                                                if let Ok(metadata) = directory_entry.metadata() {
+                                                    pending_tasks.fetch_add(1);
+                                                    local_queue.push(Task::ScanFile(directory_entry.path(), metadata.len()));
+                                                }
+                                            }
+                                        }
+                                    }
+                                },
+                                Task::ScanFile(file_path, file_size) => {
+                                    let relative_file_path = get_relative_path(root_path, &file_path);
+
+                                    if rules_manager.should_scan_file_path_bytes(relative_file_path.as_bytes()) {
+                                        if let Ok(scanned_file) = scan_file(
+                                            &file_path,
+                                            file_size,
+                                            rules_manager,
+                                            scan_options,
+                                            scan_stats,
+                                        ) {
+                                            if scanned_file.is_scannable {
+                                                let file_matches: Vec<Match> = rules_manager.scan_file_path(
+                                                    &relative_file_path
+                                                ).into_iter().chain(
+                                                    scanned_file.content_matches
+                                                ).map(
+                                                    |scan_match| git_repository_scanner::file_match_hashmap(
+                                                        relative_file_path.clone(),
+                                                        scan_match,
+                                                    )
+                                                ).collect();
+
+                                                scan_stats.matches.fetch_add(file_matches.len() as u64);
+                                                if !file_matches.is_empty() && !output_matches(file_matches) {
+                                                    should_stop.store(true);
+                                                }
+                                            }
+                                        }
+                                    }
+                                },
+                            }
+                            pending_tasks.fetch_sub(1);
+                        }
+                    }
+                );
+            }
+
+            while pending_tasks.load() > 0 && !should_stop.load() {
+                check_progress_result = check_progress(scan_stats);
+                if check_progress_result.is_err() {
+                    should_stop.store(true);
+
+                    break;
+                }
+
+                thread::sleep(git_repository_scanner::PROGRESS_CHECK_INTERVAL);
+            }
+        }
+    ).unwrap_or_default();
+
+    check_progress_result?;
+
+    Ok(scan_stats.summary(None, rules_manager))
+}
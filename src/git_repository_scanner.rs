@@ -1,49 +1,937 @@
+use crate::blob_cache::{BlobCache, ScannedBlob};
 use crate::rules_manager;
+use crate::scan_state::ScanState;
+use crate::scan_stats::{ScanStats, ScanStatsSummary};
 
 use chrono::prelude::*;
 use crossbeam_utils::atomic::AtomicCell;
 use crossbeam_utils::thread as crossbeam_thread;
-use crossbeam::queue::ArrayQueue;
-use git2::{Oid, Repository, Delta};
+use crossbeam::deque;
+use git2::{Blob, Delta, Diff, DiffOptions, Oid, Patch, Repository, Tree};
 use parking_lot::Mutex;
 use pyo3::exceptions::PyRuntimeError;
 use pyo3::prelude::*;
-use std::collections::HashMap;
+use std::collections::{HashMap, HashSet};
+use std::collections::hash_map::Entry;
+use std::io::{self, Read};
 use std::path::Path;
 use std::sync::Arc;
 use std::thread;
 use std::time;
 
-fn scan_commit_oid(
-    should_stop: &AtomicCell<bool>,
-    git_repo: &Repository,
-    oid: &Oid,
-    rules_manager: &rules_manager::RulesManager,
-    output_matches: Arc<Mutex<Vec<HashMap<&str, String>>>>,
-) -> Result<(), git2::Error> {
-    let commit = git_repo.find_commit(*oid)?;
+/// A value of a match dictionary. Most of the values are texts, and positions are numbers
+pub enum MatchValue {
+    Text(String),
+    Number(u64),
+}
 
-    let commit_parent_count = commit.parent_count();
-    if commit_parent_count > 1 {
-        return Ok(());
+impl From<String> for MatchValue {
+    fn from(text: String) -> Self {
+        MatchValue::Text(text)
     }
+}
 
-    let commit_tree = commit.tree()?;
+impl From<u64> for MatchValue {
+    fn from(number: u64) -> Self {
+        MatchValue::Number(number)
+    }
+}
 
-    let commit_diff = if commit_parent_count == 0 {
-        git_repo.diff_tree_to_tree(None, Some(&commit_tree), None)?
-    } else {
-        let parent_commit = commit.parent(0)?;
-        let parent_commit_tree = parent_commit.tree()?;
+impl ToPyObject for MatchValue {
+    fn to_object(
+        &self,
+        py: Python,
+    ) -> PyObject {
+        match self {
+            MatchValue::Text(text) => text.to_object(py),
+            MatchValue::Number(number) => number.to_object(py),
+        }
+    }
+}
+
+impl IntoPy<PyObject> for MatchValue {
+    fn into_py(
+        self,
+        py: Python,
+    ) -> PyObject {
+        match self {
+            MatchValue::Text(text) => text.into_py(py),
+            MatchValue::Number(number) => number.into_py(py),
+        }
+    }
+}
+
+pub type Match = HashMap<&'static str, MatchValue>;
+
+/// The part of a match dictionary that describes the file and the match itself
+pub fn file_match_hashmap(
+    file_path: String,
+    scan_match: rules_manager::ScanMatch,
+) -> Match {
+    let mut match_hashmap = HashMap::with_capacity(15);
+    match_hashmap.insert("file_path", file_path.into());
+    match_hashmap.insert("rule_name", scan_match.rule_name.into());
+    match_hashmap.insert("match_text", scan_match.match_text.into());
+    if let Some(position) = scan_match.position {
+        match_hashmap.insert("offset", (position.offset as u64).into());
+        match_hashmap.insert("line_number", (position.line_number as u64).into());
+        match_hashmap.insert("column", (position.column as u64).into());
+    }
+    if let Some(context) = scan_match.context {
+        match_hashmap.insert("context", context.into());
+    }
+
+    match_hashmap
+}
+
+/// A match that was found in one of the files of a commit
+pub struct FileMatch {
+    pub file_oid: Oid,
+    pub file_path: String,
+    pub scan_match: rules_manager::ScanMatch,
+}
+
+/// All the matches of a single commit. The metadata of the commit is kept once for all of them
+/// and is copied into each match only when the matches are turned into dictionaries.
+pub struct CommitMatches {
+    pub repository_path: Option<String>,
+    pub commit_id: String,
+    pub commit_message: String,
+    pub commit_time: String,
+    pub author_name: String,
+    pub author_email: String,
+    pub file_matches: Vec<FileMatch>,
+}
+
+/// Matches whose memory usage is accounted for by a MatchesBuffer
+pub trait MatchesMemorySize {
+    /// An approximation of the memory the matches take
+    fn memory_size(
+        &self,
+    ) -> usize;
+}
+
+impl MatchesMemorySize for CommitMatches {
+    fn memory_size(
+        &self,
+    ) -> usize {
+        std::mem::size_of::<Self>() + self.repository_path.as_ref().map_or(0, String::len) +
+            self.commit_id.len() + self.commit_message.len() + self.commit_time.len() +
+            self.author_name.len() + self.author_email.len() + self.file_matches.iter().map(
+                |file_match| {
+                    std::mem::size_of::<FileMatch>() + file_match.file_path.len() +
+                        file_match.scan_match.rule_name.len() + file_match.scan_match.match_text.len() +
+                        file_match.scan_match.context.as_ref().map_or(0, String::len)
+                }
+            ).sum::<usize>()
+    }
+}
+
+/// The matches of a single file of a directory scan
+impl MatchesMemorySize for Vec<Match> {
+    fn memory_size(
+        &self,
+    ) -> usize {
+        self.iter().map(
+            |scan_match| std::mem::size_of::<Match>() + scan_match.values().map(
+                |value| std::mem::size_of::<(&str, MatchValue)>() + match value {
+                    MatchValue::Text(text) => text.len(),
+                    MatchValue::Number(_) => 0,
+                }
+            ).sum::<usize>()
+        ).sum()
+    }
+}
+
+impl CommitMatches {
+    pub fn into_matches(
+        self,
+    ) -> Vec<Match> {
+        let mut matches = Vec::with_capacity(self.file_matches.len());
+        for file_match in self.file_matches {
+            let mut match_hashmap = file_match_hashmap(file_match.file_path, file_match.scan_match);
+            match_hashmap.insert("commit_id", self.commit_id.clone().into());
+            match_hashmap.insert("commit_message", self.commit_message.clone().into());
+            match_hashmap.insert("commit_time", self.commit_time.clone().into());
+            match_hashmap.insert("author_name", self.author_name.clone().into());
+            match_hashmap.insert("author_email", self.author_email.clone().into());
+            match_hashmap.insert("file_oid", file_match.file_oid.to_string().into());
+            if let Some(repository_path) = &self.repository_path {
+                match_hashmap.insert("repository_path", repository_path.clone().into());
+            }
+            matches.push(match_hashmap);
+        }
+
+        matches
+    }
+}
+
+/// The matches of a scan as columns. The metadata of each commit is kept once in the commits columns
+/// and every match points to its commit by the commit_index column. Missing values are None.
+#[derive(Default)]
+pub struct ColumnarMatches {
+    commit_ids: Vec<String>,
+    commit_messages: Vec<String>,
+    commit_times: Vec<String>,
+    author_names: Vec<String>,
+    author_emails: Vec<String>,
+    commit_indices: Vec<u64>,
+    file_paths: Vec<String>,
+    file_oids: Vec<String>,
+    rule_names: Vec<String>,
+    match_texts: Vec<String>,
+    offsets: Vec<Option<u64>>,
+    line_numbers: Vec<Option<u64>>,
+    columns: Vec<Option<u64>>,
+    contexts: Vec<Option<String>>,
+}
+
+impl ColumnarMatches {
+    pub fn new(
+        commits_matches: Vec<CommitMatches>,
+    ) -> Self {
+        let mut columnar_matches = ColumnarMatches::default();
+        for (commit_index, commit_matches) in commits_matches.into_iter().enumerate() {
+            columnar_matches.commit_ids.push(commit_matches.commit_id);
+            columnar_matches.commit_messages.push(commit_matches.commit_message);
+            columnar_matches.commit_times.push(commit_matches.commit_time);
+            columnar_matches.author_names.push(commit_matches.author_name);
+            columnar_matches.author_emails.push(commit_matches.author_email);
+
+            for file_match in commit_matches.file_matches {
+                let position = file_match.scan_match.position;
+
+                columnar_matches.commit_indices.push(commit_index as u64);
+                columnar_matches.file_paths.push(file_match.file_path);
+                columnar_matches.file_oids.push(file_match.file_oid.to_string());
+                columnar_matches.rule_names.push(file_match.scan_match.rule_name);
+                columnar_matches.match_texts.push(file_match.scan_match.match_text);
+                columnar_matches.offsets.push(position.as_ref().map(|position| position.offset as u64));
+                columnar_matches.line_numbers.push(position.as_ref().map(|position| position.line_number as u64));
+                columnar_matches.columns.push(position.as_ref().map(|position| position.column as u64));
+                columnar_matches.contexts.push(file_match.scan_match.context);
+            }
+        }
+
+        columnar_matches
+    }
+}
+
+impl IntoPy<PyObject> for ColumnarMatches {
+    fn into_py(
+        self,
+        py: Python,
+    ) -> PyObject {
+        let commits = HashMap::from(
+            [
+                ("commit_id", self.commit_ids.into_py(py)),
+                ("commit_message", self.commit_messages.into_py(py)),
+                ("commit_time", self.commit_times.into_py(py)),
+                ("author_name", self.author_names.into_py(py)),
+                ("author_email", self.author_emails.into_py(py)),
+            ]
+        );
+        let matches = HashMap::from(
+            [
+                ("commit_index", self.commit_indices.into_py(py)),
+                ("file_path", self.file_paths.into_py(py)),
+                ("file_oid", self.file_oids.into_py(py)),
+                ("rule_name", self.rule_names.into_py(py)),
+                ("match_text", self.match_texts.into_py(py)),
+                ("offset", self.offsets.into_py(py)),
+                ("line_number", self.line_numbers.into_py(py)),
+                ("column", self.columns.into_py(py)),
+                ("context", self.contexts.into_py(py)),
+            ]
+        );
+
+        HashMap::from(
+            [
+                ("commits", commits.into_py(py)),
+                ("matches", matches.into_py(py)),
+            ]
+        ).into_py(py)
+    }
+}
+
+pub const DEFAULT_MAX_CONTENT_SIZE: usize = 5_000_000;
+const BINARY_CHECK_SIZE: usize = 8000;
+const MAX_OPEN_REPOSITORIES_PER_THREAD: usize = 16;
+const COMMIT_OIDS_QUEUE_SIZE: usize = 10000;
+const MIN_COMMITS_PER_THREAD: usize = 32;
+/// How often a running scan reports its progress and checks whether it should stop
+pub const PROGRESS_CHECK_INTERVAL: time::Duration = time::Duration::from_millis(100);
+
+/// How merge commits are scanned
+#[derive(Clone, Copy, PartialEq, Eq)]
+pub enum MergeStrategy {
+    /// Merge commits are not scanned
+    Skip,
+    /// Merge commits are scanned like regular commits, by their diff against their first parent
+    FirstParent,
+    /// Only the lines of a merge commit that were added relative to all of its parents are scanned
+    Combined,
+}
+
+impl MergeStrategy {
+    pub fn from_name(
+        name: &str,
+    ) -> Option<Self> {
+        match name {
+            "skip" => Some(MergeStrategy::Skip),
+            "first_parent" => Some(MergeStrategy::FirstParent),
+            "combined" => Some(MergeStrategy::Combined),
+            _ => None,
+        }
+    }
+}
+
+/// Scanner wide settings that are shared by all the scans of a GitRepositoryScanner
+#[derive(Clone)]
+pub struct ScanOptions {
+    pub blob_cache_size: usize,
+    pub num_threads: Option<usize>,
+    pub cpu_affinity: Option<Vec<usize>>,
+    pub max_memory: Option<usize>,
+    pub diff_hunks_only: bool,
+    pub match_context_size: usize,
+    pub merge_strategy: MergeStrategy,
+    pub max_content_size: usize,
+    pub profile: bool,
+}
+
+impl Default for ScanOptions {
+    fn default() -> Self {
+        ScanOptions {
+            blob_cache_size: crate::blob_cache::DEFAULT_BLOB_CACHE_SIZE,
+            num_threads: None,
+            cpu_affinity: None,
+            max_memory: None,
+            diff_hunks_only: false,
+            match_context_size: 0,
+            merge_strategy: MergeStrategy::Skip,
+            max_content_size: DEFAULT_MAX_CONTENT_SIZE,
+            profile: false,
+        }
+    }
+}
+
+impl ScanOptions {
+    /// The blob cache is only an optimization, so it may use up to half of the memory budget
+    /// and the rest is left for the matches
+    pub fn blob_cache_max_memory(
+        &self,
+    ) -> usize {
+        self.max_memory.map_or(usize::MAX, |max_memory| max_memory / 2)
+    }
+
+    pub fn matches_max_memory(
+        &self,
+    ) -> usize {
+        self.max_memory.map_or(usize::MAX, |max_memory| max_memory - self.blob_cache_max_memory())
+    }
+}
+
+/// Collects the matches of a scan while keeping track of their approximate memory usage.
+/// Once the memory budget is exceeded, it refuses new matches which stops the scan.
+pub struct MatchesBuffer<T = CommitMatches> {
+    matches: Mutex<(Vec<T>, usize)>,
+    max_memory: usize,
+    exceeded_max_memory: AtomicCell<bool>,
+}
+
+impl<T: MatchesMemorySize> MatchesBuffer<T> {
+    pub fn new(
+        max_memory: usize,
+    ) -> Self {
+        MatchesBuffer {
+            matches: Mutex::new((Vec::with_capacity(10000), 0)),
+            max_memory,
+            exceeded_max_memory: AtomicCell::new(false),
+        }
+    }
+
+    pub fn push(
+        &self,
+        pushed_matches: T,
+    ) -> bool {
+        let pushed_matches_memory_size = pushed_matches.memory_size();
+
+        let mut matches = self.matches.lock();
+        if matches.1 + pushed_matches_memory_size > self.max_memory {
+            self.exceeded_max_memory.store(true);
+
+            return false;
+        }
+        matches.0.push(pushed_matches);
+        matches.1 += pushed_matches_memory_size;
+
+        true
+    }
+
+    fn into_pushed_matches(
+        self,
+    ) -> PyResult<Vec<T>> {
+        if self.exceeded_max_memory.load() {
+            return Err(
+                PyRuntimeError::new_err(
+                    format!(
+                        "The matches exceeded the memory budget of {} bytes, use scan_iter to stream them",
+                        self.max_memory,
+                    )
+                )
+            );
+        }
+
+        Ok(self.matches.into_inner().0)
+    }
+}
+
+impl MatchesBuffer<CommitMatches> {
+    pub fn into_matches(
+        self,
+    ) -> PyResult<Vec<Match>> {
+        Ok(
+            self.into_pushed_matches()?.into_iter().flat_map(
+                |commit_matches| commit_matches.into_matches()
+            ).collect()
+        )
+    }
+
+    pub fn into_columns(
+        self,
+    ) -> PyResult<ColumnarMatches> {
+        Ok(ColumnarMatches::new(self.into_pushed_matches()?))
+    }
+}
+
+impl MatchesBuffer<Vec<Match>> {
+    pub fn into_matches(
+        self,
+    ) -> PyResult<Vec<Match>> {
+        Ok(self.into_pushed_matches()?.into_iter().flatten().collect())
+    }
+}
+
+/// When no number of threads was set, uses the available parallelism which takes both the CPU
+/// affinity mask of the process and the cgroup CPU quota into account
+pub fn get_number_of_threads(
+    scan_options: &ScanOptions,
+) -> usize {
+    scan_options.num_threads.unwrap_or_else(
+        || std::thread::available_parallelism().map_or(1, |number_of_cores| number_of_cores.get())
+    ).max(1)
+}
+
+pub fn pin_current_thread(
+    scan_options: &ScanOptions,
+    thread_index: usize,
+) {
+    if let Some(cpu_affinity) = &scan_options.cpu_affinity {
+        if !cpu_affinity.is_empty() {
+            core_affinity::set_for_current(
+                core_affinity::CoreId {
+                    id: cpu_affinity[thread_index % cpu_affinity.len()],
+                }
+            );
+        }
+    }
+}
+
+/// The content around a match, up to context_size bytes from each of its sides, without
+/// splitting the characters at its edges
+fn get_match_context(
+    content: &[u8],
+    offset: usize,
+    length: usize,
+    context_size: usize,
+) -> String {
+    let is_continuation_byte = |index: usize| index < content.len() && content[index] & 0xC0 == 0x80;
+
+    let mut start = offset.saturating_sub(context_size);
+    while start > 0 && is_continuation_byte(start) {
+        start -= 1;
+    }
+    let mut end = offset.saturating_add(length).saturating_add(context_size).min(content.len());
+    while is_continuation_byte(end) {
+        end += 1;
+    }
+
+    rules_manager::decode_text(&content[start..end])
+}
+
+/// The same heuristic git uses, a content is binary if it has a NUL byte within its beginning
+pub fn is_binary(
+    content: &[u8],
+) -> bool {
+    content[..content.len().min(BINARY_CHECK_SIZE)].contains(&0)
+}
+
+/// Scans a content with the content rules. Contents that are too short are not scannable, and binary
+/// contents are scannable only by the file path rules. UTF-8 and Latin-1 contents are scanned in place,
+/// and UTF-16 contents are decoded first, although git considers them binary.
+pub fn scan_content(
+    content: &[u8],
+    is_binary: bool,
+    rules_manager: &rules_manager::RulesManager,
+    match_context_size: usize,
+    scan_stats: &ScanStats,
+) -> ScannedBlob {
+    if content.len() < 2 {
+        return ScannedBlob {
+            is_scannable: false,
+            content_matches: Vec::new(),
+        };
+    }
 
-        git_repo.diff_tree_to_tree(Some(&parent_commit_tree), Some(&commit_tree), None)?
+    let decoded_content = rules_manager::decode_utf16(content);
+    let scanned_content = match &decoded_content {
+        Some(decoded_content) => decoded_content.as_bytes(),
+        None if is_binary => {
+            scan_stats.binary_contents.fetch_add(1);
+
+            return ScannedBlob {
+                is_scannable: true,
+                content_matches: Vec::new(),
+            };
+        },
+        None => content,
     };
 
-    for delta in commit_diff.deltas() {
-        if should_stop.load() {
+    let content_scan_timer = scan_stats.start_timer();
+    scan_stats.bytes_scanned.fetch_add(scanned_content.len() as u64);
+    let mut content_matches = rules_manager.scan_content(scanned_content, Some(scan_stats));
+    if match_context_size > 0 {
+        for content_match in content_matches.iter_mut() {
+            if let Some(position) = &content_match.position {
+                content_match.context = Some(
+                    get_match_context(
+                        scanned_content,
+                        position.offset,
+                        position.length,
+                        match_context_size,
+                    )
+                );
+            }
+        }
+    }
+    if let Some(decoded_content) = &decoded_content {
+        rules_manager::translate_utf16_positions(decoded_content, &mut content_matches);
+    }
+    scan_stats.record_time(&scan_stats.content_scan_time_ns, content_scan_timer);
+
+    ScannedBlob {
+        is_scannable: true,
+        content_matches,
+    }
+}
+
+/// Scans a content that is larger than max_content_size without reading all of it into memory. The
+/// content is read and scanned in windows of max_content_size bytes, and every window also holds the
+/// beginning of the next one, as long as the longest possible match, so matches that cross the edge
+/// between two windows are found too. A match that starts within a match of the same rule that a
+/// previous window reported is the tail of that match and is dropped. Binary contents, including
+/// UTF-16 ones, are scannable only by the file path rules.
+pub fn scan_content_stream(
+    reader: &mut dyn Read,
+    rules_manager: &rules_manager::RulesManager,
+    max_content_size: usize,
+    match_context_size: usize,
+    scan_stats: &ScanStats,
+) -> io::Result<ScannedBlob> {
+    let window_step = max_content_size.max(1);
+    let window_size = window_step + rules_manager.max_match_length();
+
+    let mut content_matches = Vec::new();
+    let mut window = Vec::with_capacity(window_size);
+    let mut window_offset = 0;
+    let mut window_line_number = 1;
+    let mut window_column = 1;
+    let mut last_reported_ends: HashMap<String, usize> = HashMap::new();
+    loop {
+        let blob_read_timer = scan_stats.start_timer();
+        (&mut *reader).take((window_size - window.len()) as u64).read_to_end(&mut window)?;
+        scan_stats.record_time(&scan_stats.blob_read_time_ns, blob_read_timer);
+        let is_last_window = window.len() < window_size;
+
+        if window_offset == 0 {
+            if window.len() < 2 {
+                return Ok(
+                    ScannedBlob {
+                        is_scannable: false,
+                        content_matches,
+                    }
+                );
+            }
+            if is_binary(&window) {
+                scan_stats.binary_contents.fetch_add(1);
+
+                break;
+            }
+        }
+
+        let content_scan_timer = scan_stats.start_timer();
+        let window_matches = rules_manager.scan_content(&window, Some(scan_stats));
+        scan_stats.record_time(&scan_stats.content_scan_time_ns, content_scan_timer);
+        let mut window_reported_ends = HashMap::new();
+        for mut content_match in window_matches {
+            let position = match &mut content_match.position {
+                Some(position) => position,
+                None => continue,
+            };
+            // Matches that start within the overlap are found again by the next window
+            if !is_last_window && position.offset >= window_step {
+                continue;
+            }
+            // An open ended match that crosses the edge was reported in full by the previous window
+            let match_start = window_offset + position.offset;
+            if last_reported_ends.get(&content_match.rule_name).is_some_and(
+                |last_reported_end| match_start < *last_reported_end
+            ) {
+                continue;
+            }
+            let window_reported_end = window_reported_ends.entry(content_match.rule_name.clone()).or_insert(0);
+            *window_reported_end = (*window_reported_end).max(match_start + position.length);
+
+            if match_context_size > 0 {
+                content_match.context = Some(
+                    get_match_context(
+                        &window,
+                        position.offset,
+                        position.length,
+                        match_context_size,
+                    )
+                );
+            }
+            if position.line_number == 1 {
+                position.column += window_column - 1;
+            }
+            position.line_number += window_line_number - 1;
+            position.offset += window_offset;
+
+            content_matches.push(content_match);
+        }
+        last_reported_ends.extend(window_reported_ends);
+
+        if is_last_window {
+            scan_stats.bytes_scanned.fetch_add(window.len() as u64);
+
             break;
         }
+        scan_stats.bytes_scanned.fetch_add(window_step as u64);
 
+        let scanned_window_part = &window[..window_step];
+        let characters_count = |bytes: &[u8]| bytes.iter().filter(|byte| **byte & 0xC0 != 0x80).count();
+        match scanned_window_part.iter().rposition(|byte| *byte == b'\n') {
+            Some(last_line_end) => {
+                window_line_number += scanned_window_part.iter().filter(|byte| **byte == b'\n').count();
+                window_column = characters_count(&scanned_window_part[last_line_end + 1..]) + 1;
+            },
+            None => window_column += characters_count(scanned_window_part),
+        }
+        window_offset += window_step;
+        window.drain(..window_step);
+    }
+
+    Ok(
+        ScannedBlob {
+            is_scannable: true,
+            content_matches,
+        }
+    )
+}
+
+fn scan_blob(
+    blob: &Blob,
+    rules_manager: &rules_manager::RulesManager,
+    match_context_size: usize,
+    scan_stats: &ScanStats,
+) -> ScannedBlob {
+    scan_content(blob.content(), blob.is_binary(), rules_manager, match_context_size, scan_stats)
+}
+
+/// Scans a blob by its OID. Blobs that are larger than max_content_size are streamed from the object
+/// database rather than read into memory at once.
+fn scan_blob_oid(
+    context: ScanContext,
+    git_repo: &Repository,
+    odb: &git2::Odb,
+    blob_oid: Oid,
+) -> Result<ScannedBlob, git2::Error> {
+    let max_content_size = context.scan_options.max_content_size;
+    if let Ok((blob_size, _)) = odb.read_header(blob_oid) {
+        if blob_size > max_content_size {
+            context.scan_stats.large_contents.fetch_add(1);
+
+            // Streaming is not supported for packed objects, whose content is read into memory
+            // and scanned in the same windows instead
+            let scanned_blob = match odb.reader(blob_oid) {
+                Ok((mut blob_reader, _, _)) => scan_content_stream(
+                    &mut blob_reader,
+                    context.rules_manager,
+                    max_content_size,
+                    context.scan_options.match_context_size,
+                    context.scan_stats,
+                ),
+                Err(_) => {
+                    let blob_read_timer = context.scan_stats.start_timer();
+                    let blob = git_repo.find_blob(blob_oid)?;
+                    context.scan_stats.record_time(&context.scan_stats.blob_read_time_ns, blob_read_timer);
+
+                    scan_content_stream(
+                        &mut blob.content(),
+                        context.rules_manager,
+                        max_content_size,
+                        context.scan_options.match_context_size,
+                        context.scan_stats,
+                    )
+                },
+            };
+
+            return scanned_blob.map_err(
+                |error| git2::Error::from_str(&error.to_string())
+            );
+        }
+    }
+
+    let blob_read_timer = context.scan_stats.start_timer();
+    let blob = git_repo.find_blob(blob_oid)?;
+    context.scan_stats.record_time(&context.scan_stats.blob_read_time_ns, blob_read_timer);
+
+    Ok(
+        scan_blob(
+            &blob,
+            context.rules_manager,
+            context.scan_options.match_context_size,
+            context.scan_stats,
+        )
+    )
+}
+
+/// Everything a scanning thread needs to scan the commits of a repository
+#[derive(Clone, Copy)]
+struct ScanContext<'a> {
+    rules_manager: &'a rules_manager::RulesManager,
+    scan_options: &'a ScanOptions,
+    blob_cache: &'a BlobCache,
+    scan_stats: &'a ScanStats,
+    scan_state: Option<&'a ScanState>,
+    from_timestamp: i64,
+    should_stop: &'a AtomicCell<bool>,
+    output_matches: &'a (dyn Fn(CommitMatches) -> bool + Sync),
+}
+
+/// The lines a commit added to a modified file, joined into a single buffer. Every line is kept with
+/// its offset within the buffer and its line number in the new file. Only runs of consecutive lines
+/// are scanned together, so a match never spans lines that are apart in the new file.
+struct AddedLines {
+    content: Vec<u8>,
+    lines: Vec<(usize, u32)>,
+}
+
+/// Calls handle_added_line with the line number and the content of every line that a patch added
+fn for_each_added_line(
+    patch: &Patch,
+    handle_added_line: &mut dyn FnMut(u32, &[u8]),
+) -> Result<(), git2::Error> {
+    for hunk_index in 0..patch.num_hunks() {
+        for line_index in 0..patch.num_lines_in_hunk(hunk_index)? {
+            let line = patch.line_in_hunk(hunk_index, line_index)?;
+            if line.origin() != '+' {
+                continue;
+            }
+            if let Some(line_number) = line.new_lineno() {
+                handle_added_line(line_number, line.content());
+            }
+        }
+    }
+
+    Ok(())
+}
+
+/// The line numbers of a merged file that were added relative to every one of the other parents
+/// of the merge. None when the file does not exist in any of them, so all of its lines may be new.
+fn get_lines_added_to_other_parents(
+    git_repo: &Repository,
+    other_parent_trees: &[Tree],
+    file_path: &Path,
+    blob_oid: Oid,
+) -> Result<Option<HashSet<u32>>, git2::Error> {
+    let blob = git_repo.find_blob(blob_oid)?;
+
+    let mut added_line_numbers: Option<HashSet<u32>> = None;
+    for other_parent_tree in other_parent_trees {
+        let other_parent_blob = match other_parent_tree.get_path(file_path) {
+            Ok(tree_entry) => git_repo.find_blob(tree_entry.id())?,
+            Err(_) => continue,
+        };
+        let patch = Patch::from_blobs(&other_parent_blob, None, &blob, None, None)?;
+
+        let mut other_parent_added_line_numbers = HashSet::new();
+        for_each_added_line(
+            &patch,
+            &mut |line_number, _| {
+                other_parent_added_line_numbers.insert(line_number);
+            },
+        )?;
+
+        added_line_numbers = Some(
+            match added_line_numbers {
+                Some(added_line_numbers) => added_line_numbers.intersection(
+                    &other_parent_added_line_numbers
+                ).copied().collect(),
+                None => other_parent_added_line_numbers,
+            }
+        );
+    }
+
+    Ok(added_line_numbers)
+}
+
+impl AddedLines {
+    /// Collects the lines that were added by the patch of a delta. When added_line_numbers is set,
+    /// only these lines are collected. None when the patch has no lines, such as of a binary file.
+    fn from_diff(
+        diff: &Diff,
+        delta_index: usize,
+        added_line_numbers: Option<&HashSet<u32>>,
+    ) -> Result<Option<Self>, git2::Error> {
+        let patch = match Patch::from_diff(diff, delta_index)? {
+            Some(patch) => patch,
+            None => return Ok(None),
+        };
+        if patch.delta().new_file().size() < 2 || patch.delta().flags().is_binary() {
+            return Ok(None);
+        }
+
+        let mut added_lines = AddedLines {
+            content: Vec::new(),
+            lines: Vec::new(),
+        };
+        for_each_added_line(
+            &patch,
+            &mut |line_number, line_content| {
+                if added_line_numbers.is_some_and(|added_line_numbers| !added_line_numbers.contains(&line_number)) {
+                    return;
+                }
+
+                added_lines.lines.push((added_lines.content.len(), line_number));
+                added_lines.content.extend_from_slice(line_content);
+                if !line_content.ends_with(b"\n") {
+                    added_lines.content.push(b'\n');
+                }
+            },
+        )?;
+
+        Ok(Some(added_lines))
+    }
+
+    /// Scans the added lines with the content rules. The positions of the matches are translated
+    /// to positions in the new file, whose blob is read only if there are matches.
+    fn scan(
+        &self,
+        git_repo: &Repository,
+        blob_oid: Oid,
+        rules_manager: &rules_manager::RulesManager,
+        match_context_size: usize,
+        scan_stats: &ScanStats,
+    ) -> Vec<rules_manager::ScanMatch> {
+        if self.lines.is_empty() {
+            return Vec::new();
+        }
+
+        let content_scan_timer = scan_stats.start_timer();
+        scan_stats.bytes_scanned.fetch_add(self.content.len() as u64);
+        let mut scan_matches = Vec::new();
+        let mut run_start = 0;
+        for line_index in 1..=self.lines.len() {
+            if self.lines.get(line_index).is_some_and(
+                |&(_, line_number)| line_number == self.lines[line_index - 1].1 + 1
+            ) {
+                continue;
+            }
+
+            let content_start = self.lines[run_start].0;
+            let content_end = self.lines.get(line_index).map_or(self.content.len(), |&(offset, _)| offset);
+            for mut scan_match in rules_manager.scan_content(
+                &self.content[content_start..content_end],
+                Some(scan_stats),
+            ) {
+                if let Some(position) = scan_match.position.as_mut() {
+                    position.offset += content_start;
+                    position.line_number += run_start;
+                }
+                scan_matches.push(scan_match);
+            }
+            run_start = line_index;
+        }
+        scan_stats.record_time(&scan_stats.content_scan_time_ns, content_scan_timer);
+        if scan_matches.is_empty() {
+            return scan_matches;
+        }
+
+        let blob = match git_repo.find_blob(blob_oid) {
+            Ok(blob) => blob,
+            Err(_) => return Vec::new(),
+        };
+        let blob_line_index = rules_manager::LineIndex::new(blob.content());
+
+        scan_matches.into_iter().filter_map(
+            |mut scan_match| {
+                let position = scan_match.position.as_mut()?;
+                let (line_offset, line_number) = *self.lines.get(position.line_number - 1)?;
+                position.offset = blob_line_index.line_start(line_number as usize)? + position.offset - line_offset;
+                position.line_number = line_number as usize;
+
+                if match_context_size > 0 {
+                    scan_match.context = Some(
+                        get_match_context(
+                            blob.content(),
+                            position.offset,
+                            position.length,
+                            match_context_size,
+                        )
+                    );
+                }
+
+                Some(scan_match)
+            }
+        ).collect()
+    }
+}
+
+/// The matches of a diff, along with what a scan state has to record about it
+#[derive(Default)]
+struct ScannedDiff {
+    file_matches: Vec<FileMatch>,
+    /// The OIDs of the blobs whose content was scanned
+    new_blob_oids: Vec<Oid>,
+    /// Whether a file could not be read, in which case the diff has to be scanned again
+    is_incomplete: bool,
+}
+
+/// Scans the files that were added or modified by a diff. Returns its matches, or None if the scan
+/// was stopped in the middle.
+fn scan_diff(
+    context: ScanContext,
+    git_repo: &Repository,
+    diff: &Diff,
+    other_parent_trees: &[Tree],
+) -> Result<Option<ScannedDiff>, git2::Error> {
+    // Without content rules, only the files whose paths match a rule have to be looked at, and
+    // only their sizes are read rather than their contents
+    let has_content_rules = context.rules_manager.has_content_rules();
+    let odb = git_repo.odb()?;
+
+    let mut file_matches = Vec::new();
+    let mut new_blob_oids = Vec::new();
+    let mut is_incomplete = false;
+    for (delta_index, delta) in diff.deltas().enumerate() {
+        if context.should_stop.load() {
+            return Ok(None);
+        }
+
+        context.scan_stats.deltas_seen.fetch_add(1);
         match delta.status() {
             Delta::Added | Delta::Modified => {},
             _ => continue,
@@ -51,154 +939,683 @@ fn scan_commit_oid(
 
         let new_file = delta.new_file();
 
-        let delta_new_file_path = match new_file.path() {
-            Some(path) => path.to_string_lossy().to_string(),
+        let delta_new_file_path_bytes = match new_file.path_bytes() {
+            Some(path_bytes) => path_bytes,
             None => continue,
         };
-        if !rules_manager.should_scan_file_path(&delta_new_file_path.to_ascii_lowercase()) {
+        if !context.rules_manager.should_scan_file_path_bytes(delta_new_file_path_bytes) {
+            context.scan_stats.deltas_skipped.fetch_add(1);
+
+            continue;
+        }
+        let delta_new_file_path = String::from_utf8_lossy(delta_new_file_path_bytes).to_string();
+        if other_parent_trees.iter().any(
+            |other_parent_tree| other_parent_tree.get_path(Path::new(&delta_new_file_path)).is_ok_and(
+                |tree_entry| tree_entry.id() == new_file.id()
+            )
+        ) {
             continue;
         }
 
-        let delta_new_file_blob = match git_repo.find_blob(new_file.id()) {
-            Ok(blob) => blob,
-            Err(_) => continue,
-        };
+        if !has_content_rules {
+            let file_path_matches = context.rules_manager.scan_file_path(&delta_new_file_path);
+            if file_path_matches.is_empty() {
+                continue;
+            }
+            match odb.read_header(new_file.id()) {
+                Ok((blob_size, _)) if blob_size >= 2 => {},
+                Ok(_) => continue,
+                Err(_) => {
+                    is_incomplete = true;
+
+                    continue;
+                },
+            }
+
+            for scan_match in file_path_matches {
+                file_matches.push(
+                    FileMatch {
+                        file_oid: new_file.id(),
+                        file_path: delta_new_file_path.clone(),
+                        scan_match,
+                    }
+                );
+            }
 
-        if delta_new_file_blob.size() < 2 {
             continue;
         }
 
-        let delta_new_file_content = if delta_new_file_blob.is_binary() || delta_new_file_blob.size() > 5000000 {
+        let is_scanned_blob = context.scan_state.is_some_and(
+            |scan_state| scan_state.contains_blob(&new_file.id())
+        );
+
+        // Only the lines that were added by the commit are scanned, the rest of the file was
+        // already scanned as part of the commits that added it. The files of a merge commit that is
+        // scanned against its other parents are always scanned by their lines, since whole files
+        // would report the lines that came from one of the parents.
+        if (context.scan_options.diff_hunks_only && delta.status() == Delta::Modified) || !other_parent_trees.is_empty() {
+            let added_line_numbers = if other_parent_trees.is_empty() {
+                Ok(None)
+            } else {
+                get_lines_added_to_other_parents(
+                    git_repo,
+                    other_parent_trees,
+                    Path::new(&delta_new_file_path),
+                    new_file.id(),
+                )
+            };
+            // Binary patches have no lines, so their whole blob is scanned instead, as UTF-16
+            // files are considered binary. So is a blob whose added lines could not be read.
+            match added_line_numbers.and_then(
+                |added_line_numbers| AddedLines::from_diff(diff, delta_index, added_line_numbers.as_ref())
+            ) {
+                Ok(Some(added_lines)) => {
+                    let mut scan_matches = context.rules_manager.scan_file_path(&delta_new_file_path);
+                    if !is_scanned_blob {
+                        scan_matches.extend(
+                            added_lines.scan(
+                                git_repo,
+                                new_file.id(),
+                                context.rules_manager,
+                                context.scan_options.match_context_size,
+                                context.scan_stats,
+                            )
+                        );
+                    }
+                    for scan_match in scan_matches {
+                        file_matches.push(
+                            FileMatch {
+                                file_oid: new_file.id(),
+                                file_path: delta_new_file_path.clone(),
+                                scan_match,
+                            }
+                        );
+                    }
+
+                    continue;
+                },
+                Ok(None) | Err(_) => {},
+            }
+        }
+
+        // Blobs that were scanned by a previous scan had their content matches reported already
+        let scanned_blob = if is_scanned_blob {
             None
         } else {
-            match std::str::from_utf8(delta_new_file_blob.content()) {
-                Ok(content) => Some(content),
-                Err(_) => None,
+            let scanned_blob = match context.blob_cache.get(&new_file.id()) {
+                Some(scanned_blob) => Some(scanned_blob),
+                None => match scan_blob_oid(context, git_repo, &odb, new_file.id()) {
+                    Ok(scanned_blob) => {
+                        let scanned_blob = Arc::new(scanned_blob);
+                        context.blob_cache.insert(new_file.id(), scanned_blob.clone());
+
+                        Some(scanned_blob)
+                    },
+                    // The file path is still matched when the content could not be read
+                    Err(_) => {
+                        is_incomplete = true;
+
+                        None
+                    },
+                },
+            };
+            if let Some(scanned_blob) = &scanned_blob {
+                if !scanned_blob.is_scannable {
+                    continue;
+                }
+                if context.scan_state.is_some() {
+                    new_blob_oids.push(new_file.id());
+                }
             }
+
+            scanned_blob
         };
 
-        let scan_matches = rules_manager.scan_file(&delta_new_file_path, delta_new_file_content);
-        if let Some(scan_matches) = scan_matches {
-            for scan_match in scan_matches.iter() {
-                let mut match_hashmap = HashMap::with_capacity(9);
-                match_hashmap.insert(
-                    "commit_id",
-                    commit.id().to_string(),
-                );
-                match_hashmap.insert(
-                    "commit_message",
-                    commit.message().unwrap_or("").to_string(),
-                );
-                match_hashmap.insert(
-                    "commit_time",
-                    Utc.timestamp(commit.time().seconds(), 0).format("%Y-%m-%dT%H:%M:%S").to_string(),
-                );
-                match_hashmap.insert(
-                    "author_name",
-                    commit.author().name().unwrap_or("").to_string(),
-                );
-                match_hashmap.insert(
-                    "author_email",
-                    commit.author().email().unwrap_or("").to_string(),
-                );
-                match_hashmap.insert(
-                    "file_path",
-                    new_file.path().unwrap_or_else(|| Path::new("")).to_string_lossy().to_string(),
-                );
-                match_hashmap.insert(
-                    "file_oid",
-                    new_file.id().to_string(),
-                );
-                match_hashmap.insert(
-                    "rule_name",
-                    scan_match.get("rule_name").unwrap_or(&String::from("")).to_string(),
-                );
-                match_hashmap.insert(
-                    "match_text",
-                    scan_match.get("match_text").unwrap_or(&String::from("")).to_string(),
-                );
-                output_matches.lock().push(match_hashmap);
+        for scan_match in context.rules_manager.scan_file_path(&delta_new_file_path).iter().chain(
+            scanned_blob.iter().flat_map(|scanned_blob| scanned_blob.content_matches.iter())
+        ) {
+            file_matches.push(
+                FileMatch {
+                    file_oid: new_file.id(),
+                    file_path: delta_new_file_path.clone(),
+                    scan_match: scan_match.clone(),
+                }
+            );
+        }
+    }
+
+    Ok(
+        Some(
+            ScannedDiff {
+                file_matches,
+                new_blob_oids,
+                is_incomplete,
             }
+        )
+    )
+}
+
+/// Diff options that make libgit2 drop the paths to skip while it diffs the trees, or None when
+/// there is nothing to push down. The paths that pass are checked again against all of the rules.
+fn skip_diff_options(
+    rules_manager: &rules_manager::RulesManager,
+) -> Option<DiffOptions> {
+    let skip_pathspecs = rules_manager.skip_pathspecs();
+    if skip_pathspecs.is_empty() {
+        return None;
+    }
+
+    let mut diff_options = DiffOptions::new();
+    for skip_pathspec in skip_pathspecs {
+        diff_options.pathspec(skip_pathspec.as_str());
+    }
+    // libgit2 excludes the paths that no pathspec matched, so everything else has to be included
+    diff_options.pathspec("*");
+
+    Some(diff_options)
+}
+
+fn scan_commit_oid(
+    context: ScanContext,
+    git_repo: &Repository,
+    oid: &Oid,
+) -> Result<(), git2::Error> {
+    let commit = git_repo.find_commit(*oid)?;
+    if commit.time().seconds() < context.from_timestamp {
+        return Ok(());
+    }
+
+    let commit_parent_count = commit.parent_count();
+    if commit_parent_count > 1 && context.scan_options.merge_strategy == MergeStrategy::Skip {
+        return Ok(());
+    }
+
+    context.scan_stats.commits_scanned.fetch_add(1);
+    let diff_timer = context.scan_stats.start_timer();
+    let commit_tree = commit.tree()?;
+    let mut diff_options = skip_diff_options(context.rules_manager);
+
+    let commit_diff = if commit_parent_count == 0 {
+        git_repo.diff_tree_to_tree(None, Some(&commit_tree), diff_options.as_mut())?
+    } else {
+        let parent_commit = commit.parent(0)?;
+
+        // A commit that did not change any file, such as an empty commit, has nothing to scan
+        if parent_commit.tree_id() == commit.tree_id() {
+            if let Some(scan_state) = context.scan_state {
+                scan_state.add_scanned_commit(commit.id(), Vec::new());
+            }
+
+            return Ok(());
+        }
+        let parent_commit_tree = parent_commit.tree()?;
+
+        git_repo.diff_tree_to_tree(Some(&parent_commit_tree), Some(&commit_tree), diff_options.as_mut())?
+    };
+    context.scan_stats.record_time(&context.scan_stats.diff_time_ns, diff_timer);
+
+    // Files of a merge commit that are identical to their version in one of the other parents
+    // were not changed by the merge itself
+    let mut other_parent_trees = Vec::new();
+    if context.scan_options.merge_strategy == MergeStrategy::Combined {
+        for other_parent_commit in commit.parents().skip(1) {
+            other_parent_trees.push(other_parent_commit.tree()?);
+        }
+    }
+
+    let scanned_diff = match scan_diff(
+        context,
+        git_repo,
+        &commit_diff,
+        &other_parent_trees,
+    )? {
+        Some(scanned_diff) => scanned_diff,
+        None => return Ok(()),
+    };
+
+    // A commit with a file that could not be read is left out of the state, so the next scan
+    // scans it again
+    if let Some(scan_state) = context.scan_state {
+        if !scanned_diff.is_incomplete {
+            scan_state.add_scanned_commit(commit.id(), scanned_diff.new_blob_oids);
         }
     }
 
+    let file_matches = scanned_diff.file_matches;
+
+    if file_matches.is_empty() {
+        return Ok(());
+    }
+    context.scan_stats.matches.fetch_add(file_matches.len() as u64);
+
+    let commit_author = commit.author();
+    let commit_matches = CommitMatches {
+        repository_path: None,
+        commit_id: commit.id().to_string(),
+        commit_message: commit.message().unwrap_or("").to_string(),
+        commit_time: Utc.timestamp(commit.time().seconds(), 0).format("%Y-%m-%dT%H:%M:%S").to_string(),
+        author_name: commit_author.name().unwrap_or("").to_string(),
+        author_email: commit_author.email().unwrap_or("").to_string(),
+        file_matches,
+    };
+    if !(context.output_matches)(commit_matches) {
+        context.should_stop.store(true);
+    }
+
     Ok(())
 }
 
-fn get_commit_oids(
+/// The refspecs a clone is fetched with. The branches and tags of the remote are mirrored into the
+/// local refs, which libgit2 does not update on its own, so both local and remote tracking branch
+/// globs see the commits that were pushed since the last fetch.
+const FETCH_REFSPECS: [&str; 3] = [
+    "+refs/heads/*:refs/heads/*",
+    "+refs/heads/*:refs/remotes/origin/*",
+    "+refs/tags/*:refs/tags/*",
+];
+
+/// Makes repository_path a bare clone of url. An existing clone is reused, so only the objects
+/// that were added to the remote since it was cloned are fetched into it. An existing clone of
+/// another URL is refused, unless update_remote_url is set and its origin is repointed to url.
+pub fn clone_or_fetch_repository(
+    url: &str,
+    repository_path: &str,
+    update_remote_url: bool,
+) -> Result<(), git2::Error> {
+    let git_repo = match Repository::open_bare(repository_path) {
+        Ok(git_repo) => {
+            let remote_url = git_repo.find_remote("origin")?.url().map(str::to_string);
+            if remote_url.as_deref() != Some(url) {
+                if !update_remote_url {
+                    return Err(
+                        git2::Error::from_str(
+                            &format!(
+                                "The repository at {} is a clone of {}, not of {}",
+                                repository_path,
+                                remote_url.as_deref().unwrap_or("an unknown URL"),
+                                url,
+                            )
+                        )
+                    );
+                }
+                git_repo.remote_set_url("origin", url)?;
+            }
+
+            git_repo
+        },
+        Err(_) => {
+            let mut builder = git2::build::RepoBuilder::new();
+            builder.bare(true);
+
+            builder.clone(url, Path::new(repository_path))?
+        },
+    };
+
+    let mut fetch_options = git2::FetchOptions::new();
+    fetch_options.prune(git2::FetchPrune::On);
+    git_repo.find_remote("origin")?.fetch(&FETCH_REFSPECS, Some(&mut fetch_options), None)?;
+
+    Ok(())
+}
+
+/// Walks the commits of the matching branches and passes each commit OID to output_commit_oid as soon
+/// as it is found, until output_commit_oid returns false. The commits are not sorted since the order of
+/// the scan does not matter, and they are not decoded here as the scanning threads decode them anyway.
+fn walk_commit_oids(
     repository_path: &str,
     branch_glob_pattern: &str,
-    from_timestamp: i64,
-) -> Result<Vec<Oid>, git2::Error>{
+    scan_stats: &ScanStats,
+    output_commit_oid: &mut dyn FnMut(Oid) -> bool,
+) -> Result<(), git2::Error> {
     let git_repo = Repository::open(repository_path)?;
 
     let mut revwalk = git_repo.revwalk()?;
     revwalk.push_head()?;
-    revwalk.set_sorting(git2::Sort::TIME)?;
     revwalk.push_glob(branch_glob_pattern)?;
 
-    let mut oids = Vec::new();
-    for oid in revwalk.flatten() {
-        if let Ok(commit) = git_repo.find_commit(oid) {
-            if commit.time().seconds() >= from_timestamp {
-                oids.push(oid);
-            }
+    let mut oids = revwalk.flatten();
+    loop {
+        let walk_timer = scan_stats.start_timer();
+        let oid = match oids.next() {
+            Some(oid) => oid,
+            None => break,
+        };
+        scan_stats.record_time(&scan_stats.walk_time_ns, walk_timer);
+        scan_stats.commits_walked.fetch_add(1);
+
+        if !output_commit_oid(oid) {
+            break;
+        }
+    }
+
+    Ok(())
+}
+
+/// A fingerprint of the rules and of every scan option that decides which commits, blobs and lines
+/// are scanned. A scan state that was saved under a different fingerprint is discarded, as the commits
+/// and blobs it remembers were not scanned the way the current scan would scan them.
+fn scan_state_fingerprint(
+    rules_manager: &rules_manager::RulesManager,
+    scan_options: &ScanOptions,
+    branch_glob_pattern: &str,
+    from_timestamp: i64,
+) -> u64 {
+    let merge_strategy: &[u8] = match scan_options.merge_strategy {
+        MergeStrategy::Skip => b"skip",
+        MergeStrategy::FirstParent => b"first_parent",
+        MergeStrategy::Combined => b"combined",
+    };
+
+    let mut fingerprint = rules_manager.fingerprint();
+    for bytes in [
+        &u8::from(scan_options.diff_hunks_only).to_le_bytes()[..],
+        merge_strategy,
+        &(scan_options.max_content_size as u64).to_le_bytes()[..],
+        &from_timestamp.to_le_bytes()[..],
+        branch_glob_pattern.as_bytes(),
+    ] {
+        for byte in bytes.iter().chain(&[0xff]) {
+            fingerprint ^= *byte as u64;
+            fingerprint = fingerprint.wrapping_mul(0x100000001b3);
         }
     }
 
-    Ok(oids)
+    fingerprint
 }
 
+/// Scans all the commits of a repository and passes the matches of every commit to output_matches.
+/// The commits are walked by a dedicated thread that feeds the scanning threads, so the scan starts
+/// as soon as the first commit is found. When output_matches returns false, the scan stops.
+/// Returns the statistics of the scan.
+#[allow(clippy::too_many_arguments)]
 pub fn scan_repository(
-    py: &Python,
     repository_path: &str,
     branch_glob_pattern: &str,
     from_timestamp: i64,
+    state_path: Option<&str>,
     rules_manager: &rules_manager::RulesManager,
-    output_matches: Arc<Mutex<Vec<HashMap<&str, String>>>>,
-) -> PyResult<()> {
-    let commit_oids_queue;
-
-    match get_commit_oids(
-        repository_path,
+    scan_options: &ScanOptions,
+    check_progress: &dyn Fn(&ScanStats) -> PyResult<()>,
+    output_matches: &(dyn Fn(CommitMatches) -> bool + Sync),
+) -> PyResult<ScanStatsSummary> {
+    let scan_fingerprint = scan_state_fingerprint(
+        rules_manager,
+        scan_options,
         branch_glob_pattern,
-        from_timestamp
-    ) {
-        Ok(commit_oids) => {
-            if commit_oids.is_empty() {
-               return Ok(());
+        from_timestamp,
+    );
+    let scan_state = match state_path {
+        Some(state_path) => Some(
+            ScanState::load(Path::new(state_path), scan_fingerprint).map_err(
+                |error| PyRuntimeError::new_err(error.to_string())
+            )?
+        ),
+        None => None,
+    };
+    let blob_cache = BlobCache::new(scan_options.blob_cache_size, scan_options.blob_cache_max_memory());
+    let scan_stats = ScanStats::new(scan_options.profile, rules_manager);
+
+    let mut check_progress_result: PyResult<()> = Ok(());
+    let mut walk_result: Result<(), git2::Error> = Ok(());
+
+    let should_stop = AtomicCell::new(false);
+    let is_walk_done = AtomicCell::new(false);
+    let pending_commits = AtomicCell::new(0usize);
+    let number_of_threads = get_number_of_threads(scan_options);
+    let (commit_oids_sender, commit_oids_receiver) = crossbeam::channel::bounded(COMMIT_OIDS_QUEUE_SIZE);
+
+    let should_stop = &should_stop;
+    let is_walk_done = &is_walk_done;
+    let pending_commits = &pending_commits;
+    let scan_context = ScanContext {
+        rules_manager,
+        scan_options,
+        blob_cache: &blob_cache,
+        scan_stats: &scan_stats,
+        scan_state: scan_state.as_ref(),
+        from_timestamp,
+        should_stop,
+        output_matches,
+    };
+
+    crossbeam_thread::scope(
+        |scope| {
+            let walker = scope.spawn(
+                move |_| {
+                    let walk_result = walk_commit_oids(
+                        repository_path,
+                        branch_glob_pattern,
+                        scan_context.scan_stats,
+                        &mut |commit_oid| {
+                            if should_stop.load() {
+                                return false;
+                            }
+                            if scan_context.scan_state.is_some_and(
+                                |scan_state| scan_state.contains_commit(&commit_oid)
+                            ) {
+                                scan_context.scan_stats.commits_done.fetch_add(1);
+
+                                return true;
+                            }
+                            pending_commits.fetch_add(1);
+                            if commit_oids_sender.send(commit_oid).is_err() {
+                                pending_commits.fetch_sub(1);
+
+                                return false;
+                            }
+
+                            true
+                        },
+                    );
+                    is_walk_done.store(true);
+
+                    walk_result
+                }
+            );
+
+            for thread_index in 0..number_of_threads {
+                let commit_oids_receiver = commit_oids_receiver.clone();
+                scope.spawn(
+                    move |_| {
+                        pin_current_thread(scan_options, thread_index);
+
+                        if let Ok(git_repo) = Repository::open(repository_path) {
+                            while !should_stop.load() {
+                                if let Ok(commit_oid) = commit_oids_receiver.recv() {
+                                    scan_commit_oid(
+                                        scan_context,
+                                        &git_repo,
+                                        &commit_oid,
+                                    ).unwrap_or(());
+                                    scan_context.scan_stats.commits_done.fetch_add(1);
+                                    pending_commits.fetch_sub(1);
+                                } else {
+                                    break;
+                                }
+                            }
+                        };
+                    }
+                );
             }
+            drop(commit_oids_receiver);
+
+            while (!is_walk_done.load() || pending_commits.load() > 0) && !should_stop.load() {
+                check_progress_result = check_progress(&scan_stats);
+                if check_progress_result.is_err() {
+                    should_stop.store(true);
 
-            commit_oids_queue = ArrayQueue::new(commit_oids.len());
-            for commit_oid in commit_oids {
-                commit_oids_queue.push(commit_oid).unwrap();
+                    break;
+                }
+
+                thread::sleep(PROGRESS_CHECK_INTERVAL);
             }
-        },
-        Err(error) => {
-            return Err(PyRuntimeError::new_err(error.to_string()))
-        },
+
+            walk_result = walker.join().unwrap_or(Ok(()));
+        }
+    ).unwrap_or_default();
+
+    check_progress_result?;
+    walk_result.map_err(|error| PyRuntimeError::new_err(error.to_string()))?;
+
+    // A stopped scan did not deliver all of its matches so its progress should not be persisted
+    if let (Some(state_path), Some(scan_state)) = (state_path, &scan_state) {
+        if !should_stop.load() {
+            scan_state.save(Path::new(state_path), scan_fingerprint).map_err(
+                |error| PyRuntimeError::new_err(error.to_string())
+            )?;
+        }
     }
 
-    let mut py_signal_error: PyResult<()> = Ok(());
+    Ok(scan_stats.summary(Some(&blob_cache), rules_manager))
+}
 
-    let should_stop  = AtomicCell::new(false);
-    let number_of_cores = std::thread::available_parallelism().unwrap().get();
+/// The commits that are reachable from the given revisions. A revision can be a range such as
+/// old..new, a symmetric difference such as left...right, and a revision that starts with ^
+/// excludes the commits that are reachable from it.
+fn get_range_commit_oids(
+    git_repo: &Repository,
+    revspecs: &[String],
+) -> Result<Vec<Oid>, git2::Error> {
+    let mut revwalk = git_repo.revwalk()?;
+    for revspec in revspecs {
+        if let Some(excluded_revspec) = revspec.strip_prefix('^') {
+            revwalk.hide(git_repo.revparse_single(excluded_revspec)?.peel_to_commit()?.id())?;
+        } else if revspec.contains("...") {
+            // libgit2 walks only old..new ranges, so the commits that are reachable from either side
+            // are walked without the commits that are reachable from their merge bases
+            let range = git_repo.revparse(revspec)?;
+            let (left_oid, right_oid) = match (range.from(), range.to()) {
+                (Some(left), Some(right)) => (left.peel_to_commit()?.id(), right.peel_to_commit()?.id()),
+                _ => return Err(git2::Error::from_str(&format!("Invalid revision range: {revspec}"))),
+            };
+            revwalk.push(left_oid)?;
+            revwalk.push(right_oid)?;
+            match git_repo.merge_bases(left_oid, right_oid) {
+                Ok(merge_base_oids) => {
+                    for merge_base_oid in merge_base_oids.iter() {
+                        revwalk.hide(*merge_base_oid)?;
+                    }
+                },
+                Err(error) if error.code() == git2::ErrorCode::NotFound => {},
+                Err(error) => return Err(error),
+            }
+        } else if let Some((old_revspec, new_revspec)) = revspec.split_once("..") {
+            if !old_revspec.is_empty() && old_revspec.bytes().all(|byte| byte == b'0') {
+                // A hook gets the zero OID as the old side of a newly created ref, whose commits are
+                // the ones that no other ref reaches. Refs that already point at the new side, such as
+                // the created ref itself after the push, are not excluded.
+                let new_oid = git_repo.revparse_single(new_revspec)?.peel_to_commit()?.id();
+                revwalk.push(new_oid)?;
+                for reference in git_repo.references()? {
+                    if let Ok(reference_commit) = reference?.peel_to_commit() {
+                        if reference_commit.id() != new_oid {
+                            revwalk.hide(reference_commit.id())?;
+                        }
+                    }
+                }
+            } else {
+                revwalk.push_range(revspec)?;
+            }
+        } else {
+            revwalk.push(git_repo.revparse_single(revspec)?.peel_to_commit()?.id())?;
+        }
+    }
+
+    revwalk.collect()
+}
+
+/// Scans the commits of the given revisions, such as the old..new range of a pushed ref. Ranges
+/// are usually small, so threads are spawned only when there are enough commits to keep them busy
+/// and a range of a few commits is scanned on the calling thread. Returns the statistics of the scan.
+pub fn scan_commit_range(
+    repository_path: &str,
+    revspecs: &[String],
+    rules_manager: &rules_manager::RulesManager,
+    scan_options: &ScanOptions,
+    check_progress: &dyn Fn(&ScanStats) -> PyResult<()>,
+    output_matches: &(dyn Fn(CommitMatches) -> bool + Sync),
+) -> PyResult<ScanStatsSummary> {
+    let git_repo = Repository::open(repository_path).map_err(
+        |error| PyRuntimeError::new_err(error.to_string())
+    )?;
+
+    let scan_stats = ScanStats::new(scan_options.profile, rules_manager);
+    let walk_timer = scan_stats.start_timer();
+    let commit_oids = get_range_commit_oids(&git_repo, revspecs).map_err(
+        |error| PyRuntimeError::new_err(error.to_string())
+    )?;
+    scan_stats.record_time(&scan_stats.walk_time_ns, walk_timer);
+    scan_stats.commits_walked.fetch_add(commit_oids.len() as u64);
+
+    let blob_cache = BlobCache::new(scan_options.blob_cache_size, scan_options.blob_cache_max_memory());
+    let should_stop = AtomicCell::new(false);
+    let scan_context = ScanContext {
+        rules_manager,
+        scan_options,
+        blob_cache: &blob_cache,
+        scan_stats: &scan_stats,
+        scan_state: None,
+        from_timestamp: i64::MIN,
+        should_stop: &should_stop,
+        output_matches,
+    };
+
+    let number_of_threads = get_number_of_threads(scan_options).min(
+        commit_oids.len().div_ceil(MIN_COMMITS_PER_THREAD)
+    );
+    if number_of_threads <= 1 {
+        // Checking the progress takes the GIL, so it is done as often as the threads would do it
+        // rather than after every commit
+        let mut last_progress_check: Option<time::Instant> = None;
+        for commit_oid in commit_oids {
+            let should_check_progress = last_progress_check.map_or(
+                true,
+                |last_progress_check| last_progress_check.elapsed() >= PROGRESS_CHECK_INTERVAL,
+            );
+            if should_check_progress {
+                check_progress(&scan_stats)?;
+                last_progress_check = Some(time::Instant::now());
+            }
+            if should_stop.load() {
+                break;
+            }
+            scan_commit_oid(scan_context, &git_repo, &commit_oid).unwrap_or(());
+            scan_stats.commits_done.fetch_add(1);
+        }
+
+        return Ok(scan_stats.summary(Some(&blob_cache), rules_manager));
+    }
+
+    let mut check_progress_result: PyResult<()> = Ok(());
+
+    let pending_commits = AtomicCell::new(commit_oids.len());
+    let (commit_oids_sender, commit_oids_receiver) = crossbeam::channel::unbounded();
+    for commit_oid in commit_oids {
+        commit_oids_sender.send(commit_oid).unwrap_or(());
+    }
+    drop(commit_oids_sender);
+
+    let should_stop = &should_stop;
+    let pending_commits = &pending_commits;
 
     crossbeam_thread::scope(
         |scope| {
-            for _ in 0..number_of_cores {
+            for thread_index in 0..number_of_threads {
+                let commit_oids_receiver = commit_oids_receiver.clone();
                 scope.spawn(
-                    |_| {
+                    move |_| {
+                        pin_current_thread(scan_options, thread_index);
+
                         if let Ok(git_repo) = Repository::open(repository_path) {
                             while !should_stop.load() {
-                                if let Some(commit_oid) = commit_oids_queue.pop() {
+                                if let Ok(commit_oid) = commit_oids_receiver.recv() {
                                     scan_commit_oid(
-                                        &should_stop,
+                                        scan_context,
                                         &git_repo,
                                         &commit_oid,
-                                        rules_manager,
-                                        output_matches.clone(),
                                     ).unwrap_or(());
+                                    scan_context.scan_stats.commits_done.fetch_add(1);
+                                    pending_commits.fetch_sub(1);
                                 } else {
                                     break;
                                 }
@@ -208,20 +1625,284 @@ pub fn scan_repository(
                 );
             }
 
-            while !commit_oids_queue.is_empty() {
-                py_signal_error = py.check_signals();
-                if py_signal_error.is_err() {
+            while pending_commits.load() > 0 && !should_stop.load() {
+                check_progress_result = check_progress(&scan_stats);
+                if check_progress_result.is_err() {
                     should_stop.store(true);
 
                     break;
                 }
 
-                thread::sleep(time::Duration::from_millis(100));
+                thread::sleep(PROGRESS_CHECK_INTERVAL);
             }
         }
     ).unwrap_or_default();
 
-    py_signal_error?;
+    check_progress_result?;
 
-    Ok(())
+    Ok(scan_stats.summary(Some(&blob_cache), rules_manager))
+}
+
+fn scan_index_diff(
+    git_repo: &Repository,
+    scan_context: ScanContext,
+) -> Result<Vec<Match>, git2::Error> {
+    let head_tree = match git_repo.head() {
+        Ok(head) => Some(head.peel_to_tree()?),
+        Err(error) if error.code() == git2::ErrorCode::UnbornBranch => None,
+        Err(error) => return Err(error),
+    };
+    let index = git_repo.index()?;
+    let mut diff_options = skip_diff_options(scan_context.rules_manager);
+    let index_diff = git_repo.diff_tree_to_index(head_tree.as_ref(), Some(&index), diff_options.as_mut())?;
+
+    let scanned_diff = scan_diff(scan_context, git_repo, &index_diff, &[])?.unwrap_or_default();
+
+    Ok(
+        scanned_diff.file_matches.into_iter().map(
+            |file_match| {
+                let mut match_hashmap = file_match_hashmap(file_match.file_path, file_match.scan_match);
+                match_hashmap.insert("file_oid", file_match.file_oid.to_string().into());
+
+                match_hashmap
+            }
+        ).collect()
+    )
+}
+
+/// Scans the changes that are staged in the index of a repository, compared to its HEAD. Such
+/// a scan is tiny, so it runs on a single thread while the calling thread checks its progress.
+/// Returns the matches and the statistics of the scan.
+pub fn scan_index(
+    repository_path: &str,
+    rules_manager: &rules_manager::RulesManager,
+    scan_options: &ScanOptions,
+    check_progress: &dyn Fn(&ScanStats) -> PyResult<()>,
+) -> PyResult<(Vec<Match>, ScanStatsSummary)> {
+    let blob_cache = BlobCache::new(scan_options.blob_cache_size, scan_options.blob_cache_max_memory());
+    let scan_stats = ScanStats::new(scan_options.profile, rules_manager);
+    let should_stop = AtomicCell::new(false);
+    let scan_context = ScanContext {
+        rules_manager,
+        scan_options,
+        blob_cache: &blob_cache,
+        scan_stats: &scan_stats,
+        scan_state: None,
+        from_timestamp: i64::MIN,
+        should_stop: &should_stop,
+        output_matches: &|_| true,
+    };
+
+    let mut check_progress_result: PyResult<()> = Ok(());
+    let mut scan_result = Err(git2::Error::from_str("The scan thread has panicked"));
+    let (scan_result_sender, scan_result_receiver) = crossbeam::channel::bounded(1);
+
+    crossbeam_thread::scope(
+        |scope| {
+            scope.spawn(
+                move |_| {
+                    let scan_result = Repository::open(repository_path).and_then(
+                        |git_repo| scan_index_diff(&git_repo, scan_context)
+                    );
+                    scan_result_sender.send(scan_result).unwrap_or(());
+                }
+            );
+
+            // The result is awaited with a timeout rather than by sleeping, so a tiny scan returns
+            // as soon as it is done
+            loop {
+                check_progress_result = check_progress(&scan_stats);
+                if check_progress_result.is_err() {
+                    should_stop.store(true);
+
+                    break;
+                }
+
+                match scan_result_receiver.recv_timeout(PROGRESS_CHECK_INTERVAL) {
+                    Ok(result) => {
+                        scan_result = result;
+
+                        break;
+                    },
+                    Err(crossbeam::channel::RecvTimeoutError::Timeout) => {},
+                    Err(crossbeam::channel::RecvTimeoutError::Disconnected) => break,
+                }
+            }
+        }
+    ).unwrap_or_default();
+
+    check_progress_result?;
+    let matches = scan_result.map_err(|error| PyRuntimeError::new_err(error.to_string()))?;
+
+    Ok((matches, scan_stats.summary(Some(&blob_cache), rules_manager)))
+}
+
+enum Task {
+    WalkRepository(usize),
+    ScanCommit(usize, Oid),
+}
+
+/// Pops a task from the local queue of the thread, or steals one from the global queue or from the
+/// local queues of the other threads
+pub fn find_task<T>(
+    local_queue: &deque::Worker<T>,
+    global_queue: &deque::Injector<T>,
+    stealers: &[deque::Stealer<T>],
+) -> Option<T> {
+    local_queue.pop().or_else(
+        || std::iter::repeat_with(
+            || global_queue.steal_batch_and_pop(local_queue).or_else(
+                || stealers.iter().map(|stealer| stealer.steal()).collect()
+            )
+        ).find(
+            |steal| !steal.is_retry()
+        ).and_then(
+            |steal| steal.success()
+        )
+    )
+}
+
+/// Scans multiple repositories using a single pool of threads. Walking a repository and scanning
+/// each of its commits are tasks of the same work-stealing scheduler, so the threads are kept busy
+/// across repositories. Every match is tagged with its repository path. A repository that fails
+/// to be opened or walked does not stop the scan, its error is returned instead.
+#[allow(clippy::too_many_arguments)]
+pub fn scan_repositories(
+    repository_paths: &[String],
+    branch_glob_pattern: &str,
+    from_timestamp: i64,
+    rules_manager: &rules_manager::RulesManager,
+    scan_options: &ScanOptions,
+    check_progress: &dyn Fn(&ScanStats) -> PyResult<()>,
+    output_matches: &(dyn Fn(CommitMatches) -> bool + Sync),
+) -> PyResult<(ScanStatsSummary, HashMap<String, String>)> {
+    let blob_cache = BlobCache::new(scan_options.blob_cache_size, scan_options.blob_cache_max_memory());
+    let scan_stats = ScanStats::new(scan_options.profile, rules_manager);
+    let repository_errors = Mutex::new(HashMap::new());
+
+    let global_queue = deque::Injector::new();
+    for repository_index in 0..repository_paths.len() {
+        global_queue.push(Task::WalkRepository(repository_index));
+    }
+    let pending_tasks = AtomicCell::new(repository_paths.len());
+
+    let mut check_progress_result: PyResult<()> = Ok(());
+
+    let should_stop = AtomicCell::new(false);
+    let number_of_threads = get_number_of_threads(scan_options);
+    let local_queues: Vec<deque::Worker<Task>> = (0..number_of_threads).map(
+        |_| deque::Worker::new_fifo()
+    ).collect();
+    let stealers: Vec<deque::Stealer<Task>> = local_queues.iter().map(
+        |local_queue| local_queue.stealer()
+    ).collect();
+
+    let scan_context = ScanContext {
+        rules_manager,
+        scan_options,
+        blob_cache: &blob_cache,
+        scan_stats: &scan_stats,
+        scan_state: None,
+        from_timestamp,
+        should_stop: &should_stop,
+        output_matches,
+    };
+    let repository_errors = &repository_errors;
+    let global_queue = &global_queue;
+    let pending_tasks = &pending_tasks;
+    let should_stop = &should_stop;
+    let stealers = &stealers;
+
+    crossbeam_thread::scope(
+        |scope| {
+            for (thread_index, local_queue) in local_queues.into_iter().enumerate() {
+                scope.spawn(
+                    move |_| {
+                        pin_current_thread(scan_options, thread_index);
+
+                        let mut git_repos = HashMap::new();
+                        while !should_stop.load() {
+                            let task = match find_task(&local_queue, global_queue, stealers) {
+                                Some(task) => task,
+                                None => {
+                                    if pending_tasks.load() == 0 {
+                                        break;
+                                    }
+                                    thread::sleep(time::Duration::from_millis(1));
+
+                                    continue;
+                                },
+                            };
+
+                            match task {
+                                Task::WalkRepository(repository_index) => {
+                                    if let Err(error) = walk_commit_oids(
+                                        &repository_paths[repository_index],
+                                        branch_glob_pattern,
+                                        scan_context.scan_stats,
+                                        &mut |commit_oid| {
+                                            pending_tasks.fetch_add(1);
+                                            local_queue.push(Task::ScanCommit(repository_index, commit_oid));
+
+                                            !should_stop.load()
+                                        },
+                                    ) {
+                                        repository_errors.lock().insert(
+                                            repository_paths[repository_index].clone(),
+                                            error.to_string(),
+                                        );
+                                    }
+                                },
+                                Task::ScanCommit(repository_index, commit_oid) => {
+                                    if git_repos.len() >= MAX_OPEN_REPOSITORIES_PER_THREAD && !git_repos.contains_key(&repository_index) {
+                                        git_repos.clear();
+                                    }
+                                    let repository_path = &repository_paths[repository_index];
+                                    let git_repo = match git_repos.entry(repository_index) {
+                                        Entry::Occupied(entry) => Some(entry.into_mut()),
+                                        Entry::Vacant(entry) => Repository::open(repository_path).ok().map(
+                                            |git_repo| entry.insert(git_repo)
+                                        ),
+                                    };
+
+                                    if let Some(git_repo) = git_repo {
+                                        let output_repository_matches = |mut commit_matches: CommitMatches| {
+                                            commit_matches.repository_path = Some(repository_path.clone());
+
+                                            output_matches(commit_matches)
+                                        };
+                                        scan_commit_oid(
+                                            ScanContext {
+                                                output_matches: &output_repository_matches,
+                                                ..scan_context
+                                            },
+                                            git_repo,
+                                            &commit_oid,
+                                        ).unwrap_or(());
+                                    }
+                                    scan_context.scan_stats.commits_done.fetch_add(1);
+                                },
+                            }
+                            pending_tasks.fetch_sub(1);
+                        }
+                    }
+                );
+            }
+
+            while pending_tasks.load() > 0 && !should_stop.load() {
+                check_progress_result = check_progress(&scan_stats);
+                if check_progress_result.is_err() {
+                    should_stop.store(true);
+
+                    break;
+                }
+
+                thread::sleep(PROGRESS_CHECK_INTERVAL);
+            }
+        }
+    ).unwrap_or_default();
+
+    check_progress_result?;
+
+    Ok((scan_stats.summary(Some(&blob_cache), rules_manager), repository_errors.lock().clone()))
 }
@@ -0,0 +1,144 @@
+const GLOB_SPECIAL_CHARACTERS: &[char] = &['*', '?', '[', '\\'];
+
+/// Appends a literal to a regex pattern that is compiled without Unicode support, so non-ASCII
+/// characters are matched by their UTF-8 bytes
+pub fn escape_bytes_into(
+    literal: &str,
+    pattern: &mut String,
+) {
+    for character in literal.chars() {
+        if character.is_ascii() {
+            regex_syntax::escape_into(character.encode_utf8(&mut [0; 1]), pattern);
+        } else {
+            for byte in character.encode_utf8(&mut [0; 4]).bytes() {
+                pattern.push_str(&format!("\\x{byte:02x}"));
+            }
+        }
+    }
+}
+
+/// Translates a glob into a regex pattern that matches file paths as raw bytes, case insensitively.
+/// `*` and `?` do not match a `/`, `**` matches any number of directories and `[...]` is a character
+/// class that can be negated with `!` or `^`. A glob without a `/` matches any directory or file name
+/// along the path, while a glob with a `/`, or one that starts with a `/`, is anchored to the root.
+/// A glob that matches a directory matches everything under it as well.
+pub fn glob_to_regex_pattern(
+    glob: &str,
+) -> Result<String, String> {
+    let is_anchored = glob.starts_with('/') || glob.trim_end_matches('/').contains('/');
+    let glob = glob.trim_start_matches('/').trim_end_matches('/');
+    if glob.is_empty() {
+        return Err("Glob pattern can not be empty".to_string());
+    }
+
+    let mut pattern = String::from("(?is-u)^");
+    if !is_anchored {
+        pattern.push_str("(?:.*/)?");
+    }
+
+    let mut characters = glob.chars().peekable();
+    while let Some(character) = characters.next() {
+        match character {
+            '*' => {
+                if characters.next_if_eq(&'*').is_some() {
+                    if characters.next_if_eq(&'/').is_some() {
+                        pattern.push_str("(?:.*/)?");
+                    } else {
+                        pattern.push_str(".*");
+                    }
+                } else {
+                    pattern.push_str("[^/]*");
+                }
+            },
+            '?' => pattern.push_str("[^/]"),
+            '[' => {
+                let is_negated = characters.next_if(|character| *character == '!' || *character == '^').is_some();
+                pattern.push_str(if is_negated { "[^/" } else { "[" });
+
+                let mut is_closed = false;
+                let mut is_first = true;
+                while let Some(character) = characters.next() {
+                    if character == ']' && !is_first {
+                        is_closed = true;
+
+                        break;
+                    }
+                    if !character.is_ascii() {
+                        return Err(format!("Character classes can only hold ASCII characters: {glob}"));
+                    }
+                    if character == '-' && !is_first && characters.peek().is_some_and(|next| *next != ']') {
+                        pattern.push('-');
+                    } else {
+                        regex_syntax::escape_into(character.encode_utf8(&mut [0; 1]), &mut pattern);
+                    }
+                    is_first = false;
+                }
+                if !is_closed {
+                    return Err(format!("Unclosed character class: {glob}"));
+                }
+                pattern.push(']');
+            },
+            '\\' => {
+                match characters.next() {
+                    Some(escaped_character) => escape_bytes_into(escaped_character.encode_utf8(&mut [0; 4]), &mut pattern),
+                    None => return Err(format!("Glob pattern can not end with an escape: {glob}")),
+                }
+            },
+            _ => escape_bytes_into(character.encode_utf8(&mut [0; 4]), &mut pattern),
+        }
+    }
+    pattern.push_str("(?:/.*)?$");
+
+    Ok(pattern)
+}
+
+/// A glob in which every ASCII letter is replaced by a class of both of its cases, since libgit2
+/// matches pathspecs case sensitively unless the whole diff ignores case
+fn case_insensitive_pathspec(
+    glob: &str,
+) -> String {
+    let mut pathspec = String::with_capacity(glob.len() * 4);
+    for character in glob.chars() {
+        if character.is_ascii_alphabetic() {
+            pathspec.push('[');
+            pathspec.push(character.to_ascii_lowercase());
+            pathspec.push(character.to_ascii_uppercase());
+            pathspec.push(']');
+        } else {
+            pathspec.push(character);
+        }
+    }
+
+    pathspec
+}
+
+/// Translates a glob to skip into negative libgit2 pathspecs, so the tree diff drops the paths it
+/// matches before any delta is created for them. libgit2 lets `*` match a `/` and anchors every
+/// pathspec to the root, so only the globs that can not exclude a path that the glob itself does
+/// not match are translated: a plain path, and `*` followed by a plain file name suffix.
+pub fn glob_to_skip_pathspecs(
+    glob: &str,
+) -> Vec<String> {
+    let is_anchored = glob.starts_with('/');
+    let trimmed_glob = glob.trim_start_matches('/').trim_end_matches('/');
+    if trimmed_glob.is_empty() {
+        return Vec::new();
+    }
+
+    if !trimmed_glob.contains(GLOB_SPECIAL_CHARACTERS) {
+        let pathspec = case_insensitive_pathspec(trimmed_glob);
+
+        return vec![
+            format!("!{pathspec}"),
+            format!("!{pathspec}/*"),
+        ];
+    }
+
+    match trimmed_glob.strip_prefix('*') {
+        Some(file_name_suffix) if !is_anchored && !file_name_suffix.is_empty() &&
+            !file_name_suffix.contains(GLOB_SPECIAL_CHARACTERS) && !file_name_suffix.contains('/') => {
+            vec![format!("!*{}", case_insensitive_pathspec(file_name_suffix))]
+        },
+        _ => Vec::new(),
+    }
+}
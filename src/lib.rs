@@ -1,34 +1,114 @@
+mod blob_cache;
+mod directory_scanner;
 mod git_repository_scanner;
+mod globs;
+mod rules_loader;
 mod rules_manager;
+mod scan_state;
+mod scan_stats;
+mod verdict_cache;
 
+use crossbeam_utils::atomic::AtomicCell;
 use git2::{Oid, Repository};
 use parking_lot::Mutex;
 use pyo3::exceptions;
 use pyo3::prelude::*;
-use pyo3::types::PyBytes;
-use std::collections::HashMap;
-use std::path::Path;
+use pyo3::types::{PyBytes, PyDict};
+use std::collections::{HashMap, VecDeque};
 use std::sync::Arc;
+use std::thread;
+use std::time;
+
+const SCAN_ITERATOR_BUFFER_SIZE: usize = 256;
+const DEFAULT_PROGRESS_INTERVAL: f64 = 1.0;
 
 /// GitRepositoryScanner class
 /// A git repository scanner object
 ///
 /// input:
-///     None
+///     blob_cache_size: int = 1000000 -> The maximum number of scanned blobs to keep in memory during a scan.
+///         Blobs that appear in multiple commits are scanned only once. 0 disables the cache.
+///     num_threads: int = None -> The number of scanning threads. Defaults to the number of available cores,
+///         which respects the CPU affinity and the cgroup CPU quota of the process.
+///     max_memory: int = None -> An approximate memory budget in bytes for the blob cache and the matches.
+///         The blob cache uses up to half of it. A scan whose matches exceed the rest raises an error.
+///     cpu_affinity: list[int] = None -> CPU core ids to pin the scanning threads to, in a round robin manner.
+///     diff_hunks_only: bool = False -> Scan only the lines that a commit added to a modified file instead of
+///         the whole file.
+///     match_context_size: int = 0 -> The number of bytes around each content match to return under "context".
+///         0 returns no context.
+///     merge_strategy: str = "skip" -> How merge commits are scanned. "skip" does not scan them, "first_parent"
+///         scans their diff against their first parent and "combined" scans only the lines that were added
+///         relative to all of their parents.
+///     max_content_size: int = 5000000 -> Files larger than this number of bytes are not read into memory at once.
+///         They are scanned in windows of this size instead, which overlap by the longest possible match.
+///     profile: bool = False -> Measure the time of every phase of a scan and of every content rule.
+///         The times are returned by last_scan_stats and last_scan_rules_stats.
 ///
 /// example:
 ///     grs = pyrepscan.GitRepositoryScanner()
 #[pyclass]
-#[derive(Default)]
 struct GitRepositoryScanner {
     rules_manager: rules_manager::RulesManager,
+    scan_options: git_repository_scanner::ScanOptions,
+    last_scan_stats: Arc<Mutex<scan_stats::ScanStatsSummary>>,
 }
 
 #[pymethods]
 impl GitRepositoryScanner {
     #[new]
-    fn new() -> Self {
-        Self::default()
+    fn new(
+        blob_cache_size: Option<usize>,
+        num_threads: Option<usize>,
+        max_memory: Option<usize>,
+        cpu_affinity: Option<Vec<usize>>,
+        diff_hunks_only: Option<bool>,
+        match_context_size: Option<usize>,
+        merge_strategy: Option<&str>,
+        max_content_size: Option<usize>,
+        profile: Option<bool>,
+    ) -> PyResult<Self> {
+        if num_threads == Some(0) {
+            return Err(
+                exceptions::PyRuntimeError::new_err("Number of threads must be greater than zero")
+            )
+        }
+        if max_content_size == Some(0) {
+            return Err(
+                exceptions::PyRuntimeError::new_err("Max content size must be greater than zero")
+            )
+        }
+        let merge_strategy = match merge_strategy {
+            Some(merge_strategy) => git_repository_scanner::MergeStrategy::from_name(merge_strategy).ok_or_else(
+                || exceptions::PyRuntimeError::new_err(format!("Invalid merge strategy: {merge_strategy}"))
+            )?,
+            None => git_repository_scanner::MergeStrategy::Skip,
+        };
+
+        let mut scan_options = git_repository_scanner::ScanOptions {
+            num_threads,
+            max_memory,
+            cpu_affinity,
+            diff_hunks_only: diff_hunks_only.unwrap_or(false),
+            match_context_size: match_context_size.unwrap_or(0),
+            merge_strategy,
+            profile: profile.unwrap_or(false),
+            ..Default::default()
+        };
+        if let Some(blob_cache_size) = blob_cache_size {
+            scan_options.blob_cache_size = blob_cache_size;
+        }
+        if let Some(max_content_size) = max_content_size {
+            scan_options.max_content_size = max_content_size;
+        }
+
+        Ok(
+            GitRepositoryScanner {
+                rules_manager: rules_manager::RulesManager::new(),
+                scan_options,
+                last_scan_stats: Arc::new(Mutex::new(scan_stats::ScanStatsSummary::default())),
+            }
+        )
     }
 
     /// Adding a new content rule. A content rule is a rule that will be applied to the content of
@@ -72,6 +152,52 @@ impl GitRepositoryScanner {
         )
     }
 
+    /// Adding a new entropy rule. An entropy rule matches the random tokens of a content, such as keys and
+    /// passwords that have no known format. The content is split into tokens, runs of the characters of a
+    /// charset, and every token whose Shannon entropy is at least the threshold is a match. Entropy rules
+    /// are scanned in the same pass over the content as the content rules.
+    ///
+    /// input:
+    ///     name: str -> The name of the rules. This will help to identify which rule has been matched.
+    ///     charset: str -> The characters the tokens are made of. Either one of "base64", "base64url", "hex"
+    ///         and "alphanumeric", or the ASCII characters of the charset themselves.
+    ///     threshold: float -> The minimum entropy of a token in bits per character.
+    ///     min_length: int -> The minimum length of a token, between 2 and 256. Longer tokens than 256
+    ///         characters are encoded data rather than secrets, and are skipped.
+    ///     whitelist_patterns: list[str] -> The same as in add_content_rule, applied to the tokens.
+    ///     blacklist_patterns: list[str] -> The same as in add_content_rule, applied to the tokens.
+    ///
+    /// returns:
+    ///     None
+    ///
+    /// example:
+    ///     grs.add_entropy_rule(
+    ///         name="High Entropy Hex",
+    ///         charset="hex",
+    ///         threshold=3.0,
+    ///         min_length=20,
+    ///         whitelist_patterns=[],
+    ///         blacklist_patterns=[],
+    ///     )
+    fn add_entropy_rule(
+        &mut self,
+        name: String,
+        charset: String,
+        threshold: f64,
+        min_length: usize,
+        whitelist_patterns: Vec<String>,
+        blacklist_patterns: Vec<String>,
+    ) -> PyResult<()> {
+        self.rules_manager.add_entropy_rule(
+            name,
+            charset,
+            threshold,
+            min_length,
+            whitelist_patterns,
+            blacklist_patterns,
+        )
+    }
+
     /// Adding a new file path rule. A file path rule is a rule that will be applied to the file path of
     /// the commit changes. For every commit, each file will be scanned.
     ///
@@ -145,6 +271,76 @@ impl GitRepositoryScanner {
         self.rules_manager.add_file_path_to_skip(file_path)
     }
 
+    /// Adding a glob of file paths to skip during the scan. Globs are matched case insensitively.
+    /// `*` and `?` do not match a "/", `**` matches any number of directories and `[...]` matches
+    /// a character class. A glob without a "/" matches any directory or file name along the path,
+    /// and a glob that matches a directory skips everything under it, before it is diffed or walked.
+    ///
+    /// input:
+    ///     glob: str ->  A glob of file paths to skip during the scan.
+    ///
+    /// returns:
+    ///     None
+    ///
+    /// example:
+    ///     grs.add_file_glob_to_skip(
+    ///         glob="node_modules",
+    ///     )
+    ///     grs.add_file_glob_to_skip(
+    ///         glob="*.min.js",
+    ///     )
+    fn add_file_glob_to_skip(
+        &mut self,
+        glob: String,
+    ) -> PyResult<()> {
+        self.rules_manager.add_file_glob_to_skip(glob)
+    }
+
+    /// Adding a glob of file paths to include in the scan. Once a glob was added, only the files whose
+    /// paths match one of the globs to include are scanned. The globs are the same as in add_file_glob_to_skip.
+    ///
+    /// input:
+    ///     glob: str ->  A glob of file paths to include in the scan.
+    ///
+    /// returns:
+    ///     None
+    ///
+    /// example:
+    ///     grs.add_file_glob_to_include(
+    ///         glob="src/**/*.py",
+    ///     )
+    fn add_file_glob_to_include(
+        &mut self,
+        glob: String,
+    ) -> PyResult<()> {
+        self.rules_manager.add_file_glob_to_include(glob)
+    }
+
+    /// Loading all the rules and filters of a TOML or a YAML rules file at once. Both the pyrepscan format
+    /// and the gitleaks format are supported. The content rules are compiled in parallel.
+    ///
+    /// input:
+    ///     rules_path: str ->  The path of a .toml, .yaml or .yml rules file.
+    ///     cache_path: str = None -> A path of a file to cache the validated rules in. When the cache
+    ///         was written for the same rules file, it is loaded instead of parsing the rules file again.
+    ///
+    /// returns:
+    ///     None
+    ///
+    /// example:
+    ///     grs.load_rules(
+    ///         rules_path="/path/to/gitleaks.toml",
+    ///         cache_path="/tmp/gitleaks.rules_cache",
+    ///     )
+    fn load_rules(
+        &mut self,
+        py: Python,
+        rules_path: &str,
+        cache_path: Option<&str>,
+    ) -> PyResult<()> {
+        self.rules_manager.load_rules(py, rules_path, cache_path)
+    }
+
     /// Retrieves a file content using its ObjectID.
     ///
     /// input:
@@ -183,15 +379,27 @@ impl GitRepositoryScanner {
     }
 
     /// Scan a git repository for secrets. Rules shuld be loaded before calling this function.
+    /// The GIL is released during the scan so other Python threads can keep running.
     ///
     /// input:
     ///     repository_path: str ->  Absolute path of the git repository directory.
     ///     branch_glob_pattern: str ->  A blob pattern to match against the git branches names.
     ///         Only matched branches will be scanned.
     ///     from_timestamp: int = 0 ->  Unix epoch timestamp to start the scan from.
+    ///     state_path: str = None -> A path of a file that keeps the commits and blobs that were already scanned.
+    ///         When set, only new commits and blobs are scanned and the file is updated once the scan is done.
+    ///         The file is ignored if the rules were changed since it was written.
+    ///     progress_callback: Callable[[dict[str, int]], None] = None -> Called periodically during the scan with
+    ///         its progress: commits_done, commits_total, matches, bytes_scanned and elapsed_time_ns.
+    ///         commits_total keeps growing until all of the branches were walked.
+    ///     progress_interval: float = 1.0 -> The minimal number of seconds between two calls of progress_callback.
+    ///     cancellation_token: CancellationToken = None -> A token that stops the scan once it is cancelled.
+    ///     timeout: float = None -> The number of seconds after which the scan is stopped.
+    ///         A cancelled or timed out scan raises a RuntimeError.
     ///
     /// returns:
-    ///     list[dict] -> List of matches
+    ///     list[dict] -> List of matches. Content matches also hold their byte offset, line number and column
+    ///         under "offset", "line_number" and "column".
     ///
     /// example:
     ///     grs.scan(
@@ -204,29 +412,464 @@ impl GitRepositoryScanner {
         repository_path: &str,
         branch_glob_pattern: Option<&str>,
         from_timestamp: Option<i64>,
+        state_path: Option<&str>,
+        progress_callback: Option<PyObject>,
+        progress_interval: Option<f64>,
+        cancellation_token: Option<CancellationToken>,
+        timeout: Option<f64>,
     ) -> PyResult<PyObject> {
-        let matches = Arc::new(Mutex::new(Vec::<HashMap<&str, String>>::with_capacity(10000)));
-        match git_repository_scanner::scan_repository(
-            &py,
-            repository_path,
-            branch_glob_pattern.unwrap_or("*"),
-            from_timestamp.unwrap_or(0),
-            &self.rules_manager,
-            matches.clone(),
-        ) {
-            Ok(_) => Ok(matches.lock().to_object(py)),
-            Err(error) => Err(error),
-        }
+        let scan_monitor = ScanMonitor::new(progress_callback, progress_interval, cancellation_token, timeout)?;
+        let matches = git_repository_scanner::MatchesBuffer::new(self.scan_options.matches_max_memory());
+        let scan_stats = py.allow_threads(
+            || git_repository_scanner::scan_repository(
+                repository_path,
+                branch_glob_pattern.unwrap_or("*"),
+                from_timestamp.unwrap_or(0),
+                state_path,
+                &self.rules_manager,
+                &self.scan_options,
+                &|scan_stats| scan_monitor.check_progress(scan_stats),
+                &|commit_matches| matches.push(commit_matches),
+            )
+        )?;
+        *self.last_scan_stats.lock() = scan_stats;
+
+        Ok(matches.into_matches()?.to_object(py))
+    }
+
+    /// Scan a git repository for secrets and return the matches as columns instead of a list of dicts.
+    /// The metadata of each commit is returned once, and each match points to its commit by its index,
+    /// which keeps large results compact. The columns can be loaded directly into a pandas DataFrame.
+    ///
+    /// input:
+    ///     repository_path: str ->  Absolute path of the git repository directory.
+    ///     branch_glob_pattern: str ->  A blob pattern to match against the git branches names.
+    ///         Only matched branches will be scanned.
+    ///     from_timestamp: int = 0 ->  Unix epoch timestamp to start the scan from.
+    ///     state_path: str = None -> A path of a file that keeps the commits and blobs that were already scanned.
+    ///     progress_callback, progress_interval, cancellation_token, timeout -> The same as in scan.
+    ///
+    /// returns:
+    ///     dict[str, dict[str, list]] -> "commits" holds the columns commit_id, commit_message, commit_time,
+    ///         author_name and author_email. "matches" holds the columns commit_index, file_path, file_oid,
+    ///         rule_name, match_text, offset, line_number, column and context. Missing values are None.
+    ///
+    /// example:
+    ///     columns = grs.scan_columns(
+    ///         repository_path="/path/to/repository",
+    ///         branch_glob_pattern="*",
+    ///     )
+    ///     matches = pandas.DataFrame(columns["matches"]).join(
+    ///         pandas.DataFrame(columns["commits"]),
+    ///         on="commit_index",
+    ///     )
+    fn scan_columns(
+        &self,
+        py: Python,
+        repository_path: &str,
+        branch_glob_pattern: Option<&str>,
+        from_timestamp: Option<i64>,
+        state_path: Option<&str>,
+        progress_callback: Option<PyObject>,
+        progress_interval: Option<f64>,
+        cancellation_token: Option<CancellationToken>,
+        timeout: Option<f64>,
+    ) -> PyResult<PyObject> {
+        let scan_monitor = ScanMonitor::new(progress_callback, progress_interval, cancellation_token, timeout)?;
+        let matches = git_repository_scanner::MatchesBuffer::new(self.scan_options.matches_max_memory());
+        let scan_stats = py.allow_threads(
+            || git_repository_scanner::scan_repository(
+                repository_path,
+                branch_glob_pattern.unwrap_or("*"),
+                from_timestamp.unwrap_or(0),
+                state_path,
+                &self.rules_manager,
+                &self.scan_options,
+                &|scan_stats| scan_monitor.check_progress(scan_stats),
+                &|commit_matches| matches.push(commit_matches),
+            )
+        )?;
+        *self.last_scan_stats.lock() = scan_stats;
+
+        Ok(matches.into_columns()?.into_py(py))
+    }
+
+    /// Scan multiple git repositories for secrets using a single pool of threads. Rules should be loaded
+    /// before calling this function. A repository that can not be scanned does not abort the scan.
+    ///
+    /// input:
+    ///     repository_paths: list[str] ->  Absolute paths of the git repositories directories.
+    ///     branch_glob_pattern: str ->  A blob pattern to match against the git branches names.
+    ///         Only matched branches will be scanned.
+    ///     from_timestamp: int = 0 ->  Unix epoch timestamp to start the scan from.
+    ///     progress_callback, progress_interval, cancellation_token, timeout -> The same as in scan.
+    ///
+    /// returns:
+    ///     tuple[list[dict], dict[str, str]] -> List of matches, each of them holds the path of its
+    ///         repository under "repository_path", and a dict of the repositories that could not be
+    ///         scanned mapped to their error
+    ///
+    /// example:
+    ///     results, errors = grs.scan_many(
+    ///         repository_paths=["/path/to/repository", "/path/to/another/repository"],
+    ///         branch_glob_pattern="*",
+    ///     )
+    fn scan_many(
+        &self,
+        py: Python,
+        repository_paths: Vec<String>,
+        branch_glob_pattern: Option<&str>,
+        from_timestamp: Option<i64>,
+        progress_callback: Option<PyObject>,
+        progress_interval: Option<f64>,
+        cancellation_token: Option<CancellationToken>,
+        timeout: Option<f64>,
+    ) -> PyResult<(PyObject, PyObject)> {
+        let scan_monitor = ScanMonitor::new(progress_callback, progress_interval, cancellation_token, timeout)?;
+        let matches = git_repository_scanner::MatchesBuffer::new(self.scan_options.matches_max_memory());
+        let (scan_stats, repository_errors) = py.allow_threads(
+            || git_repository_scanner::scan_repositories(
+                &repository_paths,
+                branch_glob_pattern.unwrap_or("*"),
+                from_timestamp.unwrap_or(0),
+                &self.rules_manager,
+                &self.scan_options,
+                &|scan_stats| scan_monitor.check_progress(scan_stats),
+                &|commit_matches| matches.push(commit_matches),
+            )
+        )?;
+        *self.last_scan_stats.lock() = scan_stats;
+
+        Ok((matches.into_matches()?.to_object(py), repository_errors.to_object(py)))
+    }
+
+    /// Scan only the commits of the given revisions, such as the old..new range of a pushed ref in a
+    /// pre-receive hook. Rules should be loaded before calling this function. A range of a few commits
+    /// is scanned on the calling thread without spawning the scanning threads.
+    ///
+    /// input:
+    ///     repository_path: str ->  Absolute path of the git repository directory.
+    ///     revspecs: list[str] -> Revisions to scan the commits that are reachable from. A revision can be
+    ///         a range such as "old..new", where an all-zero old of a newly created ref holds the commits
+    ///         of new that no other ref reaches, a symmetric difference such as "left...right", and a
+    ///         revision that starts with "^" excludes the commits that are reachable from it.
+    ///     progress_callback, progress_interval, cancellation_token, timeout -> The same as in scan.
+    ///
+    /// returns:
+    ///     list[dict] -> List of matches
+    ///
+    /// example:
+    ///     grs.scan_range(
+    ///         repository_path="/path/to/repository",
+    ///         revspecs=["1111111111111111111111111111111111111111..2222222222222222222222222222222222222222"],
+    ///     )
+    fn scan_range(
+        &self,
+        py: Python,
+        repository_path: &str,
+        revspecs: Vec<String>,
+        progress_callback: Option<PyObject>,
+        progress_interval: Option<f64>,
+        cancellation_token: Option<CancellationToken>,
+        timeout: Option<f64>,
+    ) -> PyResult<PyObject> {
+        let scan_monitor = ScanMonitor::new(progress_callback, progress_interval, cancellation_token, timeout)?;
+        let matches = git_repository_scanner::MatchesBuffer::new(self.scan_options.matches_max_memory());
+        let scan_stats = py.allow_threads(
+            || git_repository_scanner::scan_commit_range(
+                repository_path,
+                &revspecs,
+                &self.rules_manager,
+                &self.scan_options,
+                &|scan_stats| scan_monitor.check_progress(scan_stats),
+                &|commit_matches| matches.push(commit_matches),
+            )
+        )?;
+        *self.last_scan_stats.lock() = scan_stats;
+
+        Ok(matches.into_matches()?.to_object(py))
+    }
+
+    /// Scan the changes that are staged in the index of a git repository, such as in a pre-commit hook.
+    /// Rules should be loaded before calling this function.
+    ///
+    /// input:
+    ///     repository_path: str ->  Absolute path of the git repository directory.
+    ///     progress_callback, progress_interval, cancellation_token, timeout -> The same as in scan.
+    ///
+    /// returns:
+    ///     list[dict] -> List of matches. They have the same shape as the matches of scan, without
+    ///         the commit related keys.
+    ///
+    /// example:
+    ///     grs.scan_index(
+    ///         repository_path="/path/to/repository",
+    ///     )
+    fn scan_index(
+        &self,
+        py: Python,
+        repository_path: &str,
+        progress_callback: Option<PyObject>,
+        progress_interval: Option<f64>,
+        cancellation_token: Option<CancellationToken>,
+        timeout: Option<f64>,
+    ) -> PyResult<PyObject> {
+        let scan_monitor = ScanMonitor::new(progress_callback, progress_interval, cancellation_token, timeout)?;
+        let (matches, scan_stats) = py.allow_threads(
+            || git_repository_scanner::scan_index(
+                repository_path,
+                &self.rules_manager,
+                &self.scan_options,
+                &|scan_stats| scan_monitor.check_progress(scan_stats),
+            )
+        )?;
+        *self.last_scan_stats.lock() = scan_stats;
+
+        Ok(matches.to_object(py))
+    }
+
+    /// Scan a git repository for secrets without blocking the running asyncio event loop.
+    /// The scan runs in the event loop's default executor. Rules should be loaded before calling this function.
+    ///
+    /// input:
+    ///     repository_path: str ->  Absolute path of the git repository directory.
+    ///     branch_glob_pattern: str ->  A blob pattern to match against the git branches names.
+    ///         Only matched branches will be scanned.
+    ///     from_timestamp: int = 0 ->  Unix epoch timestamp to start the scan from.
+    ///     state_path: str = None -> A path of a file that keeps the commits and blobs that were already scanned.
+    ///     progress_callback, progress_interval, cancellation_token, timeout -> The same as in scan.
+    ///
+    /// returns:
+    ///     asyncio.Future[list[dict]] -> A future that resolves to the list of matches
+    ///
+    /// example:
+    ///     results = await grs.scan_async(
+    ///         repository_path="/path/to/repository",
+    ///         branch_glob_pattern="*",
+    ///     )
+    fn scan_async(
+        slf: PyRef<'_, Self>,
+        py: Python,
+        repository_path: &str,
+        branch_glob_pattern: Option<&str>,
+        from_timestamp: Option<i64>,
+        state_path: Option<&str>,
+        progress_callback: Option<PyObject>,
+        progress_interval: Option<f64>,
+        cancellation_token: Option<CancellationToken>,
+        timeout: Option<f64>,
+    ) -> PyResult<PyObject> {
+        let scan_kwargs = PyDict::new(py);
+        scan_kwargs.set_item("repository_path", repository_path)?;
+        scan_kwargs.set_item("branch_glob_pattern", branch_glob_pattern)?;
+        scan_kwargs.set_item("from_timestamp", from_timestamp)?;
+        scan_kwargs.set_item("state_path", state_path)?;
+        scan_kwargs.set_item("progress_callback", progress_callback)?;
+        scan_kwargs.set_item("progress_interval", progress_interval)?;
+        scan_kwargs.set_item("cancellation_token", cancellation_token.map(|cancellation_token| cancellation_token.into_py(py)))?;
+        scan_kwargs.set_item("timeout", timeout)?;
+
+        let scan = slf.into_py(py).getattr(py, "scan")?;
+        let scan_call = py.import("functools")?.getattr("partial")?.call((scan,), Some(scan_kwargs))?;
+
+        let event_loop = py.import("asyncio")?.call_method0("get_running_loop")?;
+        let scan_future = event_loop.call_method1("run_in_executor", (py.None(), scan_call))?;
+
+        Ok(scan_future.into())
+    }
+
+    /// Scan the files of a directory for secrets, without any git history, such as a working tree or
+    /// an extracted container image layer. Rules should be loaded before calling this function.
+    /// The directories are walked and the files are scanned in parallel, and the GIL is released during the scan.
+    ///
+    /// input:
+    ///     directory_path: str ->  Path of the directory to scan. Symbolic links are not followed and
+    ///         .git directories are skipped.
+    ///     progress_callback, progress_interval, cancellation_token, timeout -> The same as in scan.
+    ///
+    /// returns:
+    ///     list[dict] -> List of matches. Each of them holds the path of its file relative to the directory
+    ///         under "file_path", and has no commit related keys.
+    ///
+    /// example:
+    ///     grs.scan_directory(
+    ///         directory_path="/path/to/directory",
+    ///     )
+    fn scan_directory(
+        &self,
+        py: Python,
+        directory_path: &str,
+        progress_callback: Option<PyObject>,
+        progress_interval: Option<f64>,
+        cancellation_token: Option<CancellationToken>,
+        timeout: Option<f64>,
+    ) -> PyResult<PyObject> {
+        let scan_monitor = ScanMonitor::new(progress_callback, progress_interval, cancellation_token, timeout)?;
+        let matches = git_repository_scanner::MatchesBuffer::new(self.scan_options.matches_max_memory());
+        let scan_stats = py.allow_threads(
+            || directory_scanner::scan_directory(
+                directory_path,
+                &self.rules_manager,
+                &self.scan_options,
+                &|scan_stats| scan_monitor.check_progress(scan_stats),
+                &|file_matches| matches.push(file_matches),
+            )
+        )?;
+        *self.last_scan_stats.lock() = scan_stats;
+
+        Ok(matches.into_matches()?.to_object(py))
+    }
+
+    /// Scan a git repository for secrets and iterate over the matches while the scan is still running.
+    /// The scan runs in a background thread and passes the matches through a bounded buffer, so the
+    /// memory stays bounded no matter how many matches are found. Once the iterator is exhausted
+    /// or dropped, the scan stops. Rules should be loaded before calling this function.
+    ///
+    /// input:
+    ///     repository_path: str ->  Absolute path of the git repository directory.
+    ///     branch_glob_pattern: str ->  A blob pattern to match against the git branches names.
+    ///         Only matched branches will be scanned.
+    ///     from_timestamp: int = 0 ->  Unix epoch timestamp to start the scan from.
+    ///     state_path: str = None -> A path of a file that keeps the commits and blobs that were already scanned.
+    ///         The file is updated only if the iterator was fully consumed.
+    ///     progress_callback, progress_interval, cancellation_token, timeout -> The same as in scan. They are
+    ///         checked by the background thread, and a cancelled or timed out scan ends the iterator with
+    ///         a RuntimeError once the matches that were already found are consumed.
+    ///
+    /// returns:
+    ///     iterator[dict] -> An iterator of matches
+    ///
+    /// example:
+    ///     for match in grs.scan_iter(
+    ///         repository_path="/path/to/repository",
+    ///         branch_glob_pattern="*",
+    ///     ):
+    ///         print(match)
+    fn scan_iter(
+        &self,
+        repository_path: &str,
+        branch_glob_pattern: Option<&str>,
+        from_timestamp: Option<i64>,
+        state_path: Option<&str>,
+        progress_callback: Option<PyObject>,
+        progress_interval: Option<f64>,
+        cancellation_token: Option<CancellationToken>,
+        timeout: Option<f64>,
+    ) -> PyResult<ScanIterator> {
+        let scan_monitor = ScanMonitor::new(progress_callback, progress_interval, cancellation_token, timeout)?;
+        let (sender, receiver) = crossbeam::channel::bounded(SCAN_ITERATOR_BUFFER_SIZE);
+
+        let repository_path = repository_path.to_string();
+        let branch_glob_pattern = branch_glob_pattern.unwrap_or("*").to_string();
+        let from_timestamp = from_timestamp.unwrap_or(0);
+        let state_path = state_path.map(String::from);
+        let rules_manager = self.rules_manager.clone();
+        let scan_options = self.scan_options.clone();
+        let last_scan_stats = self.last_scan_stats.clone();
+        let is_dropped = Arc::new(AtomicCell::new(false));
+        let scan_is_dropped = is_dropped.clone();
+
+        let scan_thread = thread::spawn(
+            move || {
+                let scan_stats = git_repository_scanner::scan_repository(
+                    &repository_path,
+                    &branch_glob_pattern,
+                    from_timestamp,
+                    state_path.as_deref(),
+                    &rules_manager,
+                    &scan_options,
+                    &|scan_stats| {
+                        // A scan whose iterator was dropped stops, even while it finds no matches to send
+                        if scan_is_dropped.load() {
+                            return Err(
+                                exceptions::PyRuntimeError::new_err("The scan iterator was dropped")
+                            );
+                        }
+
+                        scan_monitor.check_progress(scan_stats)
+                    },
+                    &|commit_matches| sender.send(commit_matches).is_ok(),
+                )?;
+                *last_scan_stats.lock() = scan_stats;
+
+                Ok(())
+            }
+        );
+
+        Ok(
+            ScanIterator {
+                receiver,
+                pending_matches: VecDeque::new(),
+                scan_thread: Some(scan_thread),
+                is_dropped,
+            }
+        )
+    }
+
+    /// Retrieves the statistics of the last scan that was performed by this scanner.
+    ///
+    /// input:
+    ///     None
+    ///
+    /// returns:
+    ///     dict[str, int] -> The statistics of the last scan. Empty if no scan was performed yet.
+    ///         blob_cache_hits - The number of blobs that were already scanned in another commit.
+    ///         blob_cache_misses - The number of blobs that had to be read and scanned.
+    ///         blob_cache_evictions - The number of scanned blobs that were dropped to keep the cache bounded.
+    ///         commits_walked - The number of commits that were found by walking the branches.
+    ///         commits_scanned - The number of commits whose diff was computed and scanned.
+    ///         deltas_seen - The number of files that were changed by the scanned commits.
+    ///         deltas_skipped - The number of changed files that were skipped by their extension or path.
+    ///         binary_contents - The number of blobs or files that were scanned only by the file path rules
+    ///             since they are binary.
+    ///         large_contents - The number of blobs or files that were larger than max_content_size and were
+    ///             scanned in windows.
+    ///         bytes_scanned - The number of bytes that were scanned by the content rules.
+    ///         scan_time_ns - The wall time of the scan in nanoseconds.
+    ///         walk_time_ns, diff_time_ns, blob_read_time_ns, content_scan_time_ns - Only when profiling.
+    ///             The time of every phase of the scan in nanoseconds, summed across all of its threads.
+    ///
+    /// example:
+    ///     grs.last_scan_stats()
+    fn last_scan_stats(
+        &self,
+    ) -> HashMap<&'static str, u64> {
+        self.last_scan_stats.lock().counters.clone()
+    }
+
+    /// Retrieves the statistics of every content rule in the last scan that was performed by this scanner.
+    /// The statistics are collected only when the scanner was created with profile=True.
+    ///
+    /// input:
+    ///     None
+    ///
+    /// returns:
+    ///     dict[str, dict[str, int]] -> The statistics of every content rule by its name. Rules with the same
+    ///         name are summed together.
+    ///         scan_time_ns - The time the rule took in nanoseconds, summed across all of the threads.
+    ///         matches - The number of matches of the rule that passed its whitelist and blacklist patterns.
+    ///
+    /// example:
+    ///     grs.last_scan_rules_stats()
+    fn last_scan_rules_stats(
+        &self,
+    ) -> HashMap<String, HashMap<&'static str, u64>> {
+        self.last_scan_stats.lock().rules.clone()
     }
 
     /// Scan a git repository for secrets. Rules shuld be loaded before calling this function.
+    /// If the repository was already cloned to repository_path, only its new objects are fetched.
     ///
     /// input:
     ///     url: str -> URL of a git repository
-    ///     repository_path: str ->  The path to clone the repository to
+    ///     repository_path: str ->  The path to clone the repository to, or of an existing bare clone of it
     ///     branch_glob_pattern: str ->  A blob pattern to match against the git branches names.
     ///         Only matched branches will be scanned.
     ///     from_timestamp: int = 0 ->  Unix epoch timestamp to start the scan from.
+    ///     state_path: str = None -> A path of a file that keeps the commits and blobs that were already scanned.
+    ///     progress_callback, progress_interval, cancellation_token, timeout -> The same as in scan.
+    ///     update_remote_url: bool = False -> Reuse an existing clone at repository_path even if it was cloned
+    ///         from another URL, and repoint it to url. Otherwise such a clone raises an error.
     ///
     /// returns:
     ///     list[dict] -> List of matches
@@ -244,15 +887,200 @@ impl GitRepositoryScanner {
         repository_path: &str,
         branch_glob_pattern: Option<&str>,
         from_timestamp: Option<i64>,
+        state_path: Option<&str>,
+        progress_callback: Option<PyObject>,
+        progress_interval: Option<f64>,
+        cancellation_token: Option<CancellationToken>,
+        timeout: Option<f64>,
+        update_remote_url: Option<bool>,
     ) -> PyResult<PyObject> {
-        let mut builder = git2::build::RepoBuilder::new();
-        builder.bare(true);
+        py.allow_threads(
+            || git_repository_scanner::clone_or_fetch_repository(
+                url,
+                repository_path,
+                update_remote_url.unwrap_or(false),
+            )
+        ).map_err(
+            |error| exceptions::PyRuntimeError::new_err(error.to_string())
+        )?;
+
+        self.scan(
+            py,
+            repository_path,
+            branch_glob_pattern,
+            from_timestamp,
+            state_path,
+            progress_callback,
+            progress_interval,
+            cancellation_token,
+            timeout,
+        )
+    }
+}
+
+/// ScanIterator class
+/// An iterator over the matches of a scan that runs in the background. Created by GitRepositoryScanner.scan_iter
+#[pyclass]
+struct ScanIterator {
+    receiver: crossbeam::channel::Receiver<git_repository_scanner::CommitMatches>,
+    pending_matches: VecDeque<git_repository_scanner::Match>,
+    scan_thread: Option<thread::JoinHandle<PyResult<()>>>,
+    is_dropped: Arc<AtomicCell<bool>>,
+}
+
+impl Drop for ScanIterator {
+    fn drop(
+        &mut self,
+    ) {
+        self.is_dropped.store(true);
+    }
+}
+
+#[pymethods]
+impl ScanIterator {
+    fn __iter__(
+        slf: PyRef<'_, Self>,
+    ) -> PyRef<'_, Self> {
+        slf
+    }
+
+    fn __next__(
+        mut slf: PyRefMut<'_, Self>,
+        py: Python,
+    ) -> PyResult<Option<PyObject>> {
+        loop {
+            if let Some(scan_match) = slf.pending_matches.pop_front() {
+                return Ok(Some(scan_match.into_py(py)));
+            }
+
+            let receiver = slf.receiver.clone();
+            match py.allow_threads(|| receiver.recv_timeout(time::Duration::from_millis(100))) {
+                Ok(commit_matches) => slf.pending_matches.extend(commit_matches.into_matches()),
+                Err(crossbeam::channel::RecvTimeoutError::Timeout) => py.check_signals()?,
+                Err(crossbeam::channel::RecvTimeoutError::Disconnected) => {
+                    return match slf.scan_thread.take().map(|scan_thread| scan_thread.join()) {
+                        Some(Ok(scan_result)) => scan_result.map(|_| None),
+                        Some(Err(_)) => Err(exceptions::PyRuntimeError::new_err("The scan thread has panicked")),
+                        None => Ok(None),
+                    };
+                },
+            }
+        }
+    }
+}
+
+/// CancellationToken class
+/// A token that stops the scans it was passed to once it is cancelled. It can be cancelled from any thread
+/// while the scans are running, and a cancelled scan raises a RuntimeError.
+///
+/// example:
+///     cancellation_token = pyrepscan.CancellationToken()
+///     threading.Timer(60, cancellation_token.cancel).start()
+///     grs.scan(
+///         repository_path="/path/to/repository",
+///         cancellation_token=cancellation_token,
+///     )
+#[pyclass]
+#[derive(Clone, Default)]
+struct CancellationToken {
+    is_cancelled: Arc<AtomicCell<bool>>,
+}
+
+#[pymethods]
+impl CancellationToken {
+    #[new]
+    fn new() -> Self {
+        Self::default()
+    }
+
+    fn cancel(
+        &self,
+    ) {
+        self.is_cancelled.store(true);
+    }
+
+    fn is_cancelled(
+        &self,
+    ) -> bool {
+        self.is_cancelled.load()
+    }
+}
+
+/// Watches a running scan from the calling thread. It stops the scan on a signal, once its cancellation
+/// token was cancelled or once its timeout has passed, and reports the progress of the scan to the progress
+/// callback at most once per progress interval. An exception of the progress callback stops the scan too.
+struct ScanMonitor {
+    progress_callback: Option<PyObject>,
+    progress_interval: time::Duration,
+    last_progress_time: AtomicCell<time::Instant>,
+    cancellation_token: Option<CancellationToken>,
+    deadline: Option<time::Instant>,
+}
 
-        if let Err(error) = builder.clone(url, Path::new(repository_path).as_ref()) {
-            return Err(exceptions::PyRuntimeError::new_err(error.to_string()));
+impl ScanMonitor {
+    fn new(
+        progress_callback: Option<PyObject>,
+        progress_interval: Option<f64>,
+        cancellation_token: Option<CancellationToken>,
+        timeout: Option<f64>,
+    ) -> PyResult<Self> {
+        let progress_interval = time::Duration::try_from_secs_f64(
+            progress_interval.unwrap_or(DEFAULT_PROGRESS_INTERVAL)
+        ).map_err(
+            |_| exceptions::PyRuntimeError::new_err("Progress interval must be a non negative number of seconds")
+        )?;
+        let timeout = match timeout {
+            Some(timeout) => Some(
+                time::Duration::try_from_secs_f64(timeout).map_err(
+                    |_| exceptions::PyRuntimeError::new_err("Timeout must be a non negative number of seconds")
+                )?
+            ),
+            None => None,
         };
 
-        self.scan(py, repository_path, branch_glob_pattern, from_timestamp)
+        let started_at = time::Instant::now();
+
+        Ok(
+            ScanMonitor {
+                progress_callback,
+                progress_interval,
+                last_progress_time: AtomicCell::new(started_at),
+                cancellation_token,
+                deadline: timeout.map(|timeout| started_at + timeout),
+            }
+        )
+    }
+
+    fn check_progress(
+        &self,
+        scan_stats: &scan_stats::ScanStats,
+    ) -> PyResult<()> {
+        if self.cancellation_token.as_ref().is_some_and(|cancellation_token| cancellation_token.is_cancelled()) {
+            return Err(
+                exceptions::PyRuntimeError::new_err("The scan was cancelled")
+            );
+        }
+        if self.deadline.is_some_and(|deadline| time::Instant::now() >= deadline) {
+            return Err(
+                exceptions::PyRuntimeError::new_err("The scan has timed out")
+            );
+        }
+
+        Python::with_gil(
+            |py| {
+                py.check_signals()?;
+
+                if let Some(progress_callback) = &self.progress_callback {
+                    let now = time::Instant::now();
+                    if now.duration_since(self.last_progress_time.load()) >= self.progress_interval {
+                        self.last_progress_time.store(now);
+                        progress_callback.call1(py, (scan_stats.progress(),))?;
+                    }
+                }
+
+                Ok(())
+            }
+        )
     }
 }
 
@@ -265,6 +1093,8 @@ fn pyrepscan(
     m: &PyModule,
 ) -> PyResult<()> {
     m.add_class::<GitRepositoryScanner>()?;
+    m.add_class::<ScanIterator>()?;
+    m.add_class::<CancellationToken>()?;
     m.add_class::<rules_manager::RulesManager>()?;
 
     Ok(())
@@ -0,0 +1,503 @@
+use crate::rules_manager::ContentRuleAnalysis;
+
+use regex_syntax::ast::{self, Ast};
+use serde::Deserialize;
+use std::fs;
+use std::io::{self, Write};
+use std::path::Path;
+
+const RULES_CACHE_MAGIC: &[u8; 8] = b"PRSRULE2";
+
+pub struct ContentRuleDefinition {
+    pub name: String,
+    pub pattern: String,
+    pub whitelist_patterns: Vec<String>,
+    pub blacklist_patterns: Vec<String>,
+}
+
+pub struct EntropyRuleDefinition {
+    pub name: String,
+    pub charset: String,
+    pub threshold: f64,
+    pub min_length: usize,
+    pub whitelist_patterns: Vec<String>,
+    pub blacklist_patterns: Vec<String>,
+}
+
+pub struct FilePathRuleDefinition {
+    pub name: String,
+    pub pattern: String,
+}
+
+/// All the rules and filters of a rules file, before any of them is compiled
+#[derive(Default)]
+pub struct Ruleset {
+    pub file_extensions_to_skip: Vec<String>,
+    pub file_paths_to_skip: Vec<String>,
+    pub file_globs_to_skip: Vec<String>,
+    pub file_globs_to_include: Vec<String>,
+    pub content_rules: Vec<ContentRuleDefinition>,
+    pub entropy_rules: Vec<EntropyRuleDefinition>,
+    pub file_path_rules: Vec<FilePathRuleDefinition>,
+}
+
+#[derive(Deserialize)]
+struct ContentRuleEntry {
+    name: String,
+    pattern: String,
+    #[serde(default)]
+    whitelist_patterns: Vec<String>,
+    #[serde(default)]
+    blacklist_patterns: Vec<String>,
+}
+
+#[derive(Deserialize)]
+struct EntropyRuleEntry {
+    name: String,
+    charset: String,
+    threshold: f64,
+    min_length: usize,
+    #[serde(default)]
+    whitelist_patterns: Vec<String>,
+    #[serde(default)]
+    blacklist_patterns: Vec<String>,
+}
+
+#[derive(Deserialize)]
+struct FilePathRuleEntry {
+    name: String,
+    pattern: String,
+}
+
+#[derive(Deserialize, Default)]
+#[serde(default)]
+struct GitleaksAllowlist {
+    regexes: Vec<String>,
+    stopwords: Vec<String>,
+}
+
+#[derive(Deserialize)]
+struct GitleaksRule {
+    id: Option<String>,
+    description: Option<String>,
+    regex: Option<String>,
+    path: Option<String>,
+    #[serde(default)]
+    allowlist: GitleaksAllowlist,
+    #[serde(default)]
+    allowlists: Vec<GitleaksAllowlist>,
+}
+
+/// The layout of a rules file. The fields of both the native format and the gitleaks format are
+/// optional, so a single file can hold either of them or both.
+#[derive(Deserialize, Default)]
+#[serde(default)]
+struct RulesFile {
+    file_extensions_to_skip: Vec<String>,
+    file_paths_to_skip: Vec<String>,
+    file_globs_to_skip: Vec<String>,
+    file_globs_to_include: Vec<String>,
+    content_rules: Vec<ContentRuleEntry>,
+    entropy_rules: Vec<EntropyRuleEntry>,
+    file_path_rules: Vec<FilePathRuleEntry>,
+    rules: Vec<GitleaksRule>,
+    allowlist: GitleaksAllowlist,
+}
+
+/// Turns every capturing group of a regex into a non capturing one, and returns how many there were
+fn remove_capture_groups(
+    ast: &mut Ast,
+) -> usize {
+    match ast {
+        Ast::Group(group) => {
+            let mut number_of_capture_groups = remove_capture_groups(&mut group.ast);
+            if !matches!(group.kind, ast::GroupKind::NonCapturing(_)) {
+                group.kind = ast::GroupKind::NonCapturing(
+                    ast::Flags {
+                        span: group.span,
+                        items: Vec::new(),
+                    }
+                );
+                number_of_capture_groups += 1;
+            }
+
+            number_of_capture_groups
+        },
+        Ast::Repetition(repetition) => remove_capture_groups(&mut repetition.ast),
+        Ast::Alternation(alternation) => alternation.asts.iter_mut().map(remove_capture_groups).sum(),
+        Ast::Concat(concat) => concat.asts.iter_mut().map(remove_capture_groups).sum(),
+        _ => 0,
+    }
+}
+
+/// A regex without any capturing group, along with the number of capturing groups it had
+fn pattern_without_capture_groups(
+    pattern: &str,
+) -> Result<(String, usize), String> {
+    let mut ast = ast::parse::Parser::new().parse(pattern).map_err(
+        |error| format!("Invalid regex pattern: {error}")
+    )?;
+    let number_of_capture_groups = remove_capture_groups(&mut ast);
+
+    let mut pattern_without_capture_groups = String::with_capacity(pattern.len());
+    ast::print::Printer::new().print(&ast, &mut pattern_without_capture_groups).map_err(
+        |error| format!("Invalid regex pattern: {error}")
+    )?;
+
+    Ok((pattern_without_capture_groups, number_of_capture_groups))
+}
+
+/// Content rules must have exactly one capturing group while gitleaks regexes can have any number of
+/// them. Matches are reported as a whole either way, so a regex with a different number of groups is
+/// wrapped by a single group instead of its own ones.
+fn single_capture_group_pattern(
+    pattern: &str,
+) -> Result<String, String> {
+    match pattern_without_capture_groups(pattern)? {
+        (_, 1) => Ok(pattern.to_string()),
+        (pattern_without_capture_groups, _) => Ok(format!("({pattern_without_capture_groups})")),
+    }
+}
+
+/// The regexes and the stopwords of a gitleaks allowlist as blacklist patterns, which must not have
+/// capturing groups
+fn allowlist_patterns(
+    allowlist: &GitleaksAllowlist,
+) -> Result<Vec<String>, String> {
+    let mut patterns = Vec::with_capacity(allowlist.regexes.len() + allowlist.stopwords.len());
+    for regex in allowlist.regexes.iter() {
+        patterns.push(pattern_without_capture_groups(regex)?.0);
+    }
+    patterns.extend(allowlist.stopwords.iter().map(|stopword| regex_syntax::escape(stopword)));
+
+    Ok(patterns)
+}
+
+impl Ruleset {
+    /// Parses a TOML or a YAML rules file by its extension. Rules in the gitleaks format become content
+    /// rules, or file path rules when they only have a path, and their allowlists become blacklist
+    /// patterns. Rules with both a regex and a path are refused, since content rules apply to every
+    /// file and such a rule would match where gitleaks does not. Path allowlists have no equivalent
+    /// and are ignored, so matches in the paths that gitleaks would suppress are reported too.
+    pub fn parse(
+        rules_path: &Path,
+        rules_file_content: &[u8],
+    ) -> Result<Self, String> {
+        let rules_file_content = std::str::from_utf8(rules_file_content).map_err(
+            |error| format!("Rules file is not a valid UTF-8: {error}")
+        )?;
+        let extension = rules_path.extension().map(
+            |extension| extension.to_string_lossy().to_ascii_lowercase()
+        );
+        let rules_file: RulesFile = match extension.as_deref() {
+            Some("toml") => toml::from_str(rules_file_content).map_err(
+                |error| format!("Invalid TOML rules file: {error}")
+            )?,
+            Some("yaml") | Some("yml") => serde_yaml::from_str(rules_file_content).map_err(
+                |error| format!("Invalid YAML rules file: {error}")
+            )?,
+            _ => return Err(format!("Rules file must be a .toml, .yaml or .yml file: {}", rules_path.display())),
+        };
+
+        let mut ruleset = Ruleset {
+            file_extensions_to_skip: rules_file.file_extensions_to_skip,
+            file_paths_to_skip: rules_file.file_paths_to_skip,
+            file_globs_to_skip: rules_file.file_globs_to_skip,
+            file_globs_to_include: rules_file.file_globs_to_include,
+            content_rules: rules_file.content_rules.into_iter().map(
+                |content_rule| ContentRuleDefinition {
+                    name: content_rule.name,
+                    pattern: content_rule.pattern,
+                    whitelist_patterns: content_rule.whitelist_patterns,
+                    blacklist_patterns: content_rule.blacklist_patterns,
+                }
+            ).collect(),
+            entropy_rules: rules_file.entropy_rules.into_iter().map(
+                |entropy_rule| EntropyRuleDefinition {
+                    name: entropy_rule.name,
+                    charset: entropy_rule.charset,
+                    threshold: entropy_rule.threshold,
+                    min_length: entropy_rule.min_length,
+                    whitelist_patterns: entropy_rule.whitelist_patterns,
+                    blacklist_patterns: entropy_rule.blacklist_patterns,
+                }
+            ).collect(),
+            file_path_rules: rules_file.file_path_rules.into_iter().map(
+                |file_path_rule| FilePathRuleDefinition {
+                    name: file_path_rule.name,
+                    pattern: file_path_rule.pattern,
+                }
+            ).collect(),
+        };
+
+        let global_blacklist_patterns = allowlist_patterns(&rules_file.allowlist)?;
+        for gitleaks_rule in rules_file.rules {
+            let name = gitleaks_rule.description.or(gitleaks_rule.id).unwrap_or_default();
+            match (gitleaks_rule.regex, gitleaks_rule.path) {
+                (Some(_), Some(_)) => {
+                    return Err(
+                        format!("Rules with both a regex and a path are not supported, as the regex would apply to every file: {name}")
+                    );
+                },
+                (Some(regex), None) => {
+                    let mut blacklist_patterns = global_blacklist_patterns.clone();
+                    for allowlist in std::iter::once(&gitleaks_rule.allowlist).chain(gitleaks_rule.allowlists.iter()) {
+                        blacklist_patterns.extend(allowlist_patterns(allowlist)?);
+                    }
+
+                    ruleset.content_rules.push(
+                        ContentRuleDefinition {
+                            name,
+                            pattern: single_capture_group_pattern(&regex)?,
+                            whitelist_patterns: Vec::new(),
+                            blacklist_patterns,
+                        }
+                    );
+                },
+                (None, Some(path)) => {
+                    ruleset.file_path_rules.push(
+                        FilePathRuleDefinition {
+                            name,
+                            pattern: path,
+                        }
+                    );
+                },
+                (None, None) => return Err(format!("Rule must have either a regex or a path: {name}")),
+            }
+        }
+
+        Ok(ruleset)
+    }
+}
+
+/// A FNV-1a hash of a rules file and of the library version, since a cache written by another version
+/// might not hold the same analyses
+pub fn ruleset_hash(
+    rules_file_content: &[u8],
+) -> u64 {
+    let mut hash: u64 = 0xcbf29ce484222325;
+    for byte in env!("CARGO_PKG_VERSION").as_bytes().iter().chain(&[0xff]).chain(rules_file_content) {
+        hash ^= *byte as u64;
+        hash = hash.wrapping_mul(0x100000001b3);
+    }
+
+    hash
+}
+
+fn write_bytes(
+    cache: &mut Vec<u8>,
+    bytes: &[u8],
+) {
+    cache.extend_from_slice(&(bytes.len() as u64).to_le_bytes());
+    cache.extend_from_slice(bytes);
+}
+
+fn write_strings(
+    cache: &mut Vec<u8>,
+    strings: &[String],
+) {
+    cache.extend_from_slice(&(strings.len() as u64).to_le_bytes());
+    for string in strings {
+        write_bytes(cache, string.as_bytes());
+    }
+}
+
+struct CacheReader<'a> {
+    bytes: &'a [u8],
+    offset: usize,
+}
+
+impl<'a> CacheReader<'a> {
+    fn read_u64(
+        &mut self,
+    ) -> io::Result<u64> {
+        let value_bytes = self.read_exact(8)?;
+        let mut value = [0u8; 8];
+        value.copy_from_slice(value_bytes);
+
+        Ok(u64::from_le_bytes(value))
+    }
+
+    fn read_exact(
+        &mut self,
+        length: usize,
+    ) -> io::Result<&'a [u8]> {
+        let bytes = self.bytes.get(self.offset..self.offset.saturating_add(length)).ok_or_else(
+            || io::Error::new(io::ErrorKind::InvalidData, "Truncated rules cache file")
+        )?;
+        self.offset += length;
+
+        Ok(bytes)
+    }
+
+    fn read_bytes(
+        &mut self,
+    ) -> io::Result<Vec<u8>> {
+        let length = self.read_u64()? as usize;
+
+        Ok(self.read_exact(length)?.to_vec())
+    }
+
+    fn read_string(
+        &mut self,
+    ) -> io::Result<String> {
+        String::from_utf8(self.read_bytes()?).map_err(
+            |error| io::Error::new(io::ErrorKind::InvalidData, error.to_string())
+        )
+    }
+
+    fn read_strings(
+        &mut self,
+    ) -> io::Result<Vec<String>> {
+        let number_of_strings = self.read_u64()? as usize;
+
+        (0..number_of_strings).map(|_| self.read_string()).collect()
+    }
+}
+
+/// Reads a ruleset and the analyses of its content rules from a cache file. Returns None if the cache
+/// file does not exist or was written for another ruleset.
+pub fn load_cache(
+    cache_path: &Path,
+    ruleset_hash: u64,
+) -> io::Result<Option<(Ruleset, Vec<ContentRuleAnalysis>)>> {
+    let bytes = match fs::read(cache_path) {
+        Ok(bytes) => bytes,
+        Err(error) if error.kind() == io::ErrorKind::NotFound => return Ok(None),
+        Err(error) => return Err(error),
+    };
+
+    let mut cache_reader = CacheReader {
+        bytes: &bytes,
+        offset: 0,
+    };
+    if cache_reader.read_exact(RULES_CACHE_MAGIC.len())? != RULES_CACHE_MAGIC {
+        return Err(
+            io::Error::new(
+                io::ErrorKind::InvalidData,
+                format!("Invalid rules cache file: {}", cache_path.display()),
+            )
+        );
+    }
+    if cache_reader.read_u64()? != ruleset_hash {
+        return Ok(None);
+    }
+
+    let mut ruleset = Ruleset {
+        file_extensions_to_skip: cache_reader.read_strings()?,
+        file_paths_to_skip: cache_reader.read_strings()?,
+        file_globs_to_skip: cache_reader.read_strings()?,
+        file_globs_to_include: cache_reader.read_strings()?,
+        ..Ruleset::default()
+    };
+
+    let number_of_content_rules = cache_reader.read_u64()? as usize;
+    let mut content_rules_analyses = Vec::with_capacity(number_of_content_rules);
+    for _ in 0..number_of_content_rules {
+        ruleset.content_rules.push(
+            ContentRuleDefinition {
+                name: cache_reader.read_string()?,
+                pattern: cache_reader.read_string()?,
+                whitelist_patterns: cache_reader.read_strings()?,
+                blacklist_patterns: cache_reader.read_strings()?,
+            }
+        );
+
+        let required_prefixes = match cache_reader.read_u64()? {
+            0 => None,
+            number_of_prefixes => Some(
+                (0..number_of_prefixes).map(|_| cache_reader.read_bytes()).collect::<io::Result<Vec<Vec<u8>>>>()?
+            ),
+        };
+        content_rules_analyses.push(
+            ContentRuleAnalysis {
+                required_prefixes,
+                max_match_length: cache_reader.read_u64()? as usize,
+            }
+        );
+    }
+
+    let number_of_entropy_rules = cache_reader.read_u64()? as usize;
+    for _ in 0..number_of_entropy_rules {
+        ruleset.entropy_rules.push(
+            EntropyRuleDefinition {
+                name: cache_reader.read_string()?,
+                charset: cache_reader.read_string()?,
+                threshold: f64::from_bits(cache_reader.read_u64()?),
+                min_length: cache_reader.read_u64()? as usize,
+                whitelist_patterns: cache_reader.read_strings()?,
+                blacklist_patterns: cache_reader.read_strings()?,
+            }
+        );
+    }
+
+    let number_of_file_path_rules = cache_reader.read_u64()? as usize;
+    for _ in 0..number_of_file_path_rules {
+        ruleset.file_path_rules.push(
+            FilePathRuleDefinition {
+                name: cache_reader.read_string()?,
+                pattern: cache_reader.read_string()?,
+            }
+        );
+    }
+
+    Ok(Some((ruleset, content_rules_analyses)))
+}
+
+/// Writes a ruleset that was already validated and the analyses of its content rules to a cache file,
+/// so loading it again skips parsing the rules file and analyzing the regexes. The compiled regexes
+/// themselves can not be serialized, so they are compiled again on every load.
+pub fn save_cache(
+    cache_path: &Path,
+    ruleset_hash: u64,
+    ruleset: &Ruleset,
+    content_rules_analyses: &[&ContentRuleAnalysis],
+) -> io::Result<()> {
+    let mut cache = Vec::new();
+    cache.extend_from_slice(RULES_CACHE_MAGIC);
+    cache.extend_from_slice(&ruleset_hash.to_le_bytes());
+    write_strings(&mut cache, &ruleset.file_extensions_to_skip);
+    write_strings(&mut cache, &ruleset.file_paths_to_skip);
+    write_strings(&mut cache, &ruleset.file_globs_to_skip);
+    write_strings(&mut cache, &ruleset.file_globs_to_include);
+
+    cache.extend_from_slice(&(ruleset.content_rules.len() as u64).to_le_bytes());
+    for (content_rule, content_rule_analysis) in ruleset.content_rules.iter().zip(content_rules_analyses) {
+        write_bytes(&mut cache, content_rule.name.as_bytes());
+        write_bytes(&mut cache, content_rule.pattern.as_bytes());
+        write_strings(&mut cache, &content_rule.whitelist_patterns);
+        write_strings(&mut cache, &content_rule.blacklist_patterns);
+
+        let required_prefixes = content_rule_analysis.required_prefixes.as_deref().unwrap_or_default();
+        cache.extend_from_slice(&(required_prefixes.len() as u64).to_le_bytes());
+        for required_prefix in required_prefixes {
+            write_bytes(&mut cache, required_prefix);
+        }
+        cache.extend_from_slice(&(content_rule_analysis.max_match_length as u64).to_le_bytes());
+    }
+
+    cache.extend_from_slice(&(ruleset.entropy_rules.len() as u64).to_le_bytes());
+    for entropy_rule in ruleset.entropy_rules.iter() {
+        write_bytes(&mut cache, entropy_rule.name.as_bytes());
+        write_bytes(&mut cache, entropy_rule.charset.as_bytes());
+        cache.extend_from_slice(&entropy_rule.threshold.to_bits().to_le_bytes());
+        cache.extend_from_slice(&(entropy_rule.min_length as u64).to_le_bytes());
+        write_strings(&mut cache, &entropy_rule.whitelist_patterns);
+        write_strings(&mut cache, &entropy_rule.blacklist_patterns);
+    }
+
+    cache.extend_from_slice(&(ruleset.file_path_rules.len() as u64).to_le_bytes());
+    for file_path_rule in ruleset.file_path_rules.iter() {
+        write_bytes(&mut cache, file_path_rule.name.as_bytes());
+        write_bytes(&mut cache, file_path_rule.pattern.as_bytes());
+    }
+
+    // Concurrent processes might write the same cache, so each of them writes its own temporary file
+    let mut temporary_cache_path = cache_path.as_os_str().to_owned();
+    temporary_cache_path.push(format!(".{}.tmp", std::process::id()));
+    let mut temporary_cache_file = fs::File::create(&temporary_cache_path)?;
+    temporary_cache_file.write_all(&cache)?;
+    temporary_cache_file.sync_all()?;
+
+    fs::rename(&temporary_cache_path, cache_path)
+}
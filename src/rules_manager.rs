@@ -1,29 +1,510 @@
-use std::path::Path;
 use std::collections::{HashMap, HashSet};
+use std::fs;
+use std::path::Path;
+use std::sync::OnceLock;
+use std::thread;
+use std::time::Instant;
 use regex::Regex;
+use regex::bytes;
+use regex_syntax::hir::{Class, Hir, HirKind, Literal, RepetitionKind, RepetitionRange};
+use regex_syntax::hir::literal::Literals;
+use pyo3::buffer::PyBuffer;
 use pyo3::prelude::*;
 use pyo3::exceptions::PyRuntimeError;
-use aho_corasick::AhoCorasick;
+use aho_corasick::{AhoCorasick, AhoCorasickBuilder};
+use crate::globs;
+use crate::rules_loader::{self, ContentRuleDefinition, Ruleset};
+use crate::scan_stats::ScanStats;
+use crate::verdict_cache::{self, VerdictCache};
+use crossbeam_utils::thread as crossbeam_thread;
+
+const MIN_PREFILTER_LITERAL_LENGTH: usize = 3;
+const UTF16_BOM_SIZE: usize = 2;
+const MAX_UNBOUNDED_MATCH_LENGTH: usize = 64 * 1024;
+const MIN_CONTENT_RULES_PER_THREAD: usize = 8;
+const MAX_ENTROPY_TOKEN_LENGTH: usize = 256;
+const MAX_ENTROPY_RULES: usize = 64;
+const BASE64_CHARSET: &str = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/=";
+const BASE64URL_CHARSET: &str = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_=";
+const HEX_CHARSET: &str = "0123456789abcdefABCDEF";
+const ALPHANUMERIC_CHARSET: &str = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789";
+
+/// The whitelist and the blacklist patterns of a rule combined into a single set, blacklist patterns
+/// first, so the verdict of a match text is decided by a single pass over it
+#[derive(Clone)]
+struct RuleFilter {
+    regex_set: Option<bytes::RegexSet>,
+    number_of_blacklist_patterns: usize,
+    has_whitelist_patterns: bool,
+}
+
+impl RuleFilter {
+    /// Whether a match text passes the filter. It must not match any of the blacklist patterns, and must
+    /// match one of the whitelist patterns if there are any.
+    fn is_allowed(
+        &self,
+        match_text: &[u8],
+    ) -> bool {
+        let regex_set = match &self.regex_set {
+            Some(regex_set) => regex_set,
+            None => return true,
+        };
+
+        // The indices of the set matches are ascending, so a blacklist match comes first
+        match regex_set.matches(match_text).iter().next() {
+            Some(pattern_index) => pattern_index >= self.number_of_blacklist_patterns,
+            None => !self.has_whitelist_patterns,
+        }
+    }
+
+    fn blacklist_patterns(
+        &self,
+    ) -> &[String] {
+        match &self.regex_set {
+            Some(regex_set) => &regex_set.patterns()[..self.number_of_blacklist_patterns],
+            None => &[],
+        }
+    }
 
+    fn whitelist_patterns(
+        &self,
+    ) -> &[String] {
+        match &self.regex_set {
+            Some(regex_set) => &regex_set.patterns()[self.number_of_blacklist_patterns..],
+            None => &[],
+        }
+    }
+}
+
+/// Content rules match raw bytes, so contents are scanned in place without being validated as UTF-8
+#[derive(Clone)]
 struct ContentRule {
     name: String,
-    regex: Regex,
-    whitelist_regexes: Vec<Regex>,
-    blacklist_regexes: Vec<Regex>,
+    regex: bytes::Regex,
+    filter: RuleFilter,
+    analysis: OnceLock<ContentRuleAnalysis>,
+}
+
+/// What the prefilter and the streaming scans need to know about the regex of a content rule. It is
+/// computed once per rule, and can be stored in a rules cache so it is not computed again.
+#[derive(Clone)]
+pub struct ContentRuleAnalysis {
+    pub required_prefixes: Option<Vec<Vec<u8>>>,
+    pub max_match_length: usize,
 }
 
+impl ContentRule {
+    fn analysis(
+        &self,
+    ) -> &ContentRuleAnalysis {
+        self.analysis.get_or_init(
+            || match regex_syntax::Parser::new().parse(self.regex.as_str()) {
+                Ok(hir) => ContentRuleAnalysis {
+                    required_prefixes: extract_required_prefixes(&hir),
+                    max_match_length: get_max_match_length(&hir).map_or(
+                        MAX_UNBOUNDED_MATCH_LENGTH,
+                        |max_match_length| max_match_length.min(MAX_UNBOUNDED_MATCH_LENGTH),
+                    ),
+                },
+                Err(_) => ContentRuleAnalysis {
+                    required_prefixes: None,
+                    max_match_length: MAX_UNBOUNDED_MATCH_LENGTH,
+                },
+            }
+        )
+    }
+}
+
+#[derive(Clone)]
 struct FilePathRule {
     name: String,
     regex: Regex,
 }
 
+/// Entropy rules match tokens, runs of the characters of a charset, whose Shannon entropy is at least
+/// a threshold, such as random keys that no regex can describe without matching everything else too
+#[derive(Clone)]
+struct EntropyRule {
+    name: String,
+    charset: String,
+    threshold: f64,
+    min_length: usize,
+    filter: RuleFilter,
+}
+
+/// The charset of one of the named charsets, or the characters of the charset itself
+fn entropy_rule_charset(
+    charset: &str,
+) -> &str {
+    match charset {
+        "base64" => BASE64_CHARSET,
+        "base64url" => BASE64URL_CHARSET,
+        "hex" => HEX_CHARSET,
+        "alphanumeric" => ALPHANUMERIC_CHARSET,
+        _ => charset,
+    }
+}
+
+/// `count * log2(count)` for every count a byte can have within a token, so the entropy of a token is
+/// computed without a logarithm per byte value
+fn entropy_terms() -> &'static [f64; MAX_ENTROPY_TOKEN_LENGTH + 1] {
+    static ENTROPY_TERMS: OnceLock<[f64; MAX_ENTROPY_TOKEN_LENGTH + 1]> = OnceLock::new();
+
+    ENTROPY_TERMS.get_or_init(
+        || {
+            let mut entropy_terms = [0.0; MAX_ENTROPY_TOKEN_LENGTH + 1];
+            for (count, entropy_term) in entropy_terms.iter_mut().enumerate().skip(1) {
+                *entropy_term = count as f64 * (count as f64).log2();
+            }
+
+            entropy_terms
+        }
+    )
+}
+
+/// The Shannon entropy of a token in bits per character. Tokens are at most MAX_ENTROPY_TOKEN_LENGTH
+/// bytes long, so every count fits a u16 and has a precomputed term.
+fn shannon_entropy(
+    token: &[u8],
+) -> f64 {
+    let mut counts = [0u16; 256];
+    for byte in token {
+        counts[*byte as usize] += 1;
+    }
+
+    let entropy_terms = entropy_terms();
+    let entropy_terms_sum: f64 = counts.iter().map(|count| entropy_terms[*count as usize]).sum();
+    let token_length = token.len() as f64;
+
+    token_length.log2() - entropy_terms_sum / token_length
+}
+
+/// Finds the content rules that can possibly match a content in a single pass, so only them would run
+/// their full regex. Rules whose matches must start with one of a few literals, such as `AKIA` or
+/// `-----BEGIN`, are found by one Aho-Corasick automaton of all these literals. The rest of the rules
+/// are found by a RegexSet of their patterns.
+#[derive(Clone)]
+struct ContentRulesPrefilter {
+    number_of_rules: usize,
+    literals_automaton: Option<AhoCorasick>,
+    literals_rules_indices: Vec<Vec<usize>>,
+    number_of_literal_rules: usize,
+    regex_set: Option<bytes::RegexSet>,
+    regex_set_rules_indices: Vec<usize>,
+    always_candidate_rules_indices: Vec<usize>,
+}
+
+fn extract_required_prefixes(
+    hir: &Hir,
+) -> Option<Vec<Vec<u8>>> {
+    let prefixes = Literals::prefixes(hir);
+    if prefixes.literals().is_empty() || prefixes.min_len() < MIN_PREFILTER_LITERAL_LENGTH {
+        return None;
+    }
+
+    Some(
+        prefixes.literals().iter().map(
+            |prefix| prefix.to_vec()
+        ).collect()
+    )
+}
+
+/// The length in bytes of the longest match of a regex, or None if its matches are unbounded
+fn get_max_match_length(
+    hir: &Hir,
+) -> Option<usize> {
+    match hir.kind() {
+        HirKind::Empty | HirKind::Anchor(_) | HirKind::WordBoundary(_) => Some(0),
+        HirKind::Literal(Literal::Unicode(character)) => Some(character.len_utf8()),
+        HirKind::Literal(Literal::Byte(_)) => Some(1),
+        HirKind::Class(Class::Unicode(class)) => Some(
+            class.ranges().last().map_or(0, |range| range.end().len_utf8())
+        ),
+        HirKind::Class(Class::Bytes(_)) => Some(1),
+        HirKind::Repetition(repetition) => {
+            let max_repetitions = match &repetition.kind {
+                RepetitionKind::ZeroOrOne => 1,
+                RepetitionKind::Range(RepetitionRange::Exactly(max_repetitions)) => *max_repetitions,
+                RepetitionKind::Range(RepetitionRange::Bounded(_, max_repetitions)) => *max_repetitions,
+                _ => return None,
+            };
+
+            get_max_match_length(&repetition.hir)?.checked_mul(max_repetitions as usize)
+        },
+        HirKind::Group(group) => get_max_match_length(&group.hir),
+        HirKind::Concat(hirs) => hirs.iter().try_fold(
+            0usize,
+            |max_match_length, hir| max_match_length.checked_add(get_max_match_length(hir)?),
+        ),
+        HirKind::Alternation(hirs) => hirs.iter().try_fold(
+            0usize,
+            |max_match_length, hir| Some(max_match_length.max(get_max_match_length(hir)?)),
+        ),
+    }
+}
+
+impl ContentRulesPrefilter {
+    fn new(
+        content_rules: &[ContentRule],
+    ) -> Self {
+        let mut literals_indices = HashMap::<Vec<u8>, usize>::new();
+        let mut literals = Vec::new();
+        let mut literals_rules_indices: Vec<Vec<usize>> = Vec::new();
+        let mut number_of_literal_rules = 0;
+        let mut regex_set_rules_indices = Vec::new();
+
+        for (rule_index, content_rule) in content_rules.iter().enumerate() {
+            match &content_rule.analysis().required_prefixes {
+                Some(prefixes) => {
+                    number_of_literal_rules += 1;
+                    for prefix in prefixes {
+                        let literal_index = *literals_indices.entry(prefix.clone()).or_insert_with(
+                            || {
+                                literals.push(prefix.clone());
+                                literals_rules_indices.push(Vec::new());
+
+                                literals.len() - 1
+                            }
+                        );
+                        if !literals_rules_indices[literal_index].contains(&rule_index) {
+                            literals_rules_indices[literal_index].push(rule_index);
+                        }
+                    }
+                },
+                None => regex_set_rules_indices.push(rule_index),
+            }
+        }
+
+        let literals_automaton = if literals.is_empty() {
+            None
+        } else {
+            Some(AhoCorasick::new_auto_configured(&literals))
+        };
+
+        // A set of a single regex would only scan the content twice
+        let mut always_candidate_rules_indices = Vec::new();
+        let regex_set = if regex_set_rules_indices.len() > 1 {
+            bytes::RegexSet::new(
+                regex_set_rules_indices.iter().map(
+                    |rule_index| content_rules[*rule_index].regex.as_str()
+                )
+            ).ok()
+        } else {
+            None
+        };
+        if regex_set.is_none() {
+            always_candidate_rules_indices.append(&mut regex_set_rules_indices);
+        }
+
+        ContentRulesPrefilter {
+            number_of_rules: content_rules.len(),
+            literals_automaton,
+            literals_rules_indices,
+            number_of_literal_rules,
+            regex_set,
+            regex_set_rules_indices,
+            always_candidate_rules_indices,
+        }
+    }
+
+    fn candidate_rules(
+        &self,
+        content: &[u8],
+    ) -> Vec<bool> {
+        let mut candidate_rules = vec![false; self.number_of_rules];
+
+        if let Some(literals_automaton) = &self.literals_automaton {
+            let mut remaining_literal_rules = self.number_of_literal_rules;
+            for literal_match in literals_automaton.find_overlapping_iter(content) {
+                for rule_index in self.literals_rules_indices[literal_match.pattern()].iter() {
+                    if !candidate_rules[*rule_index] {
+                        candidate_rules[*rule_index] = true;
+                        remaining_literal_rules -= 1;
+                    }
+                }
+                if remaining_literal_rules == 0 {
+                    break;
+                }
+            }
+        }
+
+        if let Some(regex_set) = &self.regex_set {
+            for regex_set_index in regex_set.matches(content).into_iter() {
+                candidate_rules[self.regex_set_rules_indices[regex_set_index]] = true;
+            }
+        }
+
+        for rule_index in self.always_candidate_rules_indices.iter() {
+            candidate_rules[*rule_index] = true;
+        }
+
+        candidate_rules
+    }
+}
+
+/// The location of a content match. offset and length are in bytes, line_number and column start
+/// from 1 and column is counted in characters.
+#[derive(Clone)]
+pub struct MatchPosition {
+    pub offset: usize,
+    pub length: usize,
+    pub line_number: usize,
+    pub column: usize,
+}
+
+/// A single match of a rule. File path matches have no position, and context holds the content
+/// surrounding a content match only when it was requested
+#[derive(Clone)]
+pub struct ScanMatch {
+    pub rule_name: String,
+    pub match_text: String,
+    pub position: Option<MatchPosition>,
+    pub context: Option<String>,
+}
+
+/// The offsets of the lines of a content, to translate byte offsets to lines and columns
+pub struct LineIndex {
+    line_starts: Vec<usize>,
+}
+
+impl LineIndex {
+    pub fn new(
+        content: &[u8],
+    ) -> Self {
+        let mut line_starts = vec![0];
+        line_starts.extend(
+            content.iter().enumerate().filter(
+                |(_, byte)| **byte == b'\n'
+            ).map(
+                |(index, _)| index + 1
+            )
+        );
+
+        LineIndex {
+            line_starts,
+        }
+    }
+
+    pub fn line_start(
+        &self,
+        line_number: usize,
+    ) -> Option<usize> {
+        self.line_starts.get(line_number.checked_sub(1)?).copied()
+    }
+
+    pub fn position(
+        &self,
+        content: &[u8],
+        offset: usize,
+        length: usize,
+    ) -> MatchPosition {
+        let line_index = self.line_starts.partition_point(|line_start| *line_start <= offset) - 1;
+        let line_prefix = &content[self.line_starts[line_index]..offset];
+        let line_prefix_length = match std::str::from_utf8(line_prefix) {
+            Ok(line_prefix) => line_prefix.chars().count(),
+            Err(_) => line_prefix.len(),
+        };
+
+        MatchPosition {
+            offset,
+            length,
+            line_number: line_index + 1,
+            column: line_prefix_length + 1,
+        }
+    }
+}
+
+/// Decodes a text as UTF-8, or as Latin-1 when it is not a valid UTF-8, so none of its bytes is lost
+pub fn decode_text(
+    text: &[u8],
+) -> String {
+    match std::str::from_utf8(text) {
+        Ok(text) => text.to_string(),
+        Err(_) => text.iter().map(|byte| *byte as char).collect(),
+    }
+}
+
+/// Decodes a UTF-16 content, which is recognized by its byte order mark. Other contents, either
+/// UTF-8 or Latin-1, are scanned as they are and are not decoded.
+pub fn decode_utf16(
+    content: &[u8],
+) -> Option<String> {
+    let decode_code_unit: fn([u8; 2]) -> u16 = match content.get(..UTF16_BOM_SIZE)? {
+        [0xff, 0xfe] => u16::from_le_bytes,
+        [0xfe, 0xff] => u16::from_be_bytes,
+        _ => return None,
+    };
+
+    Some(
+        char::decode_utf16(
+            content[UTF16_BOM_SIZE..].chunks_exact(2).map(
+                |code_unit| decode_code_unit([code_unit[0], code_unit[1]])
+            )
+        ).map(
+            |character| character.unwrap_or(char::REPLACEMENT_CHARACTER)
+        ).collect()
+    )
+}
+
+/// Translates the positions of the matches within a decoded UTF-16 content to their byte offsets and
+/// lengths within the original content. Their lines and columns stay the same. The offsets are sorted
+/// and translated in a single pass over the decoded content, however many matches there are.
+pub fn translate_utf16_positions(
+    decoded_content: &str,
+    scan_matches: &mut [ScanMatch],
+) {
+    let mut offsets = Vec::with_capacity(scan_matches.len() * 2);
+    for (match_index, scan_match) in scan_matches.iter().enumerate() {
+        if let Some(position) = &scan_match.position {
+            offsets.push((position.offset, match_index * 2));
+            offsets.push((position.offset + position.length, match_index * 2 + 1));
+        }
+    }
+    offsets.sort_unstable();
+
+    let mut utf16_offsets = vec![0; scan_matches.len() * 2];
+    let mut characters = decoded_content.chars();
+    let mut decoded_offset = 0;
+    let mut number_of_code_units = 0;
+    for (offset, utf16_offset_index) in offsets {
+        while decoded_offset < offset {
+            let character = match characters.next() {
+                Some(character) => character,
+                None => break,
+            };
+            decoded_offset += character.len_utf8();
+            number_of_code_units += character.len_utf16();
+        }
+        utf16_offsets[utf16_offset_index] = UTF16_BOM_SIZE + number_of_code_units * 2;
+    }
+
+    for (match_index, scan_match) in scan_matches.iter_mut().enumerate() {
+        if let Some(position) = &mut scan_match.position {
+            position.offset = utf16_offsets[match_index * 2];
+            position.length = utf16_offsets[match_index * 2 + 1] - position.offset;
+        }
+    }
+}
+
 #[pyclass]
+#[derive(Clone)]
 pub struct RulesManager {
     file_extensions_to_skip: HashSet<String>,
+    file_extensions_to_skip_regex: OnceLock<Option<bytes::Regex>>,
     file_paths_to_skip: Vec<String>,
-    file_paths_to_skip_ac: Option<AhoCorasick>,
+    file_paths_to_skip_ac: OnceLock<Option<AhoCorasick>>,
+    file_globs_to_skip: Vec<String>,
+    file_globs_to_skip_regex_set: OnceLock<Option<bytes::RegexSet>>,
+    file_globs_to_skip_pathspecs: Vec<String>,
+    file_globs_to_include: Vec<String>,
+    file_globs_to_include_regex_set: OnceLock<Option<bytes::RegexSet>>,
     content_rules: Vec<ContentRule>,
+    content_rules_prefilter: OnceLock<ContentRulesPrefilter>,
+    content_rules_max_match_length: OnceLock<usize>,
+    entropy_rules: Vec<EntropyRule>,
+    entropy_rules_byte_masks: [u64; 256],
     file_path_rules: Vec<FilePathRule>,
+    verdict_cache: VerdictCache,
 }
 
 impl Default for RulesManager {
@@ -38,10 +519,21 @@ impl RulesManager {
     pub fn new() -> Self {
         RulesManager {
             file_extensions_to_skip: HashSet::default(),
+            file_extensions_to_skip_regex: OnceLock::new(),
             file_paths_to_skip: Vec::default(),
-            file_paths_to_skip_ac: None,
+            file_paths_to_skip_ac: OnceLock::new(),
+            file_globs_to_skip: Vec::default(),
+            file_globs_to_skip_regex_set: OnceLock::new(),
+            file_globs_to_skip_pathspecs: Vec::default(),
+            file_globs_to_include: Vec::default(),
+            file_globs_to_include_regex_set: OnceLock::new(),
             content_rules: Vec::default(),
+            content_rules_prefilter: OnceLock::new(),
+            content_rules_max_match_length: OnceLock::new(),
+            entropy_rules: Vec::default(),
+            entropy_rules_byte_masks: [0; 256],
             file_path_rules: Vec::default(),
+            verdict_cache: VerdictCache::new(verdict_cache::DEFAULT_VERDICT_CACHE_SIZE),
         }
     }
 
@@ -52,108 +544,48 @@ impl RulesManager {
         whitelist_patterns: Vec<String>,
         blacklist_patterns: Vec<String>,
     ) -> PyResult<()> {
-        if name.is_empty() || pattern.is_empty() {
-            return Err(
-                PyRuntimeError::new_err("Rule name and pattern can not be empty")
-            )
-        }
-
-        let regex = match Regex::new(&pattern) {
-            Ok(regex) => regex,
-            Err(error) => {
-                return Err(
-                    PyRuntimeError::new_err(
-                        format!("Invalid regex pattern: {error}")
-                    )
-                )
-            },
-        };
-        if regex.captures_len() != 2 {
-            return Err(
-                PyRuntimeError::new_err(
-                    format!("Matching regex pattern must have exactly one capturing group: {pattern}")
-                )
-            );
-        }
-
-        let mut whitelist_regexes = Vec::new();
-        for whitelist_pattern in whitelist_patterns.iter() {
-            let whitelist_regex = match Regex::new(whitelist_pattern) {
-                Ok(whitelist_regex) => whitelist_regex,
-                Err(error) => {
-                    return Err(
-                        PyRuntimeError::new_err(
-                            format!("Invalid whitelist regex pattern: {error}")
-                        )
-                    )
-                },
-            };
-            if whitelist_regex.captures_len() != 1 {
-                return Err(
-                    PyRuntimeError::new_err(
-                        format!("Whitelist regex pattern must not have a capturing group: {whitelist_pattern}")
-                    )
-                );
-            }
-            whitelist_regexes.push(whitelist_regex);
-        }
-
-        let mut blacklist_regexes = Vec::new();
-        for blacklist_pattern in blacklist_patterns.iter() {
-            let blacklist_regex = match Regex::new(blacklist_pattern) {
-                Ok(blacklist_regex) => blacklist_regex,
-                Err(error) => {
-                    return Err(
-                        PyRuntimeError::new_err(
-                            format!("Invalid blacklist regex pattern: {error}")
-                        )
-                    )
-                },
-            };
-            if blacklist_regex.captures_len() != 1 {
-                return Err(
-                    PyRuntimeError::new_err(
-                        format!("Blacklist regex pattern must not have a capturing group: {blacklist_pattern}")
-                    )
-                );
-            }
-            blacklist_regexes.push(blacklist_regex);
-        }
-
-        let content_rule = ContentRule {
-            name,
-            regex,
-            whitelist_regexes,
-            blacklist_regexes,
-        };
+        let content_rule = Self::compile_content_rule(name, pattern, &whitelist_patterns, &blacklist_patterns)?;
         self.content_rules.push(content_rule);
+        self.content_rules_prefilter = OnceLock::new();
+        self.content_rules_max_match_length = OnceLock::new();
+        self.verdict_cache = VerdictCache::new(verdict_cache::DEFAULT_VERDICT_CACHE_SIZE);
 
         Ok(())
     }
 
-    pub fn add_file_path_rule(
+    pub fn add_entropy_rule(
         &mut self,
         name: String,
-        pattern: String,
+        charset: String,
+        threshold: f64,
+        min_length: usize,
+        whitelist_patterns: Vec<String>,
+        blacklist_patterns: Vec<String>,
     ) -> PyResult<()> {
-        if name.is_empty() || pattern.is_empty() {
+        let entropy_rule = Self::compile_entropy_rule(
+            name,
+            charset,
+            threshold,
+            min_length,
+            &whitelist_patterns,
+            &blacklist_patterns,
+        )?;
+        if self.entropy_rules.len() >= MAX_ENTROPY_RULES {
             return Err(
-                PyRuntimeError::new_err("Rule name and pattern can not be empty")
+                PyRuntimeError::new_err(format!("Can not add more than {MAX_ENTROPY_RULES} entropy rules"))
             )
         }
+        self.push_entropy_rule(entropy_rule);
 
-        let regex = match Regex::new(&pattern) {
-            Ok(regex) => regex,
-            Err(error) => {
-                return Err(
-                    PyRuntimeError::new_err(
-                        format!("Invalid regex pattern: {error}")
-                    )
-                )
-            }
-        };
+        Ok(())
+    }
 
-        let file_path_rule = FilePathRule { name, regex };
+    pub fn add_file_path_rule(
+        &mut self,
+        name: String,
+        pattern: String,
+    ) -> PyResult<()> {
+        let file_path_rule = Self::compile_file_path_rule(name, pattern)?;
         self.file_path_rules.push(file_path_rule);
 
         Ok(())
@@ -163,12 +595,14 @@ impl RulesManager {
         &mut self,
         file_extension: String,
     ) -> PyResult<()> {
+        let file_extension = file_extension.trim_start_matches('.');
         if file_extension.is_empty() {
             return Err(
                 PyRuntimeError::new_err("File extension can not be empty")
             )
         }
         self.file_extensions_to_skip.insert(file_extension.to_ascii_lowercase());
+        self.file_extensions_to_skip_regex = OnceLock::new();
 
         Ok(())
     }
@@ -183,32 +617,54 @@ impl RulesManager {
             )
         }
         self.file_paths_to_skip.push(file_path.to_ascii_lowercase());
-        self.file_paths_to_skip_ac = Some(
-            AhoCorasick::new_auto_configured(
-                self.file_paths_to_skip.as_slice()
-            )
-        );
+        self.file_paths_to_skip_ac = OnceLock::new();
+
+        Ok(())
+    }
+
+    pub fn add_file_glob_to_skip(
+        &mut self,
+        glob: String,
+    ) -> PyResult<()> {
+        Self::validate_glob(&glob)?;
+        self.file_globs_to_skip_pathspecs.extend(globs::glob_to_skip_pathspecs(&glob));
+        self.file_globs_to_skip.push(glob);
+        self.file_globs_to_skip_regex_set = OnceLock::new();
+
+        Ok(())
+    }
+
+    pub fn add_file_glob_to_include(
+        &mut self,
+        glob: String,
+    ) -> PyResult<()> {
+        Self::validate_glob(&glob)?;
+        self.file_globs_to_include.push(glob);
+        self.file_globs_to_include_regex_set = OnceLock::new();
 
         Ok(())
     }
 
+    /// Loads all the rules and filters of a TOML or a YAML rules file at once. The content rules are
+    /// compiled in parallel and the automata of the filters are built only once. When cache_path is
+    /// set, the validated rules are cached there, and a cache of the same rules file is loaded instead
+    /// of parsing and analyzing the rules file again.
+    pub fn load_rules(
+        &mut self,
+        py: Python,
+        rules_path: &str,
+        cache_path: Option<&str>,
+    ) -> PyResult<()> {
+        py.allow_threads(
+            || self.load_rules_file(Path::new(rules_path), cache_path.map(Path::new))
+        )
+    }
+
     pub fn should_scan_file_path(
         &self,
         file_path: &str,
     ) -> bool {
-        if let Some(file_extension) = Path::new(file_path).extension() {
-            if self.file_extensions_to_skip.contains(file_extension.to_string_lossy().as_ref()) {
-                return false;
-            }
-        }
-
-        if let Some(file_paths_to_skip_patterns) = &self.file_paths_to_skip_ac {
-            if file_paths_to_skip_patterns.is_match(file_path) {
-                return false;
-            }
-        }
-
-        true
+        self.should_scan_file_path_bytes(file_path.as_bytes())
     }
 
     pub fn scan_file(
@@ -216,44 +672,38 @@ impl RulesManager {
         file_path: &str,
         content: Option<&str>,
     ) -> Option<Vec<HashMap<&str, String>>> {
-        let mut scan_matches = Vec::new();
-
-        for file_path_rule in self.file_path_rules.iter() {
-            if file_path_rule.regex.is_match(file_path) {
-                let mut scan_match = HashMap::<&str, String>::new();
-                scan_match.insert("rule_name", file_path_rule.name.clone());
-                scan_match.insert("match_text", file_path.to_string());
-                scan_matches.push(scan_match);
-            }
-        }
-
+        let mut scan_matches = self.scan_file_path(file_path);
         if let Some(content) = content {
-            for content_rule in self.content_rules.iter() {
-                for match_text in content_rule.regex.find_iter(content) {
-                    if content_rule.blacklist_regexes.iter().any(
-                        |blacklist_regex| blacklist_regex.is_match(match_text.as_str())
-                    ) {
-                        continue;
-                    }
-                    if !content_rule.whitelist_regexes.is_empty() && !content_rule.whitelist_regexes.iter().any(
-                        |whitelist_regex| whitelist_regex.is_match(match_text.as_str())
-                    ) {
-                        continue;
-                    }
-
-                    let mut scan_match = HashMap::<&str, String>::new();
-                    scan_match.insert("rule_name", content_rule.name.clone());
-                    scan_match.insert("match_text", match_text.as_str().to_string());
-                    scan_matches.push(scan_match);
-                }
-            }
+            scan_matches.extend(self.scan_content(content.as_bytes(), None));
         }
 
-        if scan_matches.is_empty() {
-            None
-        } else {
-            Some(scan_matches)
-        }
+        Self::scan_matches_hashmaps(scan_matches)
+    }
+
+    /// Same as scan_file, for a bytes-like content such as bytes, bytearray or memoryview. The content
+    /// buffer is scanned in place, without being decoded or copied, unless it is a UTF-16 content.
+    pub fn scan_bytes(
+        &self,
+        file_path: &str,
+        content: PyBuffer<u8>,
+    ) -> PyResult<Option<Vec<HashMap<&str, String>>>> {
+        if !content.is_c_contiguous() {
+            return Err(
+                PyRuntimeError::new_err("Content buffer must be contiguous")
+            );
+        }
+        // The buffer is held, and the GIL is not released, until the scan is done
+        let content = unsafe {
+            std::slice::from_raw_parts(content.buf_ptr() as *const u8, content.len_bytes())
+        };
+
+        let mut scan_matches = self.scan_file_path(file_path);
+        match decode_utf16(content) {
+            Some(decoded_content) => scan_matches.extend(self.scan_content(decoded_content.as_bytes(), None)),
+            None => scan_matches.extend(self.scan_content(content, None)),
+        }
+
+        Ok(Self::scan_matches_hashmaps(scan_matches))
     }
 
     pub fn check_pattern(
@@ -287,3 +737,795 @@ impl RulesManager {
         Ok(matches)
     }
 }
+
+impl RulesManager {
+    fn compile_content_rule(
+        name: String,
+        pattern: String,
+        whitelist_patterns: &[String],
+        blacklist_patterns: &[String],
+    ) -> PyResult<ContentRule> {
+        if name.is_empty() || pattern.is_empty() {
+            return Err(
+                PyRuntimeError::new_err("Rule name and pattern can not be empty")
+            )
+        }
+
+        let regex = match bytes::Regex::new(&pattern) {
+            Ok(regex) => regex,
+            Err(error) => {
+                return Err(
+                    PyRuntimeError::new_err(
+                        format!("Invalid regex pattern: {error}")
+                    )
+                )
+            },
+        };
+        if regex.captures_len() != 2 {
+            return Err(
+                PyRuntimeError::new_err(
+                    format!("Matching regex pattern must have exactly one capturing group: {pattern}")
+                )
+            );
+        }
+
+        let filter = Self::compile_rule_filter(whitelist_patterns, blacklist_patterns)?;
+
+        Ok(
+            ContentRule {
+                name,
+                regex,
+                filter,
+                analysis: OnceLock::new(),
+            }
+        )
+    }
+
+    /// Validates the whitelist or the blacklist patterns of a rule. filter_name is either "whitelist" or
+    /// "blacklist", and is used by the error messages.
+    fn validate_filter_patterns(
+        filter_patterns: &[String],
+        filter_name: &str,
+    ) -> PyResult<()> {
+        for filter_pattern in filter_patterns.iter() {
+            let filter_regex = match bytes::Regex::new(filter_pattern) {
+                Ok(filter_regex) => filter_regex,
+                Err(error) => {
+                    return Err(
+                        PyRuntimeError::new_err(
+                            format!("Invalid {filter_name} regex pattern: {error}")
+                        )
+                    )
+                },
+            };
+            if filter_regex.captures_len() != 1 {
+                let capitalized_filter_name = filter_name[..1].to_ascii_uppercase() + &filter_name[1..];
+
+                return Err(
+                    PyRuntimeError::new_err(
+                        format!("{capitalized_filter_name} regex pattern must not have a capturing group: {filter_pattern}")
+                    )
+                );
+            }
+        }
+
+        Ok(())
+    }
+
+    fn compile_rule_filter(
+        whitelist_patterns: &[String],
+        blacklist_patterns: &[String],
+    ) -> PyResult<RuleFilter> {
+        Self::validate_filter_patterns(whitelist_patterns, "whitelist")?;
+        Self::validate_filter_patterns(blacklist_patterns, "blacklist")?;
+
+        let regex_set = if whitelist_patterns.is_empty() && blacklist_patterns.is_empty() {
+            None
+        } else {
+            Some(
+                bytes::RegexSet::new(blacklist_patterns.iter().chain(whitelist_patterns.iter())).map_err(
+                    |error| PyRuntimeError::new_err(format!("Invalid filter regex patterns: {error}"))
+                )?
+            )
+        };
+
+        Ok(
+            RuleFilter {
+                regex_set,
+                number_of_blacklist_patterns: blacklist_patterns.len(),
+                has_whitelist_patterns: !whitelist_patterns.is_empty(),
+            }
+        )
+    }
+
+    fn compile_entropy_rule(
+        name: String,
+        charset: String,
+        threshold: f64,
+        min_length: usize,
+        whitelist_patterns: &[String],
+        blacklist_patterns: &[String],
+    ) -> PyResult<EntropyRule> {
+        if name.is_empty() || charset.is_empty() {
+            return Err(
+                PyRuntimeError::new_err("Rule name and charset can not be empty")
+            )
+        }
+        if !entropy_rule_charset(&charset).is_ascii() {
+            return Err(
+                PyRuntimeError::new_err(format!("Charset must only hold ASCII characters: {charset}"))
+            )
+        }
+        if !threshold.is_finite() || threshold <= 0.0 {
+            return Err(
+                PyRuntimeError::new_err(format!("Entropy threshold must be a positive number: {threshold}"))
+            )
+        }
+        if min_length < 2 || min_length > MAX_ENTROPY_TOKEN_LENGTH {
+            return Err(
+                PyRuntimeError::new_err(
+                    format!("Minimum token length must be between 2 and {MAX_ENTROPY_TOKEN_LENGTH}: {min_length}")
+                )
+            )
+        }
+
+        Ok(
+            EntropyRule {
+                name,
+                charset,
+                threshold,
+                min_length,
+                filter: Self::compile_rule_filter(whitelist_patterns, blacklist_patterns)?,
+            }
+        )
+    }
+
+    /// Adds an entropy rule along with its bit in the masks of the bytes of its charset
+    fn push_entropy_rule(
+        &mut self,
+        entropy_rule: EntropyRule,
+    ) {
+        let rule_bit = 1u64 << self.entropy_rules.len();
+        for byte in entropy_rule_charset(&entropy_rule.charset).bytes() {
+            self.entropy_rules_byte_masks[byte as usize] |= rule_bit;
+        }
+        self.entropy_rules.push(entropy_rule);
+        self.content_rules_max_match_length = OnceLock::new();
+        self.verdict_cache = VerdictCache::new(verdict_cache::DEFAULT_VERDICT_CACHE_SIZE);
+    }
+
+    fn compile_file_path_rule(
+        name: String,
+        pattern: String,
+    ) -> PyResult<FilePathRule> {
+        if name.is_empty() || pattern.is_empty() {
+            return Err(
+                PyRuntimeError::new_err("Rule name and pattern can not be empty")
+            )
+        }
+
+        let regex = match Regex::new(&pattern) {
+            Ok(regex) => regex,
+            Err(error) => {
+                return Err(
+                    PyRuntimeError::new_err(
+                        format!("Invalid regex pattern: {error}")
+                    )
+                )
+            }
+        };
+
+        Ok(FilePathRule { name, regex })
+    }
+
+    /// Compiles the content rules of a ruleset on multiple threads. Their analyses are either taken
+    /// from a rules cache or computed on the same threads, so the prefilter is built quickly later.
+    fn compile_content_rules(
+        content_rule_definitions: &[ContentRuleDefinition],
+        content_rules_analyses: &[ContentRuleAnalysis],
+    ) -> PyResult<Vec<ContentRule>> {
+        let number_of_threads = thread::available_parallelism().map_or(1, usize::from).min(
+            content_rule_definitions.len().div_ceil(MIN_CONTENT_RULES_PER_THREAD)
+        ).max(1);
+        let chunk_size = content_rule_definitions.len().div_ceil(number_of_threads).max(1);
+
+        let compile_chunk = |chunk_index: usize, chunk: &[ContentRuleDefinition]| -> PyResult<Vec<ContentRule>> {
+            let mut content_rules = Vec::with_capacity(chunk.len());
+            for (index, content_rule_definition) in chunk.iter().enumerate() {
+                let content_rule = Self::compile_content_rule(
+                    content_rule_definition.name.clone(),
+                    content_rule_definition.pattern.clone(),
+                    &content_rule_definition.whitelist_patterns,
+                    &content_rule_definition.blacklist_patterns,
+                )?;
+                match content_rules_analyses.get(chunk_index * chunk_size + index) {
+                    Some(content_rule_analysis) => {
+                        let _ = content_rule.analysis.set(content_rule_analysis.clone());
+                    },
+                    None => {
+                        content_rule.analysis();
+                    },
+                }
+                content_rules.push(content_rule);
+            }
+
+            Ok(content_rules)
+        };
+        let compile_chunk = &compile_chunk;
+
+        let compiled_chunks = crossbeam_thread::scope(
+            |scope| {
+                let compile_threads: Vec<_> = content_rule_definitions.chunks(chunk_size).enumerate().map(
+                    |(chunk_index, chunk)| scope.spawn(move |_| compile_chunk(chunk_index, chunk))
+                ).collect();
+
+                compile_threads.into_iter().map(
+                    |compile_thread| compile_thread.join().unwrap_or_else(
+                        |_| Err(PyRuntimeError::new_err("Compiling the content rules has failed"))
+                    )
+                ).collect::<Vec<PyResult<Vec<ContentRule>>>>()
+            }
+        ).map_err(
+            |_| PyRuntimeError::new_err("Compiling the content rules has failed")
+        )?;
+
+        let mut content_rules = Vec::with_capacity(content_rule_definitions.len());
+        for compiled_chunk in compiled_chunks {
+            content_rules.extend(compiled_chunk?);
+        }
+
+        Ok(content_rules)
+    }
+
+    /// Adds all the rules and filters of a ruleset. Everything is validated before any of them is added,
+    /// so an invalid ruleset leaves the rules manager as it was.
+    fn add_ruleset(
+        &mut self,
+        ruleset: &Ruleset,
+        content_rules_analyses: &[ContentRuleAnalysis],
+    ) -> PyResult<()> {
+        let content_rules = Self::compile_content_rules(&ruleset.content_rules, content_rules_analyses)?;
+        let entropy_rules = ruleset.entropy_rules.iter().map(
+            |entropy_rule| Self::compile_entropy_rule(
+                entropy_rule.name.clone(),
+                entropy_rule.charset.clone(),
+                entropy_rule.threshold,
+                entropy_rule.min_length,
+                &entropy_rule.whitelist_patterns,
+                &entropy_rule.blacklist_patterns,
+            )
+        ).collect::<PyResult<Vec<EntropyRule>>>()?;
+        if self.entropy_rules.len() + entropy_rules.len() > MAX_ENTROPY_RULES {
+            return Err(
+                PyRuntimeError::new_err(format!("Can not add more than {MAX_ENTROPY_RULES} entropy rules"))
+            )
+        }
+        let file_path_rules = ruleset.file_path_rules.iter().map(
+            |file_path_rule| Self::compile_file_path_rule(file_path_rule.name.clone(), file_path_rule.pattern.clone())
+        ).collect::<PyResult<Vec<FilePathRule>>>()?;
+        if ruleset.file_extensions_to_skip.iter().any(|file_extension| file_extension.trim_start_matches('.').is_empty()) {
+            return Err(
+                PyRuntimeError::new_err("File extension can not be empty")
+            )
+        }
+        if ruleset.file_paths_to_skip.iter().any(String::is_empty) {
+            return Err(
+                PyRuntimeError::new_err("File path can not be empty")
+            )
+        }
+        for glob in ruleset.file_globs_to_skip.iter().chain(ruleset.file_globs_to_include.iter()) {
+            Self::validate_glob(glob)?;
+        }
+
+        self.content_rules.extend(content_rules);
+        self.content_rules_prefilter = OnceLock::new();
+        self.content_rules_max_match_length = OnceLock::new();
+        self.verdict_cache = VerdictCache::new(verdict_cache::DEFAULT_VERDICT_CACHE_SIZE);
+        for entropy_rule in entropy_rules {
+            self.push_entropy_rule(entropy_rule);
+        }
+        self.file_path_rules.extend(file_path_rules);
+        self.file_extensions_to_skip.extend(
+            ruleset.file_extensions_to_skip.iter().map(
+                |file_extension| file_extension.trim_start_matches('.').to_ascii_lowercase()
+            )
+        );
+        self.file_extensions_to_skip_regex = OnceLock::new();
+        self.file_paths_to_skip.extend(
+            ruleset.file_paths_to_skip.iter().map(|file_path| file_path.to_ascii_lowercase())
+        );
+        self.file_paths_to_skip_ac = OnceLock::new();
+        for glob in ruleset.file_globs_to_skip.iter() {
+            self.file_globs_to_skip_pathspecs.extend(globs::glob_to_skip_pathspecs(glob));
+        }
+        self.file_globs_to_skip.extend(ruleset.file_globs_to_skip.iter().cloned());
+        self.file_globs_to_skip_regex_set = OnceLock::new();
+        self.file_globs_to_include.extend(ruleset.file_globs_to_include.iter().cloned());
+        self.file_globs_to_include_regex_set = OnceLock::new();
+
+        Ok(())
+    }
+
+    fn load_rules_file(
+        &mut self,
+        rules_path: &Path,
+        cache_path: Option<&Path>,
+    ) -> PyResult<()> {
+        let rules_file_content = fs::read(rules_path).map_err(
+            |error| PyRuntimeError::new_err(format!("Could not read the rules file {}: {error}", rules_path.display()))
+        )?;
+        let ruleset_hash = rules_loader::ruleset_hash(&rules_file_content);
+
+        // A cache that can not be read is written again
+        let cached_ruleset = cache_path.and_then(
+            |cache_path| rules_loader::load_cache(cache_path, ruleset_hash).ok().flatten()
+        );
+        if let Some((ruleset, content_rules_analyses)) = cached_ruleset {
+            return self.add_ruleset(&ruleset, &content_rules_analyses);
+        }
+
+        let ruleset = Ruleset::parse(rules_path, &rules_file_content).map_err(PyRuntimeError::new_err)?;
+        let number_of_content_rules = self.content_rules.len();
+        self.add_ruleset(&ruleset, &[])?;
+
+        if let Some(cache_path) = cache_path {
+            let content_rules_analyses: Vec<&ContentRuleAnalysis> = self.content_rules[number_of_content_rules..].iter().map(
+                ContentRule::analysis
+            ).collect();
+            rules_loader::save_cache(cache_path, ruleset_hash, &ruleset, &content_rules_analyses).map_err(
+                |error| PyRuntimeError::new_err(format!("Could not write the rules cache file: {error}"))
+            )?;
+        }
+
+        Ok(())
+    }
+
+    fn validate_glob(
+        glob: &str,
+    ) -> PyResult<()> {
+        let pattern = globs::glob_to_regex_pattern(glob).map_err(
+            |error| PyRuntimeError::new_err(format!("Invalid glob pattern: {error}"))
+        )?;
+        bytes::Regex::new(&pattern).map_err(
+            |error| PyRuntimeError::new_err(format!("Invalid glob pattern: {error}"))
+        )?;
+
+        Ok(())
+    }
+
+    /// Compiles globs that were already validated into a single set, that every path is matched against once
+    fn compile_globs(
+        file_globs: &[String],
+    ) -> Option<bytes::RegexSet> {
+        if file_globs.is_empty() {
+            return None;
+        }
+
+        bytes::RegexSet::new(
+            file_globs.iter().filter_map(|glob| globs::glob_to_regex_pattern(glob).ok())
+        ).ok()
+    }
+
+    /// The file extensions to skip as a single regex that matches the end of a file name
+    fn compile_file_extensions_to_skip(
+        file_extensions_to_skip: &HashSet<String>,
+    ) -> Option<bytes::Regex> {
+        if file_extensions_to_skip.is_empty() {
+            return None;
+        }
+
+        let mut file_extensions_to_skip: Vec<&String> = file_extensions_to_skip.iter().collect();
+        file_extensions_to_skip.sort();
+        let mut pattern = String::from("(?is-u)[^/]\\.(?:");
+        for (index, file_extension) in file_extensions_to_skip.into_iter().enumerate() {
+            if index > 0 {
+                pattern.push('|');
+            }
+            globs::escape_bytes_into(file_extension, &mut pattern);
+        }
+        pattern.push_str(")$");
+
+        bytes::Regex::new(&pattern).ok()
+    }
+
+    /// Whether a file should be scanned by its path. The path is matched case insensitively as is,
+    /// without being lowercased or copied.
+    pub fn should_scan_file_path_bytes(
+        &self,
+        file_path: &[u8],
+    ) -> bool {
+        let file_globs_to_include_regex_set = self.file_globs_to_include_regex_set.get_or_init(
+            || Self::compile_globs(&self.file_globs_to_include)
+        );
+        if let Some(file_globs_to_include_regex_set) = file_globs_to_include_regex_set {
+            if !file_globs_to_include_regex_set.is_match(file_path) {
+                return false;
+            }
+        }
+
+        let file_extensions_to_skip_regex = self.file_extensions_to_skip_regex.get_or_init(
+            || Self::compile_file_extensions_to_skip(&self.file_extensions_to_skip)
+        );
+        if let Some(file_extensions_to_skip_regex) = file_extensions_to_skip_regex {
+            if file_extensions_to_skip_regex.is_match(file_path) {
+                return false;
+            }
+        }
+
+        self.should_walk_directory_path_bytes(file_path)
+    }
+
+    /// Whether a directory should be walked by its path. A directory that matches a path or a glob to
+    /// skip would have all of its files skipped, so it can be pruned as a whole.
+    pub fn should_walk_directory_path_bytes(
+        &self,
+        directory_path: &[u8],
+    ) -> bool {
+        let file_paths_to_skip_ac = self.file_paths_to_skip_ac.get_or_init(
+            || if self.file_paths_to_skip.is_empty() {
+                None
+            } else {
+                Some(
+                    AhoCorasickBuilder::new().ascii_case_insensitive(true).auto_configure(
+                        &self.file_paths_to_skip
+                    ).build(
+                        &self.file_paths_to_skip
+                    )
+                )
+            }
+        );
+        if let Some(file_paths_to_skip_ac) = file_paths_to_skip_ac {
+            if file_paths_to_skip_ac.is_match(directory_path) {
+                return false;
+            }
+        }
+
+        let file_globs_to_skip_regex_set = self.file_globs_to_skip_regex_set.get_or_init(
+            || Self::compile_globs(&self.file_globs_to_skip)
+        );
+        if let Some(file_globs_to_skip_regex_set) = file_globs_to_skip_regex_set {
+            if file_globs_to_skip_regex_set.is_match(directory_path) {
+                return false;
+            }
+        }
+
+        true
+    }
+
+    /// Negative pathspecs of the globs to skip, that libgit2 can apply while diffing the trees
+    pub fn skip_pathspecs(
+        &self,
+    ) -> &[String] {
+        &self.file_globs_to_skip_pathspecs
+    }
+
+    fn scan_matches_hashmaps(
+        scan_matches: Vec<ScanMatch>,
+    ) -> Option<Vec<HashMap<&'static str, String>>> {
+        if scan_matches.is_empty() {
+            None
+        } else {
+            Some(
+                scan_matches.into_iter().map(
+                    |scan_match| {
+                        let mut scan_match_hashmap = HashMap::<&str, String>::with_capacity(2);
+                        scan_match_hashmap.insert("rule_name", scan_match.rule_name);
+                        scan_match_hashmap.insert("match_text", scan_match.match_text);
+
+                        scan_match_hashmap
+                    }
+                ).collect()
+            )
+        }
+    }
+
+    pub fn has_content_rules(
+        &self,
+    ) -> bool {
+        !self.content_rules.is_empty() || !self.entropy_rules.is_empty()
+    }
+
+    /// The names of the content rules followed by the names of the entropy rules, in the order of their
+    /// entries in the rules statistics
+    pub fn content_rule_names(
+        &self,
+    ) -> Vec<&str> {
+        self.content_rules.iter().map(
+            |content_rule| content_rule.name.as_str()
+        ).chain(
+            self.entropy_rules.iter().map(|entropy_rule| entropy_rule.name.as_str())
+        ).collect()
+    }
+
+    /// The length in bytes of the longest possible match of the content rules. Rules whose matches are
+    /// unbounded, such as of patterns with `+` or `*`, are assumed to match up to 64KiB. Entropy rules
+    /// match tokens of up to 256 bytes.
+    pub fn max_match_length(
+        &self,
+    ) -> usize {
+        *self.content_rules_max_match_length.get_or_init(
+            || {
+                let max_match_length = self.content_rules.iter().map(
+                    |content_rule| content_rule.analysis().max_match_length
+                ).max().unwrap_or(0);
+
+                if self.entropy_rules.is_empty() {
+                    max_match_length
+                } else {
+                    max_match_length.max(MAX_ENTROPY_TOKEN_LENGTH)
+                }
+            }
+        )
+    }
+
+    /// A stable FNV-1a hash of the rules and of the files to skip. Used to invalidate persisted
+    /// scan states once the rules change.
+    pub fn fingerprint(
+        &self,
+    ) -> u64 {
+        let mut fingerprint: u64 = 0xcbf29ce484222325;
+        let mut update = |bytes: &[u8]| {
+            for byte in bytes.iter().chain(&[0xff]) {
+                fingerprint ^= *byte as u64;
+                fingerprint = fingerprint.wrapping_mul(0x100000001b3);
+            }
+        };
+
+        let mut file_extensions_to_skip: Vec<&String> = self.file_extensions_to_skip.iter().collect();
+        file_extensions_to_skip.sort();
+        for file_extension in file_extensions_to_skip {
+            update(file_extension.as_bytes());
+        }
+        update(b"file_paths_to_skip");
+        for file_path in self.file_paths_to_skip.iter() {
+            update(file_path.as_bytes());
+        }
+        update(b"file_globs_to_skip");
+        for glob in self.file_globs_to_skip.iter() {
+            update(glob.as_bytes());
+        }
+        update(b"file_globs_to_include");
+        for glob in self.file_globs_to_include.iter() {
+            update(glob.as_bytes());
+        }
+        update(b"content_rules");
+        for content_rule in self.content_rules.iter() {
+            update(content_rule.name.as_bytes());
+            update(content_rule.regex.as_str().as_bytes());
+            update(b"whitelist");
+            for whitelist_pattern in content_rule.filter.whitelist_patterns() {
+                update(whitelist_pattern.as_bytes());
+            }
+            update(b"blacklist");
+            for blacklist_pattern in content_rule.filter.blacklist_patterns() {
+                update(blacklist_pattern.as_bytes());
+            }
+        }
+        update(b"entropy_rules");
+        for entropy_rule in self.entropy_rules.iter() {
+            update(entropy_rule.name.as_bytes());
+            update(entropy_rule.charset.as_bytes());
+            update(&entropy_rule.threshold.to_le_bytes());
+            update(&(entropy_rule.min_length as u64).to_le_bytes());
+            update(b"whitelist");
+            for whitelist_pattern in entropy_rule.filter.whitelist_patterns() {
+                update(whitelist_pattern.as_bytes());
+            }
+            update(b"blacklist");
+            for blacklist_pattern in entropy_rule.filter.blacklist_patterns() {
+                update(blacklist_pattern.as_bytes());
+            }
+        }
+        update(b"file_path_rules");
+        for file_path_rule in self.file_path_rules.iter() {
+            update(file_path_rule.name.as_bytes());
+            update(file_path_rule.regex.as_str().as_bytes());
+        }
+
+        fingerprint
+    }
+
+    pub fn scan_file_path(
+        &self,
+        file_path: &str,
+    ) -> Vec<ScanMatch> {
+        let mut scan_matches = Vec::new();
+
+        for file_path_rule in self.file_path_rules.iter() {
+            if file_path_rule.regex.is_match(file_path) {
+                scan_matches.push(
+                    ScanMatch {
+                        rule_name: file_path_rule.name.clone(),
+                        match_text: file_path.to_string(),
+                        position: None,
+                        context: None,
+                    }
+                );
+            }
+        }
+
+        scan_matches
+    }
+
+    /// Scans a content with the content rules. When scan_stats is set, the hits and misses of the verdict
+    /// cache are counted, and when it is profiling, the time every rule took and the number of its
+    /// matches are added to its entry.
+    pub fn scan_content(
+        &self,
+        content: &[u8],
+        scan_stats: Option<&ScanStats>,
+    ) -> Vec<ScanMatch> {
+        let rules_stats = scan_stats.and_then(ScanStats::rules_stats);
+        let mut scan_matches = Vec::new();
+        let mut match_spans = Vec::new();
+        if !self.has_content_rules() {
+            return scan_matches;
+        }
+
+        let candidate_rules = self.content_rules_prefilter.get_or_init(
+            || ContentRulesPrefilter::new(&self.content_rules)
+        ).candidate_rules(content);
+
+        for (rule_index, (content_rule, is_candidate_rule)) in self.content_rules.iter().zip(candidate_rules).enumerate() {
+            if !is_candidate_rule {
+                continue;
+            }
+            let rule_timer = rules_stats.map(|_| Instant::now());
+            let number_of_matches = scan_matches.len();
+
+            for match_text in content_rule.regex.find_iter(content) {
+                if !self.is_match_allowed(rule_index, &content_rule.filter, match_text.as_bytes(), scan_stats) {
+                    continue;
+                }
+
+                scan_matches.push(
+                    ScanMatch {
+                        rule_name: content_rule.name.clone(),
+                        match_text: decode_text(match_text.as_bytes()),
+                        position: None,
+                        context: None,
+                    }
+                );
+                match_spans.push((match_text.start(), match_text.end() - match_text.start()));
+            }
+
+            if let (Some(rules_stats), Some(rule_timer)) = (rules_stats, rule_timer) {
+                rules_stats[rule_index].scan_time_ns.fetch_add(rule_timer.elapsed().as_nanos() as u64);
+                rules_stats[rule_index].matches.fetch_add((scan_matches.len() - number_of_matches) as u64);
+            }
+        }
+
+        if !self.entropy_rules.is_empty() {
+            let entropy_rules_timer = rules_stats.map(|_| Instant::now());
+            for (rule_index, token_start, token_end) in self.find_entropy_tokens(content, scan_stats) {
+                scan_matches.push(
+                    ScanMatch {
+                        rule_name: self.entropy_rules[rule_index].name.clone(),
+                        match_text: decode_text(&content[token_start..token_end]),
+                        position: None,
+                        context: None,
+                    }
+                );
+                match_spans.push((token_start, token_end - token_start));
+                if let Some(rules_stats) = rules_stats {
+                    rules_stats[self.content_rules.len() + rule_index].matches.fetch_add(1);
+                }
+            }
+
+            // All of the entropy rules are scanned in a single pass, so its time is split between them
+            if let (Some(rules_stats), Some(entropy_rules_timer)) = (rules_stats, entropy_rules_timer) {
+                let entropy_rule_scan_time_ns = entropy_rules_timer.elapsed().as_nanos() as u64 / self.entropy_rules.len() as u64;
+                for entropy_rule_stats in rules_stats[self.content_rules.len()..].iter() {
+                    entropy_rule_stats.scan_time_ns.fetch_add(entropy_rule_scan_time_ns);
+                }
+            }
+        }
+
+        // Most of the contents have no matches, so their lines are indexed only when needed
+        if !scan_matches.is_empty() {
+            let line_index = LineIndex::new(content);
+            for (scan_match, (match_offset, match_length)) in scan_matches.iter_mut().zip(match_spans) {
+                scan_match.position = Some(line_index.position(content, match_offset, match_length));
+            }
+        }
+
+        scan_matches
+    }
+
+    /// Finds the tokens of all of the entropy rules in a single pass over a content. Every byte has a mask
+    /// of the entropy rules whose charset holds it, so a token of a rule starts where the bit of the rule
+    /// turns on and ends where it turns off. Only the tokens that are long enough, have a high enough
+    /// entropy and pass the whitelist and the blacklist of their rule are returned. Longer tokens than
+    /// MAX_ENTROPY_TOKEN_LENGTH are encoded data rather than secrets, and are skipped.
+    fn find_entropy_tokens(
+        &self,
+        content: &[u8],
+        scan_stats: Option<&ScanStats>,
+    ) -> Vec<(usize, usize, usize)> {
+        let mut entropy_tokens = Vec::new();
+        let mut token_starts = [0usize; MAX_ENTROPY_RULES];
+        let mut active_rules_mask = 0u64;
+
+        for (offset, byte) in content.iter().enumerate() {
+            let byte_mask = self.entropy_rules_byte_masks[*byte as usize];
+            if byte_mask == active_rules_mask {
+                continue;
+            }
+
+            self.check_entropy_tokens(content, &token_starts, active_rules_mask & !byte_mask, offset, scan_stats, &mut entropy_tokens);
+            let mut started_rules_mask = byte_mask & !active_rules_mask;
+            while started_rules_mask != 0 {
+                token_starts[started_rules_mask.trailing_zeros() as usize] = offset;
+                started_rules_mask &= started_rules_mask - 1;
+            }
+            active_rules_mask = byte_mask;
+        }
+        self.check_entropy_tokens(content, &token_starts, active_rules_mask, content.len(), scan_stats, &mut entropy_tokens);
+
+        entropy_tokens
+    }
+
+    fn check_entropy_tokens(
+        &self,
+        content: &[u8],
+        token_starts: &[usize],
+        ended_rules_mask: u64,
+        token_end: usize,
+        scan_stats: Option<&ScanStats>,
+        entropy_tokens: &mut Vec<(usize, usize, usize)>,
+    ) {
+        let mut ended_rules_mask = ended_rules_mask;
+        while ended_rules_mask != 0 {
+            let rule_index = ended_rules_mask.trailing_zeros() as usize;
+            ended_rules_mask &= ended_rules_mask - 1;
+
+            let entropy_rule = &self.entropy_rules[rule_index];
+            let token = &content[token_starts[rule_index]..token_end];
+            if token.len() < entropy_rule.min_length || token.len() > MAX_ENTROPY_TOKEN_LENGTH {
+                continue;
+            }
+            if shannon_entropy(token) < entropy_rule.threshold {
+                continue;
+            }
+            if !self.is_match_allowed(self.content_rules.len() + rule_index, &entropy_rule.filter, token, scan_stats) {
+                continue;
+            }
+
+            entropy_tokens.push((rule_index, token_starts[rule_index], token_end));
+        }
+    }
+
+    /// Whether a match text passes the filter of its rule. rule_index is the index of the rule in the
+    /// rules statistics. Verdicts of short match texts are cached, since the same placeholders are
+    /// matched over and over, while long match texts are seldom matched twice.
+    fn is_match_allowed(
+        &self,
+        rule_index: usize,
+        rule_filter: &RuleFilter,
+        match_text: &[u8],
+        scan_stats: Option<&ScanStats>,
+    ) -> bool {
+        if rule_filter.regex_set.is_none() {
+            return true;
+        }
+        if match_text.len() > verdict_cache::MAX_VERDICT_CACHE_TEXT_LENGTH {
+            return rule_filter.is_allowed(match_text);
+        }
+
+        if let Some(verdict) = self.verdict_cache.get(rule_index, match_text) {
+            if let Some(scan_stats) = scan_stats {
+                scan_stats.verdict_cache_hits.fetch_add(1);
+            }
+
+            return verdict;
+        }
+        if let Some(scan_stats) = scan_stats {
+            scan_stats.verdict_cache_misses.fetch_add(1);
+        }
+
+        let verdict = rule_filter.is_allowed(match_text);
+        self.verdict_cache.insert(rule_index, match_text, verdict);
+
+        verdict
+    }
+}
@@ -0,0 +1,171 @@
+use git2::Oid;
+use parking_lot::Mutex;
+use std::collections::HashSet;
+use std::fs;
+use std::io::{self, Write};
+use std::path::Path;
+
+const STATE_FILE_MAGIC: &[u8; 8] = b"PRSSTAT1";
+const STATE_FILE_HEADER_SIZE: usize = 32;
+const OID_SIZE: usize = 20;
+
+/// The set of commits and blobs that were already scanned by previous scans of a repository.
+/// It is persisted as a compact binary file: a header holding the fingerprint of the rules and the
+/// scan options, and the number of entries, followed by the sorted raw commit OIDs and the sorted
+/// raw blob OIDs. A state that was written with different rules or scan options is ignored so
+/// everything would be rescanned.
+pub struct ScanState {
+    commit_oids: HashSet<Oid>,
+    blob_oids: HashSet<Oid>,
+    new_commit_oids: Mutex<Vec<Oid>>,
+    new_blob_oids: Mutex<Vec<Oid>>,
+}
+
+fn read_u64(
+    bytes: &[u8],
+    offset: usize,
+) -> u64 {
+    let mut value = [0u8; 8];
+    value.copy_from_slice(&bytes[offset..offset + 8]);
+
+    u64::from_le_bytes(value)
+}
+
+fn read_oids(
+    bytes: &[u8],
+) -> io::Result<HashSet<Oid>> {
+    let mut oids = HashSet::with_capacity(bytes.len() / OID_SIZE);
+    for raw_oid in bytes.chunks_exact(OID_SIZE) {
+        let oid = Oid::from_bytes(raw_oid).map_err(
+            |error| io::Error::new(io::ErrorKind::InvalidData, error.to_string())
+        )?;
+        oids.insert(oid);
+    }
+
+    Ok(oids)
+}
+
+fn sorted_oids(
+    oids: &HashSet<Oid>,
+    new_oids: &[Oid],
+) -> Vec<Oid> {
+    let mut sorted_oids: Vec<Oid> = oids.iter().chain(new_oids.iter()).copied().collect();
+    sorted_oids.sort_unstable();
+    sorted_oids.dedup();
+
+    sorted_oids
+}
+
+impl Default for ScanState {
+    fn default() -> Self {
+        Self::new()
+    }
+}
+
+impl ScanState {
+    pub fn new() -> Self {
+        ScanState {
+            commit_oids: HashSet::new(),
+            blob_oids: HashSet::new(),
+            new_commit_oids: Mutex::new(Vec::new()),
+            new_blob_oids: Mutex::new(Vec::new()),
+        }
+    }
+
+    pub fn load(
+        state_path: &Path,
+        scan_fingerprint: u64,
+    ) -> io::Result<Self> {
+        let bytes = match fs::read(state_path) {
+            Ok(bytes) => bytes,
+            Err(error) if error.kind() == io::ErrorKind::NotFound => return Ok(Self::new()),
+            Err(error) => return Err(error),
+        };
+
+        if bytes.len() < STATE_FILE_HEADER_SIZE || &bytes[0..8] != STATE_FILE_MAGIC {
+            return Err(
+                io::Error::new(
+                    io::ErrorKind::InvalidData,
+                    format!("Invalid scan state file: {}", state_path.display()),
+                )
+            );
+        }
+        if read_u64(&bytes, 8) != scan_fingerprint {
+            return Ok(Self::new());
+        }
+
+        let number_of_commits = read_u64(&bytes, 16) as usize;
+        let number_of_blobs = read_u64(&bytes, 24) as usize;
+        let commits_end = STATE_FILE_HEADER_SIZE + number_of_commits * OID_SIZE;
+        if bytes.len() != commits_end + number_of_blobs * OID_SIZE {
+            return Err(
+                io::Error::new(
+                    io::ErrorKind::InvalidData,
+                    format!("Truncated scan state file: {}", state_path.display()),
+                )
+            );
+        }
+
+        Ok(
+            ScanState {
+                commit_oids: read_oids(&bytes[STATE_FILE_HEADER_SIZE..commits_end])?,
+                blob_oids: read_oids(&bytes[commits_end..])?,
+                new_commit_oids: Mutex::new(Vec::new()),
+                new_blob_oids: Mutex::new(Vec::new()),
+            }
+        )
+    }
+
+    pub fn save(
+        &self,
+        state_path: &Path,
+        scan_fingerprint: u64,
+    ) -> io::Result<()> {
+        let commit_oids = sorted_oids(&self.commit_oids, &self.new_commit_oids.lock());
+        let blob_oids = sorted_oids(&self.blob_oids, &self.new_blob_oids.lock());
+
+        let mut bytes = Vec::with_capacity(
+            STATE_FILE_HEADER_SIZE + (commit_oids.len() + blob_oids.len()) * OID_SIZE
+        );
+        bytes.extend_from_slice(STATE_FILE_MAGIC);
+        bytes.extend_from_slice(&scan_fingerprint.to_le_bytes());
+        bytes.extend_from_slice(&(commit_oids.len() as u64).to_le_bytes());
+        bytes.extend_from_slice(&(blob_oids.len() as u64).to_le_bytes());
+        for oid in commit_oids.iter().chain(blob_oids.iter()) {
+            bytes.extend_from_slice(oid.as_bytes());
+        }
+
+        let mut temporary_state_path = state_path.as_os_str().to_owned();
+        temporary_state_path.push(".tmp");
+        let mut temporary_state_file = fs::File::create(&temporary_state_path)?;
+        temporary_state_file.write_all(&bytes)?;
+        temporary_state_file.sync_all()?;
+
+        fs::rename(&temporary_state_path, state_path)
+    }
+
+    pub fn contains_commit(
+        &self,
+        oid: &Oid,
+    ) -> bool {
+        self.commit_oids.contains(oid)
+    }
+
+    pub fn contains_blob(
+        &self,
+        oid: &Oid,
+    ) -> bool {
+        self.blob_oids.contains(oid)
+    }
+
+    pub fn add_scanned_commit(
+        &self,
+        commit_oid: Oid,
+        blob_oids: Vec<Oid>,
+    ) {
+        self.new_commit_oids.lock().push(commit_oid);
+        if !blob_oids.is_empty() {
+            self.new_blob_oids.lock().extend(blob_oids);
+        }
+    }
+}
@@ -0,0 +1,172 @@
+use crate::blob_cache::BlobCache;
+use crate::rules_manager::RulesManager;
+
+use crossbeam_utils::atomic::AtomicCell;
+use std::collections::HashMap;
+use std::time::Instant;
+
+/// The time a single content rule took and the number of its matches
+#[derive(Default)]
+pub struct RuleStats {
+    pub scan_time_ns: AtomicCell<u64>,
+    pub matches: AtomicCell<u64>,
+}
+
+/// The statistics of a finished scan. The per rule statistics are aggregated by the rule names.
+#[derive(Clone, Default)]
+pub struct ScanStatsSummary {
+    pub counters: HashMap<&'static str, u64>,
+    pub rules: HashMap<String, HashMap<&'static str, u64>>,
+}
+
+/// Counters of a single scan that are shared by all of its threads. The counters are always collected
+/// since they cost an atomic addition per commit or file. The times are measured only when profiling,
+/// as reading the clock for every phase of every file and for every rule is noticeable. Phase times
+/// are summed across all of the threads of the scan.
+pub struct ScanStats {
+    profile: bool,
+    started_at: Instant,
+    pub commits_walked: AtomicCell<u64>,
+    pub commits_scanned: AtomicCell<u64>,
+    pub commits_done: AtomicCell<u64>,
+    pub matches: AtomicCell<u64>,
+    pub deltas_seen: AtomicCell<u64>,
+    pub deltas_skipped: AtomicCell<u64>,
+    pub binary_contents: AtomicCell<u64>,
+    pub large_contents: AtomicCell<u64>,
+    pub bytes_scanned: AtomicCell<u64>,
+    pub verdict_cache_hits: AtomicCell<u64>,
+    pub verdict_cache_misses: AtomicCell<u64>,
+    pub walk_time_ns: AtomicCell<u64>,
+    pub diff_time_ns: AtomicCell<u64>,
+    pub blob_read_time_ns: AtomicCell<u64>,
+    pub content_scan_time_ns: AtomicCell<u64>,
+    rules_stats: Vec<RuleStats>,
+}
+
+impl ScanStats {
+    pub fn new(
+        profile: bool,
+        rules_manager: &RulesManager,
+    ) -> Self {
+        let rules_stats = if profile {
+            (0..rules_manager.content_rule_names().len()).map(|_| RuleStats::default()).collect()
+        } else {
+            Vec::new()
+        };
+
+        ScanStats {
+            profile,
+            started_at: Instant::now(),
+            commits_walked: AtomicCell::new(0),
+            commits_scanned: AtomicCell::new(0),
+            commits_done: AtomicCell::new(0),
+            matches: AtomicCell::new(0),
+            deltas_seen: AtomicCell::new(0),
+            deltas_skipped: AtomicCell::new(0),
+            binary_contents: AtomicCell::new(0),
+            large_contents: AtomicCell::new(0),
+            bytes_scanned: AtomicCell::new(0),
+            verdict_cache_hits: AtomicCell::new(0),
+            verdict_cache_misses: AtomicCell::new(0),
+            walk_time_ns: AtomicCell::new(0),
+            diff_time_ns: AtomicCell::new(0),
+            blob_read_time_ns: AtomicCell::new(0),
+            content_scan_time_ns: AtomicCell::new(0),
+            rules_stats,
+        }
+    }
+
+    /// A timer for a phase, or None when not profiling so no clock is read
+    pub fn start_timer(
+        &self,
+    ) -> Option<Instant> {
+        if self.profile {
+            Some(Instant::now())
+        } else {
+            None
+        }
+    }
+
+    pub fn record_time(
+        &self,
+        phase_time_ns: &AtomicCell<u64>,
+        timer: Option<Instant>,
+    ) {
+        if let Some(timer) = timer {
+            phase_time_ns.fetch_add(timer.elapsed().as_nanos() as u64);
+        }
+    }
+
+    /// The statistics of every content rule by its index, or None when not profiling
+    pub fn rules_stats(
+        &self,
+    ) -> Option<&[RuleStats]> {
+        if self.profile {
+            Some(&self.rules_stats)
+        } else {
+            None
+        }
+    }
+
+    /// The progress of a running scan. The total number of commits keeps growing until all of the
+    /// branches were walked.
+    pub fn progress(
+        &self,
+    ) -> HashMap<&'static str, u64> {
+        HashMap::from(
+            [
+                ("commits_done", self.commits_done.load()),
+                ("commits_total", self.commits_walked.load()),
+                ("matches", self.matches.load()),
+                ("bytes_scanned", self.bytes_scanned.load()),
+                ("elapsed_time_ns", self.started_at.elapsed().as_nanos() as u64),
+            ]
+        )
+    }
+
+    pub fn summary(
+        &self,
+        blob_cache: Option<&BlobCache>,
+        rules_manager: &RulesManager,
+    ) -> ScanStatsSummary {
+        let mut counters = blob_cache.map_or_else(HashMap::new, BlobCache::stats);
+        counters.extend(
+            [
+                ("commits_walked", self.commits_walked.load()),
+                ("commits_scanned", self.commits_scanned.load()),
+                ("matches", self.matches.load()),
+                ("deltas_seen", self.deltas_seen.load()),
+                ("deltas_skipped", self.deltas_skipped.load()),
+                ("binary_contents", self.binary_contents.load()),
+                ("large_contents", self.large_contents.load()),
+                ("bytes_scanned", self.bytes_scanned.load()),
+                ("verdict_cache_hits", self.verdict_cache_hits.load()),
+                ("verdict_cache_misses", self.verdict_cache_misses.load()),
+                ("scan_time_ns", self.started_at.elapsed().as_nanos() as u64),
+            ]
+        );
+        if self.profile {
+            counters.extend(
+                [
+                    ("walk_time_ns", self.walk_time_ns.load()),
+                    ("diff_time_ns", self.diff_time_ns.load()),
+                    ("blob_read_time_ns", self.blob_read_time_ns.load()),
+                    ("content_scan_time_ns", self.content_scan_time_ns.load()),
+                ]
+            );
+        }
+
+        let mut rules = HashMap::<String, HashMap<&'static str, u64>>::new();
+        for (rule_name, rule_stats) in rules_manager.content_rule_names().into_iter().zip(self.rules_stats.iter()) {
+            let rule_summary = rules.entry(rule_name.to_string()).or_default();
+            *rule_summary.entry("scan_time_ns").or_default() += rule_stats.scan_time_ns.load();
+            *rule_summary.entry("matches").or_default() += rule_stats.matches.load();
+        }
+
+        ScanStatsSummary {
+            counters,
+            rules,
+        }
+    }
+}
@@ -0,0 +1,101 @@
+use parking_lot::Mutex;
+use std::collections::hash_map::DefaultHasher;
+use std::collections::{HashMap, VecDeque};
+use std::hash::{Hash, Hasher};
+
+pub const DEFAULT_VERDICT_CACHE_SIZE: usize = 65_536;
+pub const MAX_VERDICT_CACHE_TEXT_LENGTH: usize = 256;
+const NUMBER_OF_SHARDS: usize = 64;
+
+struct VerdictCacheShard {
+    verdicts: HashMap<usize, HashMap<Box<[u8]>, bool>>,
+    insertion_order: VecDeque<(usize, Box<[u8]>)>,
+}
+
+/// A bounded, sharded cache of the whitelist and blacklist verdicts of match texts, keyed by the index
+/// of their rule and the match text. Placeholders such as `password=changeme` are matched over and over
+/// across the history of a repository, so their verdict is computed once and shared by all the scanning
+/// threads. When a shard is full, its oldest verdicts are evicted. A clone starts empty, since the rules
+/// of a cloned rules manager may diverge from the rules the verdicts were computed for.
+pub struct VerdictCache {
+    shards: Vec<Mutex<VerdictCacheShard>>,
+    shard_capacity: usize,
+}
+
+impl Clone for VerdictCache {
+    fn clone(
+        &self,
+    ) -> Self {
+        VerdictCache::new(self.shard_capacity * NUMBER_OF_SHARDS)
+    }
+}
+
+impl VerdictCache {
+    pub fn new(
+        capacity: usize,
+    ) -> Self {
+        let mut shards = Vec::with_capacity(NUMBER_OF_SHARDS);
+        for _ in 0..NUMBER_OF_SHARDS {
+            shards.push(
+                Mutex::new(
+                    VerdictCacheShard {
+                        verdicts: HashMap::new(),
+                        insertion_order: VecDeque::new(),
+                    }
+                )
+            );
+        }
+
+        VerdictCache {
+            shards,
+            shard_capacity: capacity.div_ceil(NUMBER_OF_SHARDS),
+        }
+    }
+
+    fn shard(
+        &self,
+        rule_index: usize,
+        match_text: &[u8],
+    ) -> &Mutex<VerdictCacheShard> {
+        let mut hasher = DefaultHasher::new();
+        rule_index.hash(&mut hasher);
+        match_text.hash(&mut hasher);
+
+        &self.shards[hasher.finish() as usize % NUMBER_OF_SHARDS]
+    }
+
+    pub fn get(
+        &self,
+        rule_index: usize,
+        match_text: &[u8],
+    ) -> Option<bool> {
+        self.shard(rule_index, match_text).lock().verdicts.get(&rule_index)?.get(match_text).copied()
+    }
+
+    pub fn insert(
+        &self,
+        rule_index: usize,
+        match_text: &[u8],
+        verdict: bool,
+    ) {
+        if self.shard_capacity == 0 {
+            return;
+        }
+
+        let mut shard = self.shard(rule_index, match_text).lock();
+        while shard.insertion_order.len() >= self.shard_capacity {
+            let (oldest_rule_index, oldest_match_text) = match shard.insertion_order.pop_front() {
+                Some(oldest_verdict_key) => oldest_verdict_key,
+                None => break,
+            };
+            if let Some(rule_verdicts) = shard.verdicts.get_mut(&oldest_rule_index) {
+                rule_verdicts.remove(&oldest_match_text);
+            }
+        }
+
+        let match_text: Box<[u8]> = match_text.into();
+        if shard.verdicts.entry(rule_index).or_default().insert(match_text.clone(), verdict).is_none() {
+            shard.insertion_order.push_back((rule_index, match_text));
+        }
+    }
+}
@@ -1,7 +1,9 @@
 import unittest
 import tempfile
+import os
 import git
 import datetime
+import asyncio
 
 import pyrepscan
 
@@ -153,31 +155,40 @@ class GitRepositoryScannerTestCase(
                 {
                     'author_email': 'test@author.email',
                     'author_name': 'Author Name',
+                    'column': 5,
                     'commit_message': 'edited file',
                     'commit_time': '2001-01-01T00:00:00',
                     'file_oid': '47d2739ba2c34690248c8f91b84bb54e8936899a',
                     'file_path': 'file.txt',
+                    'line_number': 1,
                     'match_text': 'content',
+                    'offset': 4,
                     'rule_name': 'First Rule'
                 },
                 {
                     'author_email': 'test@author.email',
                     'author_name': 'Author Name',
+                    'column': 5,
                     'commit_message': 'edited file in new branch',
                     'commit_time': '2002-01-01T00:00:00',
                     'file_oid': '0407a18f7c6802c7e7ddc5c9e8af4a34584383ff',
                     'file_path': 'file.txt',
+                    'line_number': 1,
                     'match_text': 'content',
+                    'offset': 4,
                     'rule_name': 'First Rule'
                 },
                 {
                     'author_email': 'test@author.email',
                     'author_name': 'Author Name',
+                    'column': 1,
                     'commit_message': 'initial commit',
                     'commit_time': '2000-01-01T00:00:00',
                     'file_oid': '6b584e8ece562ebffc15d38808cd6b98fc3d97ea',
                     'file_path': 'file.txt',
+                    'line_number': 1,
                     'match_text': 'content',
+                    'offset': 0,
                     'rule_name': 'First Rule'
                 },
             ],
@@ -196,41 +207,53 @@ class GitRepositoryScannerTestCase(
                 {
                     'author_email': 'test@author.email',
                     'author_name': 'Author Name',
+                    'column': 5,
                     'commit_message': 'edited file',
                     'commit_time': '2001-01-01T00:00:00',
                     'file_oid': '47d2739ba2c34690248c8f91b84bb54e8936899a',
                     'file_path': 'file.txt',
+                    'line_number': 1,
                     'match_text': 'content',
+                    'offset': 4,
                     'rule_name': 'First Rule'
                 },
                 {
                     'author_email': 'test@author.email',
                     'author_name': 'Author Name',
+                    'column': 5,
                     'commit_message': 'edited file in new branch',
                     'commit_time': '2002-01-01T00:00:00',
                     'file_oid': '0407a18f7c6802c7e7ddc5c9e8af4a34584383ff',
                     'file_path': 'file.txt',
+                    'line_number': 1,
                     'match_text': 'content',
+                    'offset': 4,
                     'rule_name': 'First Rule'
                 },
                 {
                     'author_email': 'test@author.email',
                     'author_name': 'Author Name',
+                    'column': 1,
                     'commit_message': 'initial commit',
                     'commit_time': '2000-01-01T00:00:00',
                     'file_oid': '6b584e8ece562ebffc15d38808cd6b98fc3d97ea',
                     'file_path': 'file.txt',
+                    'line_number': 1,
                     'match_text': 'content',
+                    'offset': 0,
                     'rule_name': 'First Rule'
                 },
                 {
                     'author_email': 'test@author.email',
                     'author_name': 'Author Name',
+                    'column': 5,
                     'commit_message': 'edited file in non_merged_branch',
                     'commit_time': '2004-01-01T00:00:00',
                     'file_oid': '057032a2108721ad1de6a9240fd1a8f45bc3f2ef',
                     'file_path': 'file.txt',
+                    'line_number': 1,
                     'match_text': 'content',
+                    'offset': 4,
                     'rule_name': 'First Rule'
                 },
             ],
@@ -295,11 +318,14 @@ class GitRepositoryScannerTestCase(
                 {
                     'author_email': 'test@author.email',
                     'author_name': 'Author Name',
+                    'column': 5,
                     'commit_message': 'edited file in non_merged_branch',
                     'commit_time': '2004-01-01T00:00:00',
                     'file_oid': '057032a2108721ad1de6a9240fd1a8f45bc3f2ef',
                     'file_path': 'file.txt',
+                    'line_number': 1,
                     'match_text': 'content',
+                    'offset': 4,
                     'rule_name': 'First Rule'
                 },
             ],
@@ -358,6 +384,2034 @@ class GitRepositoryScannerTestCase(
             ],
         )
 
+        scan_stats = grs.last_scan_stats()
+        self.assertEqual(
+            first=scan_stats['blob_cache_hits'] + scan_stats['blob_cache_misses'],
+            second=0,
+        )
+
+    def test_scan_file_globs(
+        self,
+    ):
+        for glob_to_skip in (
+            'PROD_ENV_WITH_CONTENT.KEY',
+            '*.KEY',
+            'prod_env_with_*',
+        ):
+            grs = pyrepscan.GitRepositoryScanner()
+            grs.add_file_path_rule(
+                name='First Rule',
+                pattern=r'(prod|dev|stage).+key',
+            )
+            grs.add_file_glob_to_skip(glob_to_skip)
+
+            results = grs.scan(
+                repository_path=self.tmpdir.name,
+                branch_glob_pattern='*',
+            )
+            self.assertEqual(
+                first=results,
+                second=[],
+            )
+
+        grs = pyrepscan.GitRepositoryScanner()
+        grs.add_file_path_rule(
+            name='First Rule',
+            pattern=r'(prod|dev|stage).+key',
+        )
+        grs.add_file_glob_to_include('*.txt')
+
+        results = grs.scan(
+            repository_path=self.tmpdir.name,
+            branch_glob_pattern='*',
+        )
+        self.assertEqual(
+            first=results,
+            second=[],
+        )
+
+        grs.add_file_glob_to_include('prod_*')
+        results = grs.scan(
+            repository_path=self.tmpdir.name,
+            branch_glob_pattern='*',
+        )
+        self.assertEqual(
+            first=[
+                result['file_path']
+                for result in results
+            ],
+            second=[
+                'prod_env_with_content.key',
+            ],
+        )
+
+    def test_scan_match_context(
+        self,
+    ):
+        grs = pyrepscan.GitRepositoryScanner(
+            match_context_size=4,
+        )
+        grs.add_content_rule(
+            name='First Rule',
+            pattern=r'''(content)''',
+            whitelist_patterns=[],
+            blacklist_patterns=[],
+        )
+        grs.add_file_extension_to_skip('py')
+        grs.add_file_path_to_skip('test_')
+
+        results = grs.scan(
+            repository_path=self.tmpdir.name,
+            branch_glob_pattern='*master',
+        )
+        self.assertCountEqual(
+            first=[
+                (result['commit_message'], result['context'])
+                for result in results
+            ],
+            second=[
+                ('initial commit', 'content'),
+                ('edited file', 'new content'),
+                ('edited file in new branch', 'new content fro'),
+            ],
+        )
+
+    def test_scan_encodings(
+        self,
+    ):
+        repo = git.Repo(
+            path=self.tmpdir.name,
+        )
+        repo.head.reset(
+            index=True,
+            working_tree=True,
+        )
+        with open(f'{self.tmpdir.name}/latin1_file.txt', 'wb') as tmpfile:
+            tmpfile.write('caf\xe9 content'.encode('latin-1'))
+        with open(f'{self.tmpdir.name}/utf16_file.txt', 'wb') as tmpfile:
+            tmpfile.write(b'\xff\xfe' + '\xe9 content'.encode('utf-16-le'))
+        repo.index.add(
+            items=[
+                f'{self.tmpdir.name}/latin1_file.txt',
+                f'{self.tmpdir.name}/utf16_file.txt',
+            ],
+        )
+        repo.index.commit(
+            message='encoded files',
+            author=git.Actor(
+                name='Author Name',
+                email='test@author.email',
+            ),
+            commit_date='2005-01-01T00:00:00',
+            author_date='2005-01-01T00:00:00',
+        )
+        repo.close()
+
+        grs = pyrepscan.GitRepositoryScanner(
+            match_context_size=4,
+        )
+        grs.add_content_rule(
+            name='First Rule',
+            pattern=r'''(content)''',
+            whitelist_patterns=[],
+            blacklist_patterns=[],
+        )
+
+        results = grs.scan(
+            repository_path=self.tmpdir.name,
+            branch_glob_pattern='*master',
+        )
+        self.assertCountEqual(
+            first=[
+                (
+                    result['file_path'],
+                    result['match_text'],
+                    result['offset'],
+                    result['line_number'],
+                    result['column'],
+                    result['context'],
+                )
+                for result in results
+                if result['commit_message'] == 'encoded files'
+            ],
+            second=[
+                ('latin1_file.txt', 'content', 5, 1, 6, 'af\xe9 content'),
+                ('utf16_file.txt', 'content', 6, 1, 3, '\xe9 content'),
+            ],
+        )
+
+    def test_scan_utf16_many_matches(
+        self,
+    ):
+        repo = git.Repo(
+            path=self.tmpdir.name,
+        )
+        repo.head.reset(
+            index=True,
+            working_tree=True,
+        )
+        with open(f'{self.tmpdir.name}/utf16_file.txt', 'wb') as tmpfile:
+            tmpfile.write(b'\xff\xfe' + '\U0001f511 content\ncontent \xe9 content'.encode('utf-16-le'))
+        repo.index.add(
+            items=[
+                f'{self.tmpdir.name}/utf16_file.txt',
+            ],
+        )
+        repo.index.commit(
+            message='encoded file',
+            author=git.Actor(
+                name='Author Name',
+                email='test@author.email',
+            ),
+            commit_date='2005-01-01T00:00:00',
+            author_date='2005-01-01T00:00:00',
+        )
+        repo.close()
+
+        grs = pyrepscan.GitRepositoryScanner()
+        grs.add_content_rule(
+            name='First Rule',
+            pattern=r'''(content)''',
+            whitelist_patterns=[],
+            blacklist_patterns=[],
+        )
+
+        results = grs.scan(
+            repository_path=self.tmpdir.name,
+            branch_glob_pattern='*master',
+        )
+        self.assertCountEqual(
+            first=[
+                (
+                    result['match_text'],
+                    result['offset'],
+                    result['line_number'],
+                    result['column'],
+                )
+                for result in results
+                if result['commit_message'] == 'encoded file'
+            ],
+            second=[
+                ('content', 8, 1, 3),
+                ('content', 24, 2, 1),
+                ('content', 44, 2, 11),
+            ],
+        )
+
+    def test_scan_large_content(
+        self,
+    ):
+        repo = git.Repo(
+            path=self.tmpdir.name,
+        )
+        repo.head.reset(
+            index=True,
+            working_tree=True,
+        )
+        with open(f'{self.tmpdir.name}/large_file.txt', 'w') as tmpfile:
+            tmpfile.write('a' * 12 + 'content\n' + 'b' * 10 + ' content')
+        repo.index.add(
+            items=[
+                f'{self.tmpdir.name}/large_file.txt',
+            ],
+        )
+        repo.index.commit(
+            message='large file',
+            author=git.Actor(
+                name='Author Name',
+                email='test@author.email',
+            ),
+            commit_date='2005-01-01T00:00:00',
+            author_date='2005-01-01T00:00:00',
+        )
+        repo.close()
+
+        grs = pyrepscan.GitRepositoryScanner(
+            max_content_size=16,
+        )
+        grs.add_content_rule(
+            name='First Rule',
+            pattern=r'''(content)''',
+            whitelist_patterns=[],
+            blacklist_patterns=[],
+        )
+
+        results = grs.scan(
+            repository_path=self.tmpdir.name,
+            branch_glob_pattern='*master',
+        )
+        self.assertCountEqual(
+            first=[
+                (
+                    result['match_text'],
+                    result['offset'],
+                    result['line_number'],
+                    result['column'],
+                )
+                for result in results
+                if result['commit_message'] == 'large file'
+            ],
+            second=[
+                ('content', 12, 1, 13),
+                ('content', 31, 2, 12),
+            ],
+        )
+        self.assertGreater(
+            a=grs.last_scan_stats()['large_contents'],
+            b=0,
+        )
+
+        with self.assertRaises(
+            expected_exception=RuntimeError,
+        ):
+            pyrepscan.GitRepositoryScanner(
+                max_content_size=0,
+            )
+
+    def test_scan_large_content_packed(
+        self,
+    ):
+        repo = git.Repo(
+            path=self.tmpdir.name,
+        )
+        repo.head.reset(
+            index=True,
+            working_tree=True,
+        )
+        with open(f'{self.tmpdir.name}/large_file.txt', 'w') as tmpfile:
+            tmpfile.write('a' * 12 + 'content\n' + 'b' * 10 + ' content')
+        repo.index.add(
+            items=[
+                f'{self.tmpdir.name}/large_file.txt',
+            ],
+        )
+        repo.index.commit(
+            message='large file',
+            author=git.Actor(
+                name='Author Name',
+                email='test@author.email',
+            ),
+            commit_date='2005-01-01T00:00:00',
+            author_date='2005-01-01T00:00:00',
+        )
+        repo.git.repack('-a', '-d')
+        repo.close()
+
+        grs = pyrepscan.GitRepositoryScanner(
+            max_content_size=16,
+        )
+        grs.add_content_rule(
+            name='First Rule',
+            pattern=r'''(content)''',
+            whitelist_patterns=[],
+            blacklist_patterns=[],
+        )
+        grs.add_file_path_rule(
+            name='Second Rule',
+            pattern=r'large_file',
+        )
+
+        results = grs.scan(
+            repository_path=self.tmpdir.name,
+            branch_glob_pattern='*master',
+        )
+        self.assertCountEqual(
+            first=[
+                (
+                    result['rule_name'],
+                    result['match_text'],
+                    result.get('offset'),
+                )
+                for result in results
+                if result['commit_message'] == 'large file'
+            ],
+            second=[
+                ('First Rule', 'content', 12),
+                ('First Rule', 'content', 31),
+                ('Second Rule', 'large_file.txt', None),
+            ],
+        )
+
+    def test_scan_large_content_match_across_windows(
+        self,
+    ):
+        repo = git.Repo(
+            path=self.tmpdir.name,
+        )
+        repo.head.reset(
+            index=True,
+            working_tree=True,
+        )
+        token = 'Abcdefghij0123456789KLMNOPQRST'
+        with open(f'{self.tmpdir.name}/large_file.txt', 'w') as tmpfile:
+            tmpfile.write('line\n' + '.' * 6 + token + '\n' + '.' * 70000)
+        repo.index.add(
+            items=[
+                f'{self.tmpdir.name}/large_file.txt',
+            ],
+        )
+        repo.index.commit(
+            message='large file',
+            author=git.Actor(
+                name='Author Name',
+                email='test@author.email',
+            ),
+            commit_date='2005-01-01T00:00:00',
+            author_date='2005-01-01T00:00:00',
+        )
+        repo.close()
+
+        grs = pyrepscan.GitRepositoryScanner(
+            max_content_size=16,
+        )
+        grs.add_content_rule(
+            name='First Rule',
+            pattern=r'''([A-Za-z0-9]{20,})''',
+            whitelist_patterns=[],
+            blacklist_patterns=[],
+        )
+
+        results = grs.scan(
+            repository_path=self.tmpdir.name,
+            branch_glob_pattern='*master',
+        )
+        self.assertListEqual(
+            list1=[
+                (
+                    result['match_text'],
+                    result['offset'],
+                    result['line_number'],
+                    result['column'],
+                )
+                for result in results
+                if result['commit_message'] == 'large file'
+            ],
+            list2=[
+                (token, 11, 2, 7),
+            ],
+        )
+
+    def test_scan_profile(
+        self,
+    ):
+        for profile in (
+            False,
+            True,
+        ):
+            grs = pyrepscan.GitRepositoryScanner(
+                profile=profile,
+            )
+            grs.add_content_rule(
+                name='First Rule',
+                pattern=r'''(content)''',
+                whitelist_patterns=[],
+                blacklist_patterns=[],
+            )
+            grs.add_content_rule(
+                name='Second Rule',
+                pattern=r'''(password)''',
+                whitelist_patterns=[],
+                blacklist_patterns=[],
+            )
+            grs.add_file_extension_to_skip('py')
+            grs.add_file_path_to_skip('test_')
+
+            results = grs.scan(
+                repository_path=self.tmpdir.name,
+                branch_glob_pattern='*master',
+            )
+            self.assertEqual(
+                first=len(results),
+                second=3,
+            )
+
+            scan_stats = grs.last_scan_stats()
+            self.assertEqual(
+                first=(
+                    scan_stats['commits_walked'],
+                    scan_stats['commits_scanned'],
+                    scan_stats['deltas_skipped'],
+                ),
+                second=(4, 3, 2),
+            )
+            self.assertGreater(
+                a=scan_stats['bytes_scanned'],
+                b=0,
+            )
+
+            if profile:
+                self.assertTrue(
+                    expr=all(
+                        phase_time in scan_stats
+                        for phase_time in (
+                            'walk_time_ns',
+                            'diff_time_ns',
+                            'blob_read_time_ns',
+                            'content_scan_time_ns',
+                        )
+                    ),
+                )
+                self.assertEqual(
+                    first={
+                        rule_name: rule_stats['matches']
+                        for rule_name, rule_stats in grs.last_scan_rules_stats().items()
+                    },
+                    second={
+                        'First Rule': 3,
+                        'Second Rule': 0,
+                    },
+                )
+            else:
+                self.assertNotIn(
+                    member='content_scan_time_ns',
+                    container=scan_stats,
+                )
+                self.assertEqual(
+                    first=grs.last_scan_rules_stats(),
+                    second={},
+                )
+
+    def test_scan_progress_and_cancellation(
+        self,
+    ):
+        grs = pyrepscan.GitRepositoryScanner()
+        grs.add_content_rule(
+            name='First Rule',
+            pattern=r'''(content)''',
+            whitelist_patterns=[],
+            blacklist_patterns=[],
+        )
+        grs.add_file_extension_to_skip('py')
+        grs.add_file_path_to_skip('test_')
+
+        progress_reports = []
+        results = grs.scan_range(
+            repository_path=self.tmpdir.name,
+            revspecs=['master..non_merged_branch'],
+            progress_callback=progress_reports.append,
+            progress_interval=0,
+        )
+        self.assertEqual(
+            first=len(results),
+            second=1,
+        )
+        self.assertGreater(
+            a=len(progress_reports),
+            b=0,
+        )
+        self.assertEqual(
+            first=set(progress_reports[0]),
+            second={
+                'commits_done',
+                'commits_total',
+                'matches',
+                'bytes_scanned',
+                'elapsed_time_ns',
+            },
+        )
+        self.assertEqual(
+            first=progress_reports[0]['commits_total'],
+            second=1,
+        )
+
+        def failing_progress_callback(
+            progress,
+        ):
+            raise ValueError('stop')
+
+        with self.assertRaises(
+            expected_exception=ValueError,
+        ):
+            grs.scan_range(
+                repository_path=self.tmpdir.name,
+                revspecs=['master..non_merged_branch'],
+                progress_callback=failing_progress_callback,
+                progress_interval=0,
+            )
+
+        cancellation_token = pyrepscan.CancellationToken()
+        self.assertFalse(
+            expr=cancellation_token.is_cancelled(),
+        )
+        cancellation_token.cancel()
+        self.assertTrue(
+            expr=cancellation_token.is_cancelled(),
+        )
+        with self.assertRaises(
+            expected_exception=RuntimeError,
+        ):
+            grs.scan_range(
+                repository_path=self.tmpdir.name,
+                revspecs=['master..non_merged_branch'],
+                cancellation_token=cancellation_token,
+            )
+
+        with self.assertRaises(
+            expected_exception=RuntimeError,
+        ):
+            grs.scan_range(
+                repository_path=self.tmpdir.name,
+                revspecs=['master..non_merged_branch'],
+                timeout=0,
+            )
+
+        for monitor_argument in (
+            {'cancellation_token': cancellation_token},
+            {'timeout': 0},
+        ):
+            with self.assertRaises(
+                expected_exception=RuntimeError,
+            ):
+                grs.scan_index(
+                    repository_path=self.tmpdir.name,
+                    **monitor_argument,
+                )
+
+            with self.assertRaises(
+                expected_exception=RuntimeError,
+            ):
+                list(
+                    grs.scan_iter(
+                        repository_path=self.tmpdir.name,
+                        branch_glob_pattern='*',
+                        **monitor_argument,
+                    )
+                )
+
+        for invalid_argument in (
+            {'timeout': -1},
+            {'progress_interval': -1},
+        ):
+            with self.assertRaises(
+                expected_exception=RuntimeError,
+            ):
+                grs.scan(
+                    repository_path=self.tmpdir.name,
+                    **invalid_argument,
+                )
+
+    def test_scan_merge_strategy(
+        self,
+    ):
+        repo = git.Repo(
+            path=self.tmpdir.name,
+        )
+        repo.head.reset(
+            index=True,
+            working_tree=True,
+        )
+        with open(f'{self.tmpdir.name}/merge_file.txt', 'w') as tmpfile:
+            tmpfile.write('merged content')
+        repo.index.add(
+            items=[
+                f'{self.tmpdir.name}/merge_file.txt',
+            ],
+        )
+        repo.index.commit(
+            message='evil merge',
+            author=git.Actor(
+                name='Author Name',
+                email='test@author.email',
+            ),
+            commit_date='2005-01-01T00:00:00',
+            author_date='2005-01-01T00:00:00',
+            parent_commits=(
+                repo.heads.master.commit,
+                repo.heads.non_merged_branch.commit,
+            ),
+        )
+        repo.close()
+
+        expected_results = [
+            ('initial commit', 'file.txt'),
+            ('edited file', 'file.txt'),
+            ('edited file in new branch', 'file.txt'),
+            ('edited file in non_merged_branch', 'file.txt'),
+        ]
+        for merge_strategy, expected_merge_results in (
+            (None, []),
+            ('skip', []),
+            ('first_parent', [('merge from new branch', 'file.txt'), ('evil merge', 'merge_file.txt')]),
+            ('combined', [('evil merge', 'merge_file.txt')]),
+        ):
+            grs = pyrepscan.GitRepositoryScanner(
+                merge_strategy=merge_strategy,
+            )
+            grs.add_content_rule(
+                name='First Rule',
+                pattern=r'''(content)''',
+                whitelist_patterns=[],
+                blacklist_patterns=[],
+            )
+            grs.add_file_extension_to_skip('py')
+            grs.add_file_path_to_skip('test_')
+
+            results = grs.scan(
+                repository_path=self.tmpdir.name,
+                branch_glob_pattern='*master',
+            )
+            self.assertCountEqual(
+                first=[
+                    (result['commit_message'], result['file_path'])
+                    for result in results
+                ],
+                second=expected_results + expected_merge_results,
+            )
+
+        with self.assertRaises(
+            expected_exception=RuntimeError,
+        ):
+            pyrepscan.GitRepositoryScanner(
+                merge_strategy='octopus',
+            )
+
+    def test_scan_merge_strategy_combined_lines(
+        self,
+    ):
+        repo = git.Repo(
+            path=self.tmpdir.name,
+        )
+        repo.head.reset(
+            index=True,
+            working_tree=True,
+        )
+        non_merged_file_content = repo.heads.non_merged_branch.commit.tree['file.txt'].data_stream.read().decode()
+        with open(f'{self.tmpdir.name}/file.txt', 'w') as tmpfile:
+            tmpfile.write('resolved conflict\n' + non_merged_file_content)
+        repo.index.add(
+            items=[
+                f'{self.tmpdir.name}/file.txt',
+            ],
+        )
+        repo.index.commit(
+            message='conflict merge',
+            author=git.Actor(
+                name='Author Name',
+                email='test@author.email',
+            ),
+            commit_date='2005-01-01T00:00:00',
+            author_date='2005-01-01T00:00:00',
+            parent_commits=(
+                repo.heads.master.commit,
+                repo.heads.non_merged_branch.commit,
+            ),
+        )
+        repo.close()
+
+        for merge_strategy, expected_merge_results in (
+            ('first_parent', [('conflict merge', 'file.txt')]),
+            ('combined', []),
+        ):
+            grs = pyrepscan.GitRepositoryScanner(
+                merge_strategy=merge_strategy,
+            )
+            grs.add_content_rule(
+                name='First Rule',
+                pattern=r'''(content)''',
+                whitelist_patterns=[],
+                blacklist_patterns=[],
+            )
+
+            results = grs.scan(
+                repository_path=self.tmpdir.name,
+                branch_glob_pattern='*master',
+            )
+            self.assertCountEqual(
+                first=[
+                    (result['commit_message'], result['file_path'])
+                    for result in results
+                    if result['commit_message'] == 'conflict merge'
+                ],
+                second=expected_merge_results,
+            )
+
+    def test_scan_blob_cache(
+        self,
+    ):
+        repo = git.Repo(
+            path=self.tmpdir.name,
+        )
+        repo.head.reset(
+            index=True,
+            working_tree=True,
+        )
+        with open(f'{self.tmpdir.name}/copied_file.txt', 'w') as tmpfile:
+            tmpfile.write('content')
+        repo.index.add(
+            items=[
+                f'{self.tmpdir.name}/copied_file.txt',
+            ],
+        )
+        repo.index.commit(
+            message='copied file',
+            author=git.Actor(
+                name='Author Name',
+                email='test@author.email',
+            ),
+            commit_date='2005-01-01T00:00:00',
+            author_date='2005-01-01T00:00:00',
+        )
+        repo.close()
+
+        grs = pyrepscan.GitRepositoryScanner()
+        grs.add_content_rule(
+            name='First Rule',
+            pattern=r'''(content)''',
+            whitelist_patterns=[],
+            blacklist_patterns=[],
+        )
+        grs.add_file_extension_to_skip('py')
+        grs.add_file_path_to_skip('test_')
+
+        self.assertEqual(
+            first=grs.last_scan_stats(),
+            second={},
+        )
+
+        results = grs.scan(
+            repository_path=self.tmpdir.name,
+            branch_glob_pattern='*master',
+        )
+        self.assertCountEqual(
+            first=[
+                (result['file_path'], result['file_oid'], result['commit_message'])
+                for result in results
+            ],
+            second=[
+                ('file.txt', '6b584e8ece562ebffc15d38808cd6b98fc3d97ea', 'initial commit'),
+                ('file.txt', '47d2739ba2c34690248c8f91b84bb54e8936899a', 'edited file'),
+                ('file.txt', '0407a18f7c6802c7e7ddc5c9e8af4a34584383ff', 'edited file in new branch'),
+                ('copied_file.txt', '6b584e8ece562ebffc15d38808cd6b98fc3d97ea', 'copied file'),
+            ],
+        )
+
+        scan_stats = grs.last_scan_stats()
+        self.assertEqual(
+            first=scan_stats['blob_cache_hits'] + scan_stats['blob_cache_misses'],
+            second=7,
+        )
+        self.assertEqual(
+            first=scan_stats['blob_cache_evictions'],
+            second=0,
+        )
+
+        grs = pyrepscan.GitRepositoryScanner(
+            blob_cache_size=0,
+        )
+        grs.add_content_rule(
+            name='First Rule',
+            pattern=r'''(content)''',
+            whitelist_patterns=[],
+            blacklist_patterns=[],
+        )
+        results = grs.scan(
+            repository_path=self.tmpdir.name,
+            branch_glob_pattern='*master',
+        )
+        self.assertEqual(
+            first=len(
+                [
+                    result
+                    for result in results
+                    if result['file_path'] == 'copied_file.txt'
+                ]
+            ),
+            second=1,
+        )
+
+    def test_scan_diff_hunks_only(
+        self,
+    ):
+        repo = git.Repo(
+            path=self.tmpdir.name,
+        )
+        repo.head.reset(
+            index=True,
+            working_tree=True,
+        )
+        test_author = git.Actor(
+            name='Author Name',
+            email='test@author.email',
+        )
+        with open(f'{self.tmpdir.name}/secrets.txt', 'w') as tmpfile:
+            tmpfile.write('password=first\n')
+        repo.index.add(
+            items=[
+                f'{self.tmpdir.name}/secrets.txt',
+            ],
+        )
+        repo.index.commit(
+            message='added secrets',
+            author=test_author,
+            commit_date='2005-01-01T00:00:00',
+            author_date='2005-01-01T00:00:00',
+        )
+        with open(f'{self.tmpdir.name}/secrets.txt', 'w') as tmpfile:
+            tmpfile.write('password=first\nother line\npassword=second\n')
+        repo.index.add(
+            items=[
+                f'{self.tmpdir.name}/secrets.txt',
+            ],
+        )
+        repo.index.commit(
+            message='edited secrets',
+            author=test_author,
+            commit_date='2006-01-01T00:00:00',
+            author_date='2006-01-01T00:00:00',
+        )
+        repo.close()
+
+        grs = pyrepscan.GitRepositoryScanner()
+        grs.add_content_rule(
+            name='First Rule',
+            pattern=r'''password=(\w+)''',
+            whitelist_patterns=[],
+            blacklist_patterns=[],
+        )
+        results = grs.scan(
+            repository_path=self.tmpdir.name,
+            branch_glob_pattern='*master',
+        )
+        self.assertCountEqual(
+            first=[
+                (result['commit_message'], result['match_text'])
+                for result in results
+            ],
+            second=[
+                ('added secrets', 'password=first'),
+                ('edited secrets', 'password=first'),
+                ('edited secrets', 'password=second'),
+            ],
+        )
+
+        grs = pyrepscan.GitRepositoryScanner(
+            diff_hunks_only=True,
+            match_context_size=5,
+        )
+        grs.add_content_rule(
+            name='First Rule',
+            pattern=r'''password=(\w+)''',
+            whitelist_patterns=[],
+            blacklist_patterns=[],
+        )
+        results = grs.scan(
+            repository_path=self.tmpdir.name,
+            branch_glob_pattern='*master',
+        )
+        self.assertCountEqual(
+            first=[
+                (
+                    result['commit_message'],
+                    result['match_text'],
+                    result['offset'],
+                    result['line_number'],
+                    result['column'],
+                    result['context'],
+                )
+                for result in results
+            ],
+            second=[
+                ('added secrets', 'password=first', 0, 1, 1, 'password=first\n'),
+                ('edited secrets', 'password=second', 26, 3, 1, 'line\npassword=second\n'),
+            ],
+        )
+
+    def test_scan_diff_hunks_only_separate_lines(
+        self,
+    ):
+        repo = git.Repo(
+            path=self.tmpdir.name,
+        )
+        repo.head.reset(
+            index=True,
+            working_tree=True,
+        )
+        test_author = git.Actor(
+            name='Author Name',
+            email='test@author.email',
+        )
+        with open(f'{self.tmpdir.name}/secrets.txt', 'w') as tmpfile:
+            tmpfile.write(''.join(f'line {index}\n' for index in range(1, 11)))
+        repo.index.add(
+            items=[
+                f'{self.tmpdir.name}/secrets.txt',
+            ],
+        )
+        repo.index.commit(
+            message='added lines',
+            author=test_author,
+            commit_date='2005-01-01T00:00:00',
+            author_date='2005-01-01T00:00:00',
+        )
+        with open(f'{self.tmpdir.name}/secrets.txt', 'w') as tmpfile:
+            tmpfile.write(
+                'line 1\npassword\nline 3\nline 4\nline 5\n=hunter2\nline 7\nline 8\ntoken\n=abcdef\n'
+            )
+        repo.index.add(
+            items=[
+                f'{self.tmpdir.name}/secrets.txt',
+            ],
+        )
+        repo.index.commit(
+            message='edited lines',
+            author=test_author,
+            commit_date='2006-01-01T00:00:00',
+            author_date='2006-01-01T00:00:00',
+        )
+        repo.close()
+
+        grs = pyrepscan.GitRepositoryScanner(
+            diff_hunks_only=True,
+        )
+        grs.add_content_rule(
+            name='First Rule',
+            pattern=r'''(password|token)\s*=\w+''',
+            whitelist_patterns=[],
+            blacklist_patterns=[],
+        )
+        results = grs.scan(
+            repository_path=self.tmpdir.name,
+            branch_glob_pattern='*master',
+        )
+        self.assertListEqual(
+            list1=[
+                (
+                    result['commit_message'],
+                    result['match_text'],
+                    result['offset'],
+                    result['line_number'],
+                    result['column'],
+                )
+                for result in results
+            ],
+            list2=[
+                ('edited lines', 'token\n=abcdef', 60, 9, 1),
+            ],
+        )
+
+    def test_scan_state(
+        self,
+    ):
+        state_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(state_dir.cleanup)
+        state_path = f'{state_dir.name}/scan.state'
+
+        grs = pyrepscan.GitRepositoryScanner()
+        grs.add_content_rule(
+            name='First Rule',
+            pattern=r'''(content)''',
+            whitelist_patterns=[],
+            blacklist_patterns=[],
+        )
+        grs.add_file_extension_to_skip('py')
+        grs.add_file_path_to_skip('test_')
+
+        results = grs.scan(
+            repository_path=self.tmpdir.name,
+            branch_glob_pattern='*',
+            state_path=state_path,
+        )
+        self.assertEqual(
+            first=len(results),
+            second=4,
+        )
+
+        results = grs.scan(
+            repository_path=self.tmpdir.name,
+            branch_glob_pattern='*',
+            state_path=state_path,
+        )
+        self.assertListEqual(
+            list1=results,
+            list2=[],
+        )
+
+        repo = git.Repo(
+            path=self.tmpdir.name,
+        )
+        repo.head.reset(
+            index=True,
+            working_tree=True,
+        )
+        with open(f'{self.tmpdir.name}/copied_file.txt', 'w') as tmpfile:
+            tmpfile.write('content')
+        with open(f'{self.tmpdir.name}/new_file.txt', 'w') as tmpfile:
+            tmpfile.write('brand new content')
+        repo.index.add(
+            items=[
+                f'{self.tmpdir.name}/copied_file.txt',
+                f'{self.tmpdir.name}/new_file.txt',
+            ],
+        )
+        repo.index.commit(
+            message='new files',
+            author=git.Actor(
+                name='Author Name',
+                email='test@author.email',
+            ),
+            commit_date='2005-01-01T00:00:00',
+            author_date='2005-01-01T00:00:00',
+        )
+        repo.close()
+
+        results = grs.scan(
+            repository_path=self.tmpdir.name,
+            branch_glob_pattern='*',
+            state_path=state_path,
+        )
+        for result in results:
+            result.pop('commit_id')
+        self.assertListEqual(
+            list1=results,
+            list2=[
+                {
+                    'author_email': 'test@author.email',
+                    'author_name': 'Author Name',
+                    'column': 11,
+                    'commit_message': 'new files',
+                    'commit_time': '2005-01-01T00:00:00',
+                    'file_oid': '44fe699650a07a861093c17c790d4e74c6bcd86a',
+                    'file_path': 'new_file.txt',
+                    'line_number': 1,
+                    'match_text': 'content',
+                    'offset': 10,
+                    'rule_name': 'First Rule'
+                },
+            ],
+        )
+
+        grs.add_content_rule(
+            name='Second Rule',
+            pattern=r'''(new)''',
+            whitelist_patterns=[],
+            blacklist_patterns=[],
+        )
+        results = grs.scan(
+            repository_path=self.tmpdir.name,
+            branch_glob_pattern='*',
+            state_path=state_path,
+        )
+        self.assertEqual(
+            first=len(results),
+            second=11,
+        )
+
+    def test_scan_state_unreadable_blob(
+        self,
+    ):
+        state_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(state_dir.cleanup)
+        state_path = f'{state_dir.name}/scan.state'
+
+        repo = git.Repo(
+            path=self.tmpdir.name,
+        )
+        repo.head.reset(
+            index=True,
+            working_tree=True,
+        )
+        with open(f'{self.tmpdir.name}/unreadable_file.txt', 'w') as tmpfile:
+            tmpfile.write('unreadable content')
+        repo.index.add(
+            items=[
+                f'{self.tmpdir.name}/unreadable_file.txt',
+            ],
+        )
+        commit = repo.index.commit(
+            message='unreadable file',
+            author=git.Actor(
+                name='Author Name',
+                email='test@author.email',
+            ),
+            commit_date='2005-01-01T00:00:00',
+            author_date='2005-01-01T00:00:00',
+        )
+        blob_sha = commit.tree['unreadable_file.txt'].hexsha
+        repo.close()
+        os.remove(f'{self.tmpdir.name}/.git/objects/{blob_sha[:2]}/{blob_sha[2:]}')
+
+        grs = pyrepscan.GitRepositoryScanner()
+        grs.add_content_rule(
+            name='First Rule',
+            pattern=r'''(content)''',
+            whitelist_patterns=[],
+            blacklist_patterns=[],
+        )
+        grs.add_file_path_rule(
+            name='Second Rule',
+            pattern=r'unreadable_file',
+        )
+
+        for _ in range(2):
+            results = grs.scan(
+                repository_path=self.tmpdir.name,
+                branch_glob_pattern='*master',
+                state_path=state_path,
+            )
+            self.assertListEqual(
+                list1=[
+                    (
+                        result['rule_name'],
+                        result['match_text'],
+                    )
+                    for result in results
+                    if result['commit_message'] == 'unreadable file'
+                ],
+                list2=[
+                    ('Second Rule', 'unreadable_file.txt'),
+                ],
+            )
+
+    def test_scan_state_scan_options(
+        self,
+    ):
+        state_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(state_dir.cleanup)
+        state_path = f'{state_dir.name}/scan.state'
+        from_timestamp = int(
+            datetime.datetime(
+                year=2004,
+                month=1,
+                day=1,
+                hour=0,
+                minute=0,
+                second=0,
+                tzinfo=datetime.timezone.utc,
+            ).timestamp()
+        )
+
+        grs = pyrepscan.GitRepositoryScanner()
+        grs.add_content_rule(
+            name='First Rule',
+            pattern=r'''(content)''',
+            whitelist_patterns=[],
+            blacklist_patterns=[],
+        )
+        results = grs.scan(
+            repository_path=self.tmpdir.name,
+            branch_glob_pattern='*',
+            from_timestamp=from_timestamp,
+            state_path=state_path,
+        )
+        self.assertNotEqual(
+            first=results,
+            second=[],
+        )
+        results = grs.scan(
+            repository_path=self.tmpdir.name,
+            branch_glob_pattern='*',
+            from_timestamp=from_timestamp,
+            state_path=state_path,
+        )
+        self.assertListEqual(
+            list1=results,
+            list2=[],
+        )
+
+        results = grs.scan(
+            repository_path=self.tmpdir.name,
+            branch_glob_pattern='*',
+            state_path=state_path,
+        )
+        self.assertCountEqual(
+            first=results,
+            second=grs.scan(
+                repository_path=self.tmpdir.name,
+                branch_glob_pattern='*',
+            ),
+        )
+
+        for scanner_options in [
+            {
+                'diff_hunks_only': True,
+            },
+            {
+                'merge_strategy': 'first_parent',
+            },
+            {
+                'max_content_size': 4,
+            },
+        ]:
+            grs = pyrepscan.GitRepositoryScanner(**scanner_options)
+            grs.add_content_rule(
+                name='First Rule',
+                pattern=r'''(content)''',
+                whitelist_patterns=[],
+                blacklist_patterns=[],
+            )
+            results = grs.scan(
+                repository_path=self.tmpdir.name,
+                branch_glob_pattern='*',
+                state_path=state_path,
+            )
+            self.assertCountEqual(
+                first=results,
+                second=grs.scan(
+                    repository_path=self.tmpdir.name,
+                    branch_glob_pattern='*',
+                ),
+            )
+
+    def test_scan_resource_limits(
+        self,
+    ):
+        grs = pyrepscan.GitRepositoryScanner()
+        grs.add_content_rule(
+            name='First Rule',
+            pattern=r'''(content)''',
+            whitelist_patterns=[],
+            blacklist_patterns=[],
+        )
+        expected_results = grs.scan(
+            repository_path=self.tmpdir.name,
+            branch_glob_pattern='*',
+        )
+
+        grs = pyrepscan.GitRepositoryScanner(
+            num_threads=1,
+            cpu_affinity=[0],
+        )
+        grs.add_content_rule(
+            name='First Rule',
+            pattern=r'''(content)''',
+            whitelist_patterns=[],
+            blacklist_patterns=[],
+        )
+        self.assertCountEqual(
+            first=grs.scan(
+                repository_path=self.tmpdir.name,
+                branch_glob_pattern='*',
+            ),
+            second=expected_results,
+        )
+
+        grs = pyrepscan.GitRepositoryScanner(
+            max_memory=1000,
+        )
+        grs.add_content_rule(
+            name='First Rule',
+            pattern=r'''(content)''',
+            whitelist_patterns=[],
+            blacklist_patterns=[],
+        )
+        with self.assertRaises(
+            expected_exception=RuntimeError,
+        ):
+            grs.scan(
+                repository_path=self.tmpdir.name,
+                branch_glob_pattern='*',
+            )
+        self.assertCountEqual(
+            first=list(
+                grs.scan_iter(
+                    repository_path=self.tmpdir.name,
+                    branch_glob_pattern='*',
+                )
+            ),
+            second=expected_results,
+        )
+
+        with self.assertRaises(
+            expected_exception=RuntimeError,
+        ):
+            pyrepscan.GitRepositoryScanner(
+                num_threads=0,
+            )
+
+    def test_scan_columns(
+        self,
+    ):
+        grs = pyrepscan.GitRepositoryScanner()
+        grs.add_content_rule(
+            name='First Rule',
+            pattern=r'''(content)''',
+            whitelist_patterns=[],
+            blacklist_patterns=[],
+        )
+        grs.add_file_path_rule(
+            name='Second Rule',
+            pattern=r'(prod|dev|stage).+key',
+        )
+        expected_results = grs.scan(
+            repository_path=self.tmpdir.name,
+            branch_glob_pattern='*',
+        )
+
+        columns = grs.scan_columns(
+            repository_path=self.tmpdir.name,
+            branch_glob_pattern='*',
+        )
+        self.assertEqual(
+            first=len(columns['commits']['commit_id']),
+            second=len(set(columns['matches']['commit_index'])),
+        )
+
+        results = []
+        for match_index, commit_index in enumerate(columns['matches']['commit_index']):
+            result = {
+                column_name: column[commit_index]
+                for column_name, column in columns['commits'].items()
+            }
+            result.update(
+                {
+                    column_name: column[match_index]
+                    for column_name, column in columns['matches'].items()
+                    if column_name not in ('commit_index', 'context') and column[match_index] is not None
+                }
+            )
+            results.append(result)
+        self.assertCountEqual(
+            first=results,
+            second=expected_results,
+        )
+
+    def test_scan_many(
+        self,
+    ):
+        grs = pyrepscan.GitRepositoryScanner()
+        grs.add_content_rule(
+            name='First Rule',
+            pattern=r'''(content)''',
+            whitelist_patterns=[],
+            blacklist_patterns=[],
+        )
+        grs.add_file_extension_to_skip('py')
+        grs.add_file_path_to_skip('test_')
+
+        results, errors = grs.scan_many(
+            repository_paths=[
+                self.tmpdir.name,
+                '/non/existent/path',
+            ],
+            branch_glob_pattern='*',
+        )
+        expected_results = grs.scan(
+            repository_path=self.tmpdir.name,
+            branch_glob_pattern='*',
+        )
+        for expected_result in expected_results:
+            expected_result['repository_path'] = self.tmpdir.name
+        self.assertCountEqual(
+            first=results,
+            second=expected_results,
+        )
+        self.assertEqual(
+            first=list(errors.keys()),
+            second=[
+                '/non/existent/path',
+            ],
+        )
+
+    def test_scan_async(
+        self,
+    ):
+        grs = pyrepscan.GitRepositoryScanner()
+        grs.add_content_rule(
+            name='First Rule',
+            pattern=r'''(content)''',
+            whitelist_patterns=[],
+            blacklist_patterns=[],
+        )
+        grs.add_file_extension_to_skip('py')
+        grs.add_file_path_to_skip('test_')
+
+        async def scan_concurrently():
+            return await asyncio.gather(
+                grs.scan_async(
+                    repository_path=self.tmpdir.name,
+                    branch_glob_pattern='*master',
+                ),
+                grs.scan_async(
+                    repository_path=self.tmpdir.name,
+                    branch_glob_pattern='*',
+                ),
+            )
+
+        master_results, all_results = asyncio.run(scan_concurrently())
+        self.assertCountEqual(
+            first=master_results,
+            second=grs.scan(
+                repository_path=self.tmpdir.name,
+                branch_glob_pattern='*master',
+            ),
+        )
+        self.assertCountEqual(
+            first=all_results,
+            second=grs.scan(
+                repository_path=self.tmpdir.name,
+                branch_glob_pattern='*',
+            ),
+        )
+
+        with self.assertRaises(
+            expected_exception=RuntimeError,
+        ):
+            grs.scan_async(
+                repository_path=self.tmpdir.name,
+            )
+
+    def test_scan_iter(
+        self,
+    ):
+        grs = pyrepscan.GitRepositoryScanner()
+        grs.add_content_rule(
+            name='First Rule',
+            pattern=r'''(content)''',
+            whitelist_patterns=[],
+            blacklist_patterns=[],
+        )
+        grs.add_file_extension_to_skip('py')
+        grs.add_file_path_to_skip('test_')
+
+        scan_iterator = grs.scan_iter(
+            repository_path=self.tmpdir.name,
+            branch_glob_pattern='*',
+        )
+        self.assertIsInstance(
+            obj=scan_iterator,
+            cls=pyrepscan.ScanIterator,
+        )
+        self.assertCountEqual(
+            first=list(scan_iterator),
+            second=grs.scan(
+                repository_path=self.tmpdir.name,
+                branch_glob_pattern='*',
+            ),
+        )
+
+        scan_iterator = grs.scan_iter(
+            repository_path=self.tmpdir.name,
+            branch_glob_pattern='*',
+        )
+        first_match = next(scan_iterator)
+        self.assertEqual(
+            first=first_match['rule_name'],
+            second='First Rule',
+        )
+        del scan_iterator
+
+        with self.assertRaises(
+            expected_exception=RuntimeError,
+        ):
+            list(
+                grs.scan_iter(
+                    repository_path='/non/existent/path',
+                )
+            )
+
+    def test_scan_from_url(
+        self,
+    ):
+        clone_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(clone_dir.cleanup)
+        repository_path = f'{clone_dir.name}/repository'
+
+        grs = pyrepscan.GitRepositoryScanner()
+        grs.add_content_rule(
+            name='First Rule',
+            pattern=r'''(content)''',
+            whitelist_patterns=[],
+            blacklist_patterns=[],
+        )
+        grs.add_file_extension_to_skip('py')
+        grs.add_file_path_to_skip('test_')
+
+        results = grs.scan_from_url(
+            url=f'file://{self.tmpdir.name}',
+            repository_path=repository_path,
+            branch_glob_pattern='*master',
+        )
+        self.assertCountEqual(
+            first=[
+                result['commit_message']
+                for result in results
+            ],
+            second=[
+                'initial commit',
+                'edited file',
+                'edited file in new branch',
+            ],
+        )
+
+        repo = git.Repo(
+            path=self.tmpdir.name,
+        )
+        repo.head.reset(
+            index=True,
+            working_tree=True,
+        )
+        with open(f'{self.tmpdir.name}/pushed_file.txt', 'w') as tmpfile:
+            tmpfile.write('pushed content')
+        repo.index.add(
+            items=[
+                f'{self.tmpdir.name}/pushed_file.txt',
+            ],
+        )
+        repo.index.commit(
+            message='pushed file',
+            author=git.Actor(
+                name='Author Name',
+                email='test@author.email',
+            ),
+            commit_date='2005-01-01T00:00:00',
+            author_date='2005-01-01T00:00:00',
+        )
+        repo.close()
+
+        results = grs.scan_from_url(
+            url=f'file://{self.tmpdir.name}',
+            repository_path=repository_path,
+            branch_glob_pattern='*master',
+        )
+        self.assertCountEqual(
+            first=[
+                result['commit_message']
+                for result in results
+            ],
+            second=[
+                'initial commit',
+                'edited file',
+                'edited file in new branch',
+                'pushed file',
+            ],
+        )
+
+    def test_scan_from_url_fetches_local_branches(
+        self,
+    ):
+        clone_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(clone_dir.cleanup)
+        repository_path = f'{clone_dir.name}/repository'
+
+        grs = pyrepscan.GitRepositoryScanner()
+        grs.add_content_rule(
+            name='First Rule',
+            pattern=r'''(pushed content)''',
+            whitelist_patterns=[],
+            blacklist_patterns=[],
+        )
+
+        results = grs.scan_from_url(
+            url=f'file://{self.tmpdir.name}',
+            repository_path=repository_path,
+            branch_glob_pattern='refs/heads/*',
+        )
+        self.assertListEqual(
+            list1=results,
+            list2=[],
+        )
+
+        repo = git.Repo(
+            path=self.tmpdir.name,
+        )
+        repo.head.reset(
+            index=True,
+            working_tree=True,
+        )
+        with open(f'{self.tmpdir.name}/pushed_file.txt', 'w') as tmpfile:
+            tmpfile.write('pushed content')
+        repo.index.add(
+            items=[
+                f'{self.tmpdir.name}/pushed_file.txt',
+            ],
+        )
+        repo.index.commit(
+            message='pushed file',
+            author=git.Actor(
+                name='Author Name',
+                email='test@author.email',
+            ),
+            commit_date='2005-01-01T00:00:00',
+            author_date='2005-01-01T00:00:00',
+        )
+        repo.close()
+
+        results = grs.scan_from_url(
+            url=f'file://{self.tmpdir.name}',
+            repository_path=repository_path,
+            branch_glob_pattern='refs/heads/*',
+        )
+        self.assertListEqual(
+            list1=[
+                result['commit_message']
+                for result in results
+            ],
+            list2=[
+                'pushed file',
+            ],
+        )
+
+    def test_scan_from_url_other_remote(
+        self,
+    ):
+        clone_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(clone_dir.cleanup)
+        repository_path = f'{clone_dir.name}/repository'
+        other_repository_path = f'{clone_dir.name}/other_repository'
+        git.Repo.clone_from(
+            url=self.tmpdir.name,
+            to_path=other_repository_path,
+        ).close()
+
+        grs = pyrepscan.GitRepositoryScanner()
+        grs.add_content_rule(
+            name='First Rule',
+            pattern=r'''(content)''',
+            whitelist_patterns=[],
+            blacklist_patterns=[],
+        )
+        grs.scan_from_url(
+            url=f'file://{self.tmpdir.name}',
+            repository_path=repository_path,
+            branch_glob_pattern='*',
+        )
+
+        with self.assertRaises(
+            expected_exception=RuntimeError,
+        ):
+            grs.scan_from_url(
+                url=f'file://{other_repository_path}',
+                repository_path=repository_path,
+                branch_glob_pattern='*',
+            )
+
+        results = grs.scan_from_url(
+            url=f'file://{other_repository_path}',
+            repository_path=repository_path,
+            branch_glob_pattern='*',
+            update_remote_url=True,
+        )
+        self.assertNotEqual(
+            first=results,
+            second=[],
+        )
+
+    def test_scan_directory(
+        self,
+    ):
+        grs = pyrepscan.GitRepositoryScanner()
+        grs.add_content_rule(
+            name='First Rule',
+            pattern=r'''(content)''',
+            whitelist_patterns=[],
+            blacklist_patterns=[],
+        )
+        grs.add_file_path_rule(
+            name='Second Rule',
+            pattern=r'(prod|dev|stage).+key',
+        )
+        grs.add_file_extension_to_skip('py')
+        grs.add_file_path_to_skip('test_')
+
+        results = grs.scan_directory(
+            directory_path=self.tmpdir.name,
+        )
+        self.assertCountEqual(
+            first=results,
+            second=[
+                {
+                    'column': 5,
+                    'file_path': 'file.txt',
+                    'line_number': 1,
+                    'match_text': 'content',
+                    'offset': 4,
+                    'rule_name': 'First Rule',
+                },
+                {
+                    'file_path': 'prod_env_with_content.key',
+                    'match_text': 'prod_env_with_content.key',
+                    'rule_name': 'Second Rule',
+                },
+            ],
+        )
+
+        with self.assertRaises(
+            expected_exception=RuntimeError,
+        ):
+            grs.scan_directory(
+                directory_path=f'{self.tmpdir.name}/file.txt',
+            )
+
+    def test_scan_directory_max_memory(
+        self,
+    ):
+        grs = pyrepscan.GitRepositoryScanner(
+            max_memory=1000,
+        )
+        grs.add_content_rule(
+            name='First Rule',
+            pattern=r'''(content)''',
+            whitelist_patterns=[],
+            blacklist_patterns=[],
+        )
+
+        with tempfile.TemporaryDirectory() as directory_path:
+            for file_number in range(100):
+                with open(f'{directory_path}/file_{file_number}.txt', 'w') as tmpfile:
+                    tmpfile.write('content\n' * 10)
+
+            with self.assertRaises(
+                expected_exception=RuntimeError,
+            ):
+                grs.scan_directory(
+                    directory_path=directory_path,
+                )
+
+    def test_scan_directory_nested_directories(
+        self,
+    ):
+        grs = pyrepscan.GitRepositoryScanner()
+        grs.add_content_rule(
+            name='First Rule',
+            pattern=r'''(content)''',
+            whitelist_patterns=[],
+            blacklist_patterns=[],
+        )
+        grs.add_file_path_rule(
+            name='Second Rule',
+            pattern=r'nested/deep/.+key',
+        )
+        grs.add_file_glob_to_skip('vendor/*')
+
+        with tempfile.TemporaryDirectory() as directory_path:
+            os.makedirs(f'{directory_path}/nested/deep')
+            os.makedirs(f'{directory_path}/vendor/library')
+            with open(f'{directory_path}/nested/deep/file.txt', 'w') as tmpfile:
+                tmpfile.write('nested content')
+            with open(f'{directory_path}/nested/deep/prod.key', 'w') as tmpfile:
+                tmpfile.write('some_key')
+            with open(f'{directory_path}/vendor/library/file.txt', 'w') as tmpfile:
+                tmpfile.write('vendored content')
+
+            results = grs.scan_directory(
+                directory_path=directory_path,
+            )
+            self.assertCountEqual(
+                first=results,
+                second=[
+                    {
+                        'column': 8,
+                        'file_path': 'nested/deep/file.txt',
+                        'line_number': 1,
+                        'match_text': 'content',
+                        'offset': 7,
+                        'rule_name': 'First Rule',
+                    },
+                    {
+                        'file_path': 'nested/deep/prod.key',
+                        'match_text': 'nested/deep/prod.key',
+                        'rule_name': 'Second Rule',
+                    },
+                ],
+            )
+
+    def test_scan_verdict_cache(
+        self,
+    ):
+        grs = pyrepscan.GitRepositoryScanner()
+        grs.add_content_rule(
+            name='First Rule',
+            pattern=r'(password=[a-z0-9]+)',
+            whitelist_patterns=[],
+            blacklist_patterns=[
+                'changeme',
+                'example',
+            ],
+        )
+
+        with tempfile.TemporaryDirectory() as directory_path:
+            with open(f'{directory_path}/first.txt', 'w') as tmpfile:
+                tmpfile.write('password=changeme password=changeme password=hunter2')
+            with open(f'{directory_path}/second.txt', 'w') as tmpfile:
+                tmpfile.write('password=changeme')
+
+            results = grs.scan_directory(
+                directory_path=directory_path,
+            )
+            self.assertEqual(
+                first=[result['match_text'] for result in results],
+                second=[
+                    'password=hunter2',
+                ],
+            )
+            scan_stats = grs.last_scan_stats()
+            self.assertEqual(
+                first=scan_stats['verdict_cache_hits'] + scan_stats['verdict_cache_misses'],
+                second=4,
+            )
+            self.assertGreaterEqual(
+                a=scan_stats['verdict_cache_hits'],
+                b=1,
+            )
+
+            grs.scan_directory(
+                directory_path=directory_path,
+            )
+            scan_stats = grs.last_scan_stats()
+            self.assertEqual(
+                first=scan_stats['verdict_cache_hits'],
+                second=4,
+            )
+            self.assertEqual(
+                first=scan_stats['verdict_cache_misses'],
+                second=0,
+            )
+
+    def test_scan_range(
+        self,
+    ):
+        grs = pyrepscan.GitRepositoryScanner()
+        grs.add_content_rule(
+            name='First Rule',
+            pattern=r'''(content)''',
+            whitelist_patterns=[],
+            blacklist_patterns=[],
+        )
+        grs.add_file_extension_to_skip('py')
+        grs.add_file_path_to_skip('test_')
+
+        results = grs.scan_range(
+            repository_path=self.tmpdir.name,
+            revspecs=['master..non_merged_branch'],
+        )
+        self.assertCountEqual(
+            first=[
+                result['commit_message']
+                for result in results
+            ],
+            second=[
+                'edited file in non_merged_branch',
+            ],
+        )
+
+        results = grs.scan_range(
+            repository_path=self.tmpdir.name,
+            revspecs=['new_branch', '^master^2'],
+        )
+        self.assertCountEqual(
+            first=[
+                result['commit_message']
+                for result in results
+            ],
+            second=[
+                'edited file in new branch',
+            ],
+        )
+
+        repo = git.Repo(
+            path=self.tmpdir.name,
+        )
+        repo.head.reference = repo.heads.new_branch
+        repo.head.reset(
+            index=True,
+            working_tree=True,
+        )
+        with open(f'{self.tmpdir.name}/file.txt', 'w') as tmpfile:
+            tmpfile.write('second content from new branch')
+        repo.index.add(
+            items=[
+                f'{self.tmpdir.name}/file.txt',
+            ],
+        )
+        repo.index.commit(
+            message='second edit in new branch',
+            author=git.Actor(
+                name='Author Name',
+                email='test@author.email',
+            ),
+            commit_date='2005-01-01T00:00:00',
+            author_date='2005-01-01T00:00:00',
+        )
+        repo.close()
+
+        results = grs.scan_range(
+            repository_path=self.tmpdir.name,
+            revspecs=['new_branch...non_merged_branch'],
+        )
+        self.assertCountEqual(
+            first=[
+                result['commit_message']
+                for result in results
+            ],
+            second=[
+                'second edit in new branch',
+                'edited file in non_merged_branch',
+            ],
+        )
+
+        results = grs.scan_range(
+            repository_path=self.tmpdir.name,
+            revspecs=[f'{"0" * 40}..non_merged_branch'],
+        )
+        self.assertCountEqual(
+            first=[
+                result['commit_message']
+                for result in results
+            ],
+            second=[
+                'edited file in non_merged_branch',
+            ],
+        )
+
+        with self.assertRaises(
+            expected_exception=RuntimeError,
+        ):
+            grs.scan_range(
+                repository_path=self.tmpdir.name,
+                revspecs=['no_such_branch'],
+            )
+
+    def test_scan_index(
+        self,
+    ):
+        grs = pyrepscan.GitRepositoryScanner()
+        grs.add_content_rule(
+            name='First Rule',
+            pattern=r'''(content)''',
+            whitelist_patterns=[],
+            blacklist_patterns=[],
+        )
+
+        repo = git.Repo(
+            path=self.tmpdir.name,
+        )
+        repo.head.reset(
+            index=True,
+            working_tree=True,
+        )
+        self.assertEqual(
+            first=grs.scan_index(
+                repository_path=self.tmpdir.name,
+            ),
+            second=[],
+        )
+
+        with open(f'{self.tmpdir.name}/staged_file.txt', 'w') as tmpfile:
+            tmpfile.write('staged content')
+        repo.index.add(
+            items=[
+                f'{self.tmpdir.name}/staged_file.txt',
+            ],
+        )
+        repo.close()
+
+        self.assertEqual(
+            first=grs.scan_index(
+                repository_path=self.tmpdir.name,
+            ),
+            second=[
+                {
+                    'column': 8,
+                    'file_oid': 'cadfe6b9017b97340a959a935b2a463a0ba4b4a0',
+                    'file_path': 'staged_file.txt',
+                    'line_number': 1,
+                    'match_text': 'content',
+                    'offset': 7,
+                    'rule_name': 'First Rule',
+                },
+            ],
+        )
+
     def test_get_file_content(
         self,
     ):